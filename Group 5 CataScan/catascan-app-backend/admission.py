@@ -0,0 +1,178 @@
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+
+# Admission control for request classes that share a budget (e.g. inference endpoints).
+# At most max_in_flight requests run at once; up to max_queue more wait in FIFO order for at most
+# queue_timeout seconds. Anything beyond that is rejected straight away instead of piling up:
+#   429 when the queue is full,
+#   503 when the expected wait (queue position x average service time) or the actual wait would
+#   exceed queue_timeout.
+# Both carry a Retry-After estimate. Works for threads (admit) and for asyncio (admit_async).
+
+SERVICE_TIME_SMOOTHING = 0.2  # Weight of the newest request in the average service time
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status, retry_after, reason):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    def __init__(self):
+        self.granted = False
+        self._event = threading.Event()
+
+    def grant(self):
+        self.granted = True
+        self._event.set()
+
+    def wait(self, timeout):
+        self._event.wait(timeout)
+
+
+class _AsyncWaiter:
+    def __init__(self, loop):
+        self.granted = False
+        self._loop = loop
+        self._future = loop.create_future()
+
+    # May be called from another thread, so the future is resolved on its own loop
+    def grant(self):
+        self.granted = True
+        self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        if not self._future.done():
+            self._future.set_result(None)
+
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(asyncio.shield(self._future), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class AdmissionController:
+    def __init__(self, name, max_in_flight, max_queue, queue_timeout):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiters = deque()
+        self._service_time = None  # Moving average, seconds
+        self._admitted = 0
+        self._rejected = {429: 0, 503: 0}
+
+    # Expected wait for the request at this queue position, from the average service time
+    def _expected_wait(self, position):
+        if self._service_time is None:
+            return 0.0
+        return position * self._service_time / self.max_in_flight
+
+    def _reject(self, status, position, reason):
+        self._rejected[status] += 1
+        retry_after = max(1, math.ceil(self._expected_wait(position) or self._service_time or 1))
+        raise AdmissionRejected(status, retry_after, reason)
+
+    # Admits the request (returns None) or queues the waiter (returns it); raises AdmissionRejected. Caller holds the lock.
+    def _enter(self, waiter):
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            self._admitted += 1
+            return None
+        position = len(self._waiters) + 1
+        if len(self._waiters) >= self.max_queue:
+            self._reject(429, position, f"{self.name} queue is full")
+        if self._expected_wait(position) > self.queue_timeout:
+            self._reject(503, position, f"{self.name} queue wait would exceed {self.queue_timeout}s")
+        self._waiters.append(waiter)
+        return waiter
+
+    # Called after waiting: the waiter either got a slot or gave up
+    def _after_wait(self, waiter):
+        with self._lock:
+            if waiter.granted:
+                self._admitted += 1
+                return
+            self._waiters.remove(waiter)
+            self._reject(503, len(self._waiters) + 1, f"{self.name} queue wait exceeded {self.queue_timeout}s")
+
+    # Called when the wait itself was interrupted (task cancelled, client gone): leaves the queue, or gives
+    # back the slot if it was granted meanwhile, so a dead waiter never holds capacity
+    def _abandon(self, waiter):
+        with self._lock:
+            if not waiter.granted:
+                self._waiters.remove(waiter)
+                return
+        self._release(None)
+
+    # Releases a slot, handing it straight to the oldest waiter if there is one.
+    # elapsed is None for a slot that served no request, which leaves the average service time as is.
+    def _release(self, elapsed):
+        with self._lock:
+            if elapsed is None:
+                pass
+            elif self._service_time is None:
+                self._service_time = elapsed
+            else:
+                self._service_time += SERVICE_TIME_SMOOTHING * (elapsed - self._service_time)
+            if self._waiters:
+                self._waiters.popleft().grant()
+            else:
+                self._in_flight -= 1
+
+    @contextmanager
+    def admit(self):
+        with self._lock:
+            waiter = self._enter(_Waiter())
+        if waiter is not None:
+            try:
+                waiter.wait(self.queue_timeout)
+            except BaseException:
+                self._abandon(waiter)
+                raise
+            self._after_wait(waiter)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - start)
+
+    @asynccontextmanager
+    async def admit_async(self):
+        with self._lock:
+            waiter = self._enter(_AsyncWaiter(asyncio.get_running_loop()))
+        if waiter is not None:
+            try:
+                await waiter.wait(self.queue_timeout)
+            except BaseException:
+                self._abandon(waiter)
+                raise
+            self._after_wait(waiter)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - start)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "queued": len(self._waiters),
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "avg_service_s": round(self._service_time, 3) if self._service_time is not None else None,
+                "admitted": self._admitted,
+                "rejected_429": self._rejected[429],
+                "rejected_503": self._rejected[503],
+            }
@@ -0,0 +1,304 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+# Local cache for the model artifacts (.h5, .tflite, .onnx), shared by the app, the model server, the
+# demos and the conversion scripts.
+#
+# Files are stored once under their SHA-256 (blobs/<sha256>) and looked up by name through an index
+# (names/<name> holds the hash). model_artifacts.json lists the known artifacts: where to download
+# them and, once pinned, the hash they must have. resolve(name) returns a verified local path:
+#   1. the cached blob for the pinned hash,
+#   2. else a copy in the working directory, where the model used to live (added to the cache),
+#   3. else the blob indexed under that name earlier,
+#   4. else a download from the Hugging Face Hub, unless ARTIFACT_OFFLINE is set.
+# A blob is re-hashed only when its size or mtime changed since it was last verified, and so is a
+# working directory copy that couldn't be hard-linked into the cache (names/<name>.source records it).
+# Conversions are memoized with converted(): the output is keyed by the source's hash and a recipe
+# string, so an unchanged source model is never converted twice.
+
+CACHE_DIR = os.getenv("ARTIFACT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "catascan", "artifacts"))
+OFFLINE = os.getenv("ARTIFACT_OFFLINE", os.getenv("HF_HUB_OFFLINE", "false")).lower() in ("1", "true")
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_artifacts.json")
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class ArtifactError(Exception):
+    pass
+
+
+# Function to compute a file's SHA-256 hex digest
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_atomic(path, text):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class ArtifactCache:
+    def __init__(self, cache_dir=CACHE_DIR, manifest=None, offline=OFFLINE):
+        self.cache_dir = cache_dir
+        self.manifest = load_manifest() if manifest is None else manifest
+        self.offline = offline
+        for sub in ("blobs", "names", "derived"):
+            os.makedirs(os.path.join(cache_dir, sub), exist_ok=True)
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.cache_dir, "blobs", sha256)
+
+    def _name_path(self, name):
+        return os.path.join(self.cache_dir, "names", name)
+
+    # Function to get the hash a name should resolve to: the pinned one, else the one indexed earlier
+    def expected_hash(self, name):
+        pinned = self.manifest.get(name, {}).get("sha256")
+        if pinned:
+            return pinned
+        try:
+            with open(self._name_path(name)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    # Function to check a cached blob against its hash, skipping the re-hash if it is unchanged since the last check
+    def _verified(self, sha256):
+        path = self._blob_path(sha256)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        stamp_path = path + ".verified"
+        stamp = f"{stat.st_size} {stat.st_mtime_ns}"
+        try:
+            with open(stamp_path) as f:
+                if f.read() == stamp:
+                    return True
+        except FileNotFoundError:
+            pass
+
+        if sha256_file(path) != sha256:
+            logging.warning(f"Cached artifact {sha256[:12]} is corrupt, removing it")
+            os.remove(path)
+            return False
+        _write_atomic(stamp_path, stamp)
+        return True
+
+    # Function to get the hash recorded for a working-directory copy of an artifact, if the copy hasn't
+    # changed (same path, size and mtime) since it was last hashed
+    def _source_hash(self, name, path, stat):
+        try:
+            with open(self._name_path(name) + ".source") as f:
+                stamp = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if stamp.get("path") != os.path.abspath(path) or stamp.get("stamp") != f"{stat.st_size} {stat.st_mtime_ns}":
+            return None
+        return stamp.get("sha256")
+
+    def _record_source(self, name, path, stat, sha256):
+        _write_atomic(self._name_path(name) + ".source", json.dumps({
+            "path": os.path.abspath(path), "stamp": f"{stat.st_size} {stat.st_mtime_ns}", "sha256": sha256,
+        }))
+
+    # Function to add a file to the cache under its hash (hard-linked when possible) and index it by name.
+    # Fails if the name is pinned to a different hash.
+    def add(self, name, source_path):
+        source_stat = os.stat(source_path)
+        sha256 = sha256_file(source_path)
+        pinned = self.manifest.get(name, {}).get("sha256")
+        if pinned and pinned != sha256:
+            raise ArtifactError(f"{source_path} has SHA-256 {sha256}, but {name} is pinned to {pinned}")
+
+        blob_path = self._blob_path(sha256)
+        if not os.path.exists(blob_path):
+            tmp_path = blob_path + f".{os.getpid()}.tmp"
+            try:
+                os.link(source_path, tmp_path)
+            except OSError:
+                shutil.copyfile(source_path, tmp_path)
+            os.replace(tmp_path, blob_path)
+            # The source was just hashed and didn't change while it was copied, so the blob is verified
+            if os.stat(source_path).st_mtime_ns == source_stat.st_mtime_ns:
+                stat = os.stat(blob_path)
+                _write_atomic(blob_path + ".verified", f"{stat.st_size} {stat.st_mtime_ns}")
+        _write_atomic(self._name_path(name), sha256)
+        return blob_path
+
+    def _download(self, name):
+        source = self.manifest.get(name, {})
+        if "repo_id" not in source:
+            raise ArtifactError(f"{name} is not cached and has no download source in {MANIFEST_PATH}")
+        if self.offline:
+            raise ArtifactError(f"{name} is not cached and ARTIFACT_OFFLINE is set")
+        from huggingface_hub import hf_hub_download
+        logging.info(f"Downloading {name} from {source['repo_id']}")
+        with tempfile.TemporaryDirectory(dir=self.cache_dir) as tmp_dir:
+            path = hf_hub_download(
+                repo_id=source["repo_id"], filename=source.get("filename", name),
+                revision=source.get("revision"), local_dir=tmp_dir,
+            )
+            return self.add(name, path)
+
+    # Function to get a verified local path for an artifact, downloading it only if it isn't available locally.
+    # A pinned artifact always resolves to its pinned content; an unpinned one follows the working
+    # directory copy, so replacing that file takes effect.
+    def resolve(self, name, search_dirs=(".",)):
+        sha256 = self.expected_hash(name)
+        if sha256 and sha256 == self.manifest.get(name, {}).get("sha256") and self._verified(sha256):
+            return self._blob_path(sha256)
+
+        for directory in search_dirs:
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                blob_path = self._blob_path(sha256) if sha256 else None
+                # The copy was hard-linked into the cache, so it is the same file and needs no re-hash
+                if blob_path and os.path.exists(blob_path) and os.path.samefile(path, blob_path) and self._verified(sha256):
+                    return blob_path
+                # Copied into the cache (e.g. across filesystems): unchanged since it was last hashed
+                stat = os.stat(path)
+                if sha256 and self._source_hash(name, path, stat) == sha256 and self._verified(sha256):
+                    return blob_path
+                logging.info(f"Adding {path} to the artifact cache")
+                blob_path = self.add(name, path)
+                if os.stat(path).st_mtime_ns == stat.st_mtime_ns:
+                    self._record_source(name, path, stat, os.path.basename(blob_path))
+                return blob_path
+
+        if sha256 and self._verified(sha256):
+            return self._blob_path(sha256)
+        return self._download(name)
+
+    # Function to run a conversion only if its output for this source and recipe isn't cached yet.
+    # convert(source_path, output_path) writes the output and may return JSON metadata (e.g. a report),
+    # which is cached with it; recipe identifies the conversion settings.
+    # Returns (output path, metadata, whether it was converted now).
+    def converted(self, source_path, recipe, output_name, convert, force=False):
+        if os.path.dirname(os.path.abspath(source_path)) == os.path.join(os.path.abspath(self.cache_dir), "blobs"):
+            source_hash = os.path.basename(source_path)  # Already verified by resolve()
+        else:
+            source_hash = sha256_file(source_path)
+        key = hashlib.sha256(f"{source_hash}\n{recipe}".encode()).hexdigest()
+        entry_dir = os.path.join(self.cache_dir, "derived", key)
+        entry_path = os.path.join(entry_dir, "entry.json")
+        if not force:
+            try:
+                with open(entry_path) as f:
+                    entry = json.load(f)
+                if self._verified(entry["sha256"]):
+                    _write_atomic(self._name_path(output_name), entry["sha256"])
+                    return self._blob_path(entry["sha256"]), entry.get("metadata"), False
+            except (FileNotFoundError, ValueError, KeyError):
+                pass
+
+        with tempfile.TemporaryDirectory(dir=self.cache_dir) as tmp_dir:
+            output_path = os.path.join(tmp_dir, output_name)
+            metadata = convert(source_path, output_path)
+            blob_path = self.add(output_name, output_path)
+        os.makedirs(entry_dir, exist_ok=True)
+        _write_atomic(entry_path, json.dumps({
+            "source_sha256": source_hash, "recipe": recipe, "output": output_name,
+            "sha256": os.path.basename(blob_path), "metadata": metadata,
+        }, indent=2))
+        return blob_path, metadata, True
+
+    # Function to place a cached file at dest_path, hard-linked when possible so resolve() recognizes it
+    # without re-hashing
+    def export(self, blob_path, dest_path):
+        if os.path.exists(dest_path) and os.path.samefile(blob_path, dest_path):
+            return
+        tmp_path = dest_path + f".{os.getpid()}.tmp"
+        try:
+            os.link(blob_path, tmp_path)
+        except OSError:
+            shutil.copyfile(blob_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+
+    # Function to re-hash every cached blob. Returns the hashes that were corrupt (and removed).
+    def verify_all(self):
+        corrupt = []
+        blobs_dir = os.path.join(self.cache_dir, "blobs")
+        for name in os.listdir(blobs_dir):
+            if name.endswith((".verified", ".tmp")):
+                continue
+            try:
+                os.remove(self._blob_path(name) + ".verified")
+            except FileNotFoundError:
+                pass
+            if not self._verified(name):
+                corrupt.append(name)
+        return corrupt
+
+
+_default_cache = None
+
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ArtifactCache()
+    return _default_cache
+
+
+# Function to resolve an artifact through the shared cache
+def resolve(name, search_dirs=(".",)):
+    return default_cache().resolve(name, search_dirs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local model artifact cache")
+    parser.add_argument("command", choices=["fetch", "verify", "pin"],
+                        help="fetch: resolve artifacts into the cache; verify: re-hash every cached file; "
+                             "pin: write the cached hashes into model_artifacts.json")
+    parser.add_argument("names", nargs="*", help="artifact names (default: all in model_artifacts.json)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    cache = default_cache()
+    names = args.names or list(cache.manifest)
+
+    if args.command == "fetch":
+        failed = False
+        for name in names:
+            try:
+                print(f"{name}: {cache.resolve(name)}")
+            except ArtifactError as e:
+                print(f"{name}: {e}")
+                failed = True
+        sys.exit(1 if failed else 0)
+
+    if args.command == "verify":
+        corrupt = cache.verify_all()
+        print(f"{len(corrupt)} corrupt cached artifacts" + (f": {', '.join(corrupt)}" if corrupt else ""))
+        sys.exit(1 if corrupt else 0)
+
+    if args.command == "pin":
+        manifest = load_manifest()
+        for name in names:
+            sha256 = cache.expected_hash(name)
+            if sha256:
+                manifest.setdefault(name, {})["sha256"] = sha256
+                print(f"{name}: {sha256}")
+            else:
+                print(f"{name}: not cached, left unpinned")
+        _write_atomic(MANIFEST_PATH, json.dumps(manifest, indent=2) + "\n")
@@ -0,0 +1,875 @@
+from quart import Quart, Request, request, jsonify, Response
+from quart_cors import cors
+from supabase import acreate_client, AsyncClient
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps, partial
+import asyncio
+import logging
+import numpy as np
+import os
+import time
+import uuid
+
+# Helpers, limits and shared caches come from scan_service, so both serving modes behave the same
+from scan_service import (
+    SUPABASE_URL, SUPABASE_KEY, MAX_FILE_SIZE, MULTIPART_OVERHEAD, TTA_ENABLED, SCAN_IMAGE_FORMAT,
+    SCAN_IMAGE_MAX_SIDE, SCAN_CACHE_DIR, SCAN_CACHE_MAX_BYTES, REPORTS_BUCKET, eye_check, report_template,
+    read_upload, thumbnail_path, score_image, build_prediction_records, build_prediction_result, report_key,
+    inference_backend, profile_cache, STATS_MAX_RETRIES, DUPLICATE_DETECTION, DUPLICATE_MAX_DISTANCE,
+    DUPLICATE_INDEX_SIZE, build_stored_result, VISIT_MAX_IMAGES, VISIT_MAX_CONTENT_LENGTH, decode_visit_image,
+    read_visit_form, summarize_visit, inference_admission, light_admission, drift_monitor, DRIFT_BASELINE
+)
+from blob_fetch import BlobFetcher
+from gemini_gateway import EyeCheckUnavailable, EyeCheckBusy
+from image_validation import inspect_image, ImageValidationError
+from image_ingest import normalize_scan
+from reports import render_report
+from scan_stats import apply_scan, build_summary, summary_view
+from image_hash import dhash, find_near_duplicate
+from admission import AdmissionRejected
+from profile_cache import PROFILE_COLUMNS
+
+# Asyncio variant of app.py with the same routes: hypercorn async_app:app --bind 0.0.0.0:7000
+#
+# Supabase and Gemini calls are awaited, and independent calls run concurrently (the eye check and
+# a speculative storage upload in /upload-image, the lookups in /download_report, the analysis and
+# recommendation inserts once their scan_record exists). Inference, image re-encoding and PDF rendering
+# run on a thread pool, and blocking disk or socket I/O on the default executor.
+
+# Request class that gives /scan-visit a larger body limit. Quart fixes a request's body limit when the
+# request is created, so it can't be raised from inside the view like in app.py.
+class CataScanRequest(Request):
+    def __init__(self, method, scheme, path, *args, max_content_length=None, **kwargs):
+        if path == "/scan-visit":
+            max_content_length = VISIT_MAX_CONTENT_LENGTH
+        super().__init__(method, scheme, path, *args, max_content_length=max_content_length, **kwargs)
+        if path == "/scan-visit":
+            self.max_content_length = VISIT_MAX_CONTENT_LENGTH
+            self.max_form_parts = 2 * VISIT_MAX_IMAGES + 16
+
+app = Quart(__name__)
+app.request_class = CataScanRequest
+app = cors(
+    app,
+    allow_origin=["https://catascan.vercel.app", "http://localhost:5173"],
+    allow_methods=["GET", "POST", "PUT", "OPTIONS"],
+    allow_headers=["Content-Type", "Authorization"],
+    allow_credentials=True
+)
+app.config["MAX_CONTENT_LENGTH"] = MAX_FILE_SIZE + MULTIPART_OVERHEAD
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+supabase: AsyncClient = None
+cpu_executor = ThreadPoolExecutor(max_workers=int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 2))), thread_name_prefix="cpu")
+background_tasks = set()
+
+# Storage downloads through the async client are passed the client per call; the fetchers' own
+# client is only used by their sync fetch_path, which this app doesn't call
+scan_fetcher = BlobFetcher(None, SUPABASE_URL, "scan-images", SCAN_CACHE_DIR, SCAN_CACHE_MAX_BYTES)
+report_fetcher = BlobFetcher(None, SUPABASE_URL, REPORTS_BUCKET, os.path.join(SCAN_CACHE_DIR, "reports"), SCAN_CACHE_MAX_BYTES // 4)
+
+
+@app.before_serving
+async def create_supabase_client():
+    global supabase
+    supabase = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+
+
+# Function to run CPU-bound work (inference, image encoding, PDF rendering) off the event loop
+async def run_cpu(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, partial(func, *args, **kwargs))
+
+
+# Function to run blocking file or socket I/O (disk caches, sketch flushes, model server calls) off the event loop
+async def run_io(func, *args, **kwargs):
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+# Function to keep a reference to a fire-and-forget task until it finishes
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+# Function to send a profile response with its ETag, or 304 if the client already has it
+def send_profile(payload, etag):
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+# Function to build the response for a request turned away by admission control
+def overloaded_response(rejection):
+    logging.warning(f"Request to {request.path} rejected ({rejection.status}): {rejection}")
+    return jsonify({"error": "Server is busy, please retry later"}), rejection.status, {"Retry-After": str(rejection.retry_after)}
+
+
+# Decorator to run a view under an admission controller's budget (see app.py)
+def admit(controller):
+    def decorator(f):
+        @wraps(f)
+        async def decorated(*args, **kwargs):
+            try:
+                async with controller.admit_async():
+                    return await f(*args, **kwargs)
+            except AdmissionRejected as rejection:
+                return overloaded_response(rejection)
+        return decorated
+    return decorator
+
+
+# Middleware to verify JWT token
+def require_auth(f):
+    @wraps(f)
+    async def decorated(*args, **kwargs):
+        token = request.headers.get("Authorization")
+        if not token:
+            return jsonify({"error": "Authorization token is missing"}), 401
+
+        try:
+            # Ensure token is in "Bearer <token>" format, extract just the token
+            if not token.startswith("Bearer "):
+                return jsonify({"error": "Invalid token format. Use 'Bearer <token>'"}), 401
+            token = token.replace("Bearer ", "")
+            # Validate token with Supabase
+            user_response = await supabase.auth.get_user(token)
+            if not user_response.user:
+                return jsonify({"error": "Invalid or expired token"}), 401
+            # Store the User object directly in request.user
+            request.user = user_response.user
+        except Exception as e:
+            logging.error(f"Token verification failed: {str(e)}")
+            return jsonify({"error": f"Token verification failed: {str(e)}"}), 401
+
+        return await f(*args, **kwargs)
+    return decorated
+
+
+@app.errorhandler(413)
+async def request_too_large(e):
+    return jsonify({"error": "File is too large. Maximum size is 5MB."}), 413
+
+
+# Function to fetch a scan image, preferring the thumbnail (see fetch_scan_image in app.py)
+async def fetch_scan_image(scan_id, image_url, prefer_thumbnail=True):
+    if prefer_thumbnail and scan_id:
+        content = await scan_fetcher.fetch_path_async(supabase, thumbnail_path(scan_id))
+        if content is not None:
+            return content
+    if not image_url:
+        return None
+    path = scan_fetcher.bucket_path(image_url)
+    if path is not None:
+        return await scan_fetcher.fetch_path_async(supabase, path)
+    return await asyncio.to_thread(scan_fetcher.fetch, image_url)
+
+
+# Function to re-encode a scan and upload it with its thumbnail. Returns (file_path, image_url, thumbnail_url).
+async def store_scan(scan_id, file_content):
+    scan_image = await run_cpu(normalize_scan, file_content, SCAN_IMAGE_FORMAT, SCAN_IMAGE_MAX_SIDE)
+    return await upload_scan(scan_id, scan_image)
+
+
+# Function to upload a normalized scan and its thumbnail. Returns (file_path, image_url, thumbnail_url).
+async def upload_scan(scan_id, scan_image):
+    file_path = f"scans/{scan_id}.{scan_image['extension']}"
+    bucket = supabase.storage.from_("scan-images")
+
+    logging.info(f"Uploading image to Supabase Storage at path: {file_path}")
+    await asyncio.gather(
+        bucket.upload(file=scan_image["content"], path=file_path,
+                      file_options={"content-type": scan_image["mime_type"], "upsert": "true"}),
+        bucket.upload(file=scan_image["thumbnail"], path=thumbnail_path(scan_id),
+                      file_options={"content-type": "image/jpeg", "upsert": "true"})
+    )
+    image_url, thumbnail_url = await asyncio.gather(
+        bucket.get_public_url(file_path), bucket.get_public_url(thumbnail_path(scan_id))
+    )
+    return file_path, image_url, thumbnail_url
+
+
+# Function to delete a speculatively stored scan
+async def discard_scan(scan_id, file_path):
+    try:
+        await supabase.storage.from_("scan-images").remove([file_path, thumbnail_path(scan_id)])
+    except Exception as e:
+        logging.warning(f"Failed to remove rejected upload {file_path}: {str(e)}")
+
+
+# Function to delete the scans stored for a visit that couldn't be scored
+async def discard_visit_scans(scan_ids, prepared):
+    paths = []
+    for index, scan_id in scan_ids.items():
+        paths += [f"scans/{scan_id}.{prepared[index]['scan_image']['extension']}", thumbnail_path(scan_id)]
+    try:
+        await supabase.storage.from_("scan-images").remove(paths)
+    except Exception as e:
+        logging.warning(f"Failed to remove the uploads of a failed visit: {str(e)}")
+
+
+# Function to insert the scan_record rows of scored scans, then their analysis and recommendation rows,
+# which reference scan_record. If a child insert fails, the rows written for these scans are removed.
+async def insert_prediction_records(records):
+    await supabase.table("scan_record").insert([scan_data for scan_data, _, _ in records]).execute()
+    results = await asyncio.gather(
+        supabase.table("analysis").insert([analysis_data for _, analysis_data, _ in records]).execute(),
+        supabase.table("recommendation").insert([recommendation_data for _, _, recommendation_data in records]).execute(),
+        return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        scan_ids = [scan_data["scan_id"] for scan_data, _, _ in records]
+        try:
+            await asyncio.gather(
+                supabase.table("analysis").delete().in_("scan_id", scan_ids).execute(),
+                supabase.table("recommendation").delete().in_("scan_id", scan_ids).execute()
+            )
+            await supabase.table("scan_record").delete().in_("scan_id", scan_ids).execute()
+        except Exception as e:
+            logging.warning(f"Failed to remove the records of scans {scan_ids}: {str(e)}")
+        raise errors[0]
+
+
+# Function to render a report and store it in the reports bucket. Returns the PDF bytes.
+async def store_report(scan_id, scan_data, analysis_data, recommendation_data, user_data, image_content):
+    pdf = await run_cpu(render_report, report_template, scan_id, scan_data, analysis_data, recommendation_data, user_data, image_content)
+    try:
+        await supabase.storage.from_(REPORTS_BUCKET).upload(
+            file=pdf,
+            path=f"{report_key(scan_id, user_data)}.pdf",
+            file_options={"content-type": "application/pdf", "upsert": "true"}
+        )
+    except Exception as e:
+        logging.warning(f"Failed to store report for scan {scan_id}: {str(e)}")
+    return pdf
+
+
+# Function to load the profile fields a report shows; a missing profile only leaves the name out
+async def load_report_profile(user_id):
+    rows = (await supabase.table("user_profile").select("first_name, last_name").eq("user_id", user_id).limit(1).execute()).data
+    return rows[0] if rows else {}
+
+
+async def prerender_report(scan_id, scan_data, analysis_data, recommendation_data, image_content):
+    try:
+        user_data = await load_report_profile(scan_data["user_id"])
+        await store_report(scan_id, scan_data, analysis_data, recommendation_data, user_data, image_content)
+        logging.info(f"Pre-rendered report for scan {scan_id}")
+    except Exception as e:
+        logging.warning(f"Failed to pre-render report for scan {scan_id}: {str(e)}")
+
+
+# Function to load a user's scan_stats summary and version (see load_scan_stats in app.py)
+async def load_scan_stats(user_id):
+    rows = (await supabase.table("scan_stats").select("summary, version").eq("user_id", user_id).execute()).data
+    if rows:
+        return rows[0]["summary"], rows[0]["version"]
+
+    scans = (await supabase.table("scan_record").select("scan_id, severity_level, confidence, created_at").eq("user_id", user_id).execute()).data
+    summary = build_summary(scans)
+    try:
+        await supabase.table("scan_stats").insert({
+            "user_id": user_id,
+            "version": 1,
+            "summary": summary,
+            "updated_at": time.strftime('%Y-%m-%d %H:%M:%S')
+        }).execute()
+    except Exception:
+        rows = (await supabase.table("scan_stats").select("summary, version").eq("user_id", user_id).execute()).data
+        if not rows:
+            raise
+        return rows[0]["summary"], rows[0]["version"]
+    return summary, 1
+
+
+# Function to fold new scans into their user's summary, retrying on a concurrent update
+async def update_scan_stats(user_id, *scans):
+    for _ in range(STATS_MAX_RETRIES):
+        summary, version = await load_scan_stats(user_id)
+        for scan_data in scans:
+            summary = apply_scan(summary, scan_data)
+        response = await supabase.table("scan_stats").update({
+            "summary": summary,
+            "version": version + 1,
+            "updated_at": time.strftime('%Y-%m-%d %H:%M:%S')
+        }).eq("user_id", user_id).eq("version", version).execute()
+        if response.data:
+            return
+    logging.warning(f"Gave up updating scan stats for user {user_id} after {STATS_MAX_RETRIES} conflicts")
+
+
+# Function to find the user's earlier upload that an image hash nearly matches (see app.py)
+async def find_duplicate_scan(user_id, image_hash):
+    rows = (await supabase.table("scan_hashes").select("scan_id, dhash, image_url, thumbnail_url").eq("user_id", user_id).order("created_at", desc=True).limit(DUPLICATE_INDEX_SIZE).execute()).data
+    return find_near_duplicate(image_hash, rows, DUPLICATE_MAX_DISTANCE)
+
+
+async def index_scan_hash(user_id, scan_id, image_hash, image_url, thumbnail_url):
+    try:
+        await supabase.table("scan_hashes").insert({
+            "scan_id": scan_id,
+            "user_id": user_id,
+            "dhash": image_hash,
+            "image_url": image_url,
+            "thumbnail_url": thumbnail_url,
+            "created_at": time.strftime('%Y-%m-%d %H:%M:%S')
+        }).execute()
+    except Exception as e:
+        logging.warning(f"Failed to index upload {scan_id} for duplicate detection: {str(e)}")
+
+
+# Function to load a scan's stored /predict result, or None if it has not been predicted yet
+async def load_stored_prediction(scan_id):
+    rows = (await supabase.table("scan_record").select("*").eq("scan_id", scan_id).execute()).data
+    if not rows:
+        return None
+    analysis_response, recommendation_response = await asyncio.gather(
+        supabase.table("analysis").select("processing_time").eq("scan_id", scan_id).execute(),
+        supabase.table("recommendation").select("r_text").eq("scan_id", scan_id).execute()
+    )
+    return build_stored_result(
+        rows[0],
+        analysis_response.data[0] if analysis_response.data else {},
+        recommendation_response.data[0] if recommendation_response.data else {}
+    )
+
+
+# Function to validate, eye-check and decode one visit image (see prepare_visit_image in app.py)
+async def prepare_visit_image(file_content, file_hash):
+    try:
+        image_info = inspect_image(file_content)
+        if not await eye_check.is_eye_async(file_content, file_hash):
+            return {"error": "The image is not an eye"}
+        await run_io(drift_monitor.observe_size, image_info["width"], image_info["height"])
+        scan_image, model_input = await run_cpu(decode_visit_image, file_content)
+        return {"scan_image": scan_image, "model_input": model_input}
+    except ImageValidationError as e:
+        return {"error": str(e)}
+    except EyeCheckUnavailable as e:
+        logging.error(f"Gemini API error: {str(e)}")
+        return {"error": "Failed to analyze image with Gemini API", "unavailable": True}
+
+
+def send_report(scan_id, key, pdf):
+    response = Response(pdf, mimetype="application/pdf")
+    response.headers["Content-Disposition"] = f"attachment; filename=catascan_report_{scan_id}.pdf"
+    response.set_etag(key, weak=True)
+    response.headers["Cache-Control"] = "private, max-age=86400"
+    return response
+
+
+@app.route("/upload-image", methods=["POST"])
+@admit(inference_admission)
+async def upload_image():
+    files = await request.files
+    if "file" not in files:
+        return jsonify({"error": "No file part"}), 400
+
+    file = files["file"]
+
+    if file.filename == "":
+        return jsonify({"error": "No selected file"}), 400
+
+    # Get user_id from form data
+    form = await request.form
+    user_id = form.get("user_id")
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    file_content, file_hash = read_upload(file)
+    if file_content is None:
+        return jsonify({"error": "File is too large. Maximum size is 5MB."}), 400
+
+    # Check format and dimensions from the header before any decode, Gemini or storage call
+    try:
+        image_info = inspect_image(file_content)
+    except ImageValidationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Link near-duplicates of an earlier upload to it instead of processing them again
+    image_hash = None
+    duplicate = None
+    if DUPLICATE_DETECTION:
+        try:
+            image_hash = await run_cpu(dhash, file_content, image_info["orientation"])
+            if form.get("allow_duplicate", "false").lower() != "true":
+                duplicate, distance = await find_duplicate_scan(user_id, image_hash)
+        except Exception as e:
+            logging.warning(f"Near-duplicate check failed: {str(e)}")
+    if duplicate is not None:
+        logging.info(f"Upload is a near-duplicate of scan {duplicate['scan_id']} (distance {distance})")
+        return jsonify({
+            "message": "Image is a near-duplicate of an earlier scan",
+            "scan_id": duplicate["scan_id"],
+            "image_url": duplicate["image_url"],
+            "thumbnail_url": duplicate["thumbnail_url"],
+            "user_id": user_id,
+            "duplicate_of": duplicate["scan_id"],
+            "hamming_distance": distance,
+            "prediction": await load_stored_prediction(duplicate["scan_id"])
+        }), 200
+
+    # Run the Gemini eye check and a speculative storage upload concurrently
+    scan_id = str(uuid.uuid4())
+    is_eye, stored = await asyncio.gather(
+        eye_check.is_eye_async(file_content, file_hash),
+        store_scan(scan_id, file_content),
+        return_exceptions=True
+    )
+
+    if isinstance(is_eye, Exception) or not is_eye:
+        if not isinstance(stored, Exception):
+            run_in_background(discard_scan(scan_id, stored[0]))
+        if isinstance(is_eye, EyeCheckBusy):
+            logging.warning(f"Gemini eye check busy: {str(is_eye)}")
+            return jsonify({"error": "Too many images are being checked, please retry later"}), 503
+        if isinstance(is_eye, EyeCheckUnavailable):
+            logging.error(f"Gemini API error: {str(is_eye)}")
+            return jsonify({"error": "Failed to analyze image with Gemini API"}), 503
+        if isinstance(is_eye, Exception):
+            logging.error(f"Gemini API error: {str(is_eye)}")
+            return jsonify({"error": "Failed to analyze image with Gemini API"}), 500
+        return jsonify({"error": "The image is not an eye"}), 400
+    await run_io(drift_monitor.observe_size, image_info["width"], image_info["height"])
+
+    if isinstance(stored, Exception):
+        logging.error(f"Error uploading image: {str(stored)}")
+        return jsonify({"error": f"Failed to upload image: {str(stored)}"}), 500
+
+    _, image_url, thumbnail_url = stored
+    logging.info(f"Image URL: {image_url}")
+
+    if image_hash is not None:
+        await index_scan_hash(user_id, scan_id, image_hash, image_url, thumbnail_url)
+    return jsonify({
+        "message": "Image uploaded successfully",
+        "scan_id": scan_id,
+        "image_url": image_url,
+        "thumbnail_url": thumbnail_url,
+        "user_id": user_id
+    }), 200
+
+
+@app.route("/predict", methods=["POST"])
+@admit(inference_admission)
+async def predict():
+    data = await request.get_json()
+    image_url = data.get("image_url")
+    scan_id = data.get("scan_id")
+    user_id = data.get("user_id")
+    use_tta = str(data.get("tta", TTA_ENABLED)).lower() == "true"
+
+    if not image_url or not scan_id or not user_id:
+        return jsonify({"error": "Image URL, scan ID, and user ID are required"}), 400
+
+    try:
+        # Scans linked to by a near-duplicate upload may already have been predicted
+        stored = await load_stored_prediction(scan_id)
+        if stored is not None:
+            # Knowing a scan_id isn't enough: only the scan's own user gets its result
+            if stored["user_id"] != user_id:
+                return jsonify({"error": "Scan not found"}), 404
+            return jsonify(stored)
+
+        start_time = time.time()
+        # The model scores the stored scan itself; the thumbnail is only for reports and display
+        image_content = await fetch_scan_image(scan_id, image_url, prefer_thumbnail=False)
+        if image_content is None:
+            return jsonify({"error": "Failed to fetch image from URL"}), 400
+
+        try:
+            image_info = inspect_image(image_content)
+        except ImageValidationError as e:
+            return jsonify({"error": str(e)}), 400
+
+        prediction, views_used, inference_mode = await run_cpu(score_image, image_content, image_info, use_tta, start_time)
+        processing_time = round(time.time() - start_time, 3)
+
+        scan_data, analysis_data, recommendation_data = build_prediction_records(scan_id, user_id, image_url, prediction, processing_time)
+        await insert_prediction_records([(scan_data, analysis_data, recommendation_data)])
+
+        try:
+            await update_scan_stats(user_id, scan_data)
+        except Exception as e:
+            logging.warning(f"Failed to update scan stats for user {user_id}: {str(e)}")
+
+        # The report only depends on these records, so render it now instead of on every download
+        run_in_background(prerender_report(scan_id, scan_data, analysis_data, recommendation_data, image_content))
+
+        result = build_prediction_result(scan_data, recommendation_data, prediction, processing_time, inference_mode, views_used)
+        logging.info(f"Prediction made: {result}")
+        return jsonify(result)
+
+    except Exception as e:
+        logging.error(f"Error occurred during prediction: {str(e)}", exc_info=True)
+        return jsonify({"error": f"An error occurred during prediction: {str(e)}"}), 500
+
+
+@app.route("/scan-visit", methods=["POST"])
+@admit(inference_admission)
+async def scan_visit():
+    user_id, images, error = read_visit_form(await request.form, await request.files)
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        start_time = time.time()
+        # Validate, eye-check and decode every image concurrently
+        prepared = await asyncio.gather(*[prepare_visit_image(file_content, file_hash) for _, _, file_content, file_hash in images])
+        results = [
+            {"index": index, "filename": filename, "eye": eye, **({"error": item["error"]} if "error" in item else {})}
+            for index, ((filename, eye, _, _), item) in enumerate(zip(images, prepared))
+        ]
+        ready = [index for index, item in enumerate(prepared) if "error" not in item]
+        if not ready:
+            status = 503 if any(item.get("unavailable") for item in prepared) else 400
+            return jsonify({"error": "No image in the visit could be scored", "results": results}), status
+
+        # Upload the scans while the whole visit is scored in one batched inference call
+        scan_ids = {index: str(uuid.uuid4()) for index in ready}
+        uploads = [asyncio.ensure_future(upload_scan(scan_ids[index], prepared[index]["scan_image"])) for index in ready]
+        try:
+            predictions = await run_cpu(inference_backend.predict, np.stack([prepared[index]["model_input"] for index in ready]))
+            uploaded = await asyncio.gather(*uploads)
+        except BaseException:
+            # Let every upload finish (or fail) before removing the visit's objects, so none land afterwards
+            await asyncio.shield(asyncio.gather(*uploads, return_exceptions=True))
+            await discard_visit_scans(scan_ids, prepared)
+            raise
+        processing_time = round(time.time() - start_time, 3)
+        for position, index in enumerate(ready):
+            await run_io(drift_monitor.observe, prepared[index]["model_input"], predictions[position])
+
+        records = []
+        for position, index in enumerate(ready):
+            _, image_url, thumbnail_url = uploaded[position]
+            prediction = predictions[position:position + 1]
+            scan_data, analysis_data, recommendation_data = build_prediction_records(scan_ids[index], user_id, image_url, prediction, processing_time)
+            records.append((scan_data, analysis_data, recommendation_data))
+            results[index].update(build_prediction_result(scan_data, recommendation_data, prediction, processing_time, "batch", 1))
+            results[index].update({"image_url": image_url, "thumbnail_url": thumbnail_url})
+
+        # One bulk insert per table for the whole visit; without its records the visit's uploads are orphans
+        try:
+            await insert_prediction_records(records)
+        except Exception:
+            await discard_visit_scans(scan_ids, prepared)
+            raise
+
+        try:
+            await update_scan_stats(user_id, *[scan_data for scan_data, _, _ in records])
+        except Exception as e:
+            logging.warning(f"Failed to update scan stats for user {user_id}: {str(e)}")
+
+        for (scan_data, analysis_data, recommendation_data), index in zip(records, ready):
+            run_in_background(prerender_report(scan_data["scan_id"], scan_data, analysis_data, recommendation_data, prepared[index]["scan_image"]["thumbnail"]))
+
+        logging.info(f"Scored a visit of {len(images)} images ({len(ready)} scored) in {processing_time}s")
+        return jsonify({
+            "user_id": user_id,
+            "results": results,
+            "summary": summarize_visit(results),
+            "processing_time": processing_time
+        }), 200
+
+    except Exception as e:
+        logging.error(f"Error scoring visit: {str(e)}", exc_info=True)
+        return jsonify({"error": f"An error occurred while scoring the visit: {str(e)}"}), 500
+
+
+@app.route("/signup", methods=["POST"])
+async def signup():
+    data = await request.get_json()
+    email = data.get("email")
+    password = data.get("password")
+
+    if not email or not password:
+        return jsonify({"error": "Email and password are required"}), 400
+
+    try:
+        response = await supabase.auth.sign_up({"email": email, "password": password})
+        if not response.user:
+            return jsonify({"error": "Sign-up failed"}), 400
+
+        user_id = response.user.id
+        user_profile_data = {
+            "user_id": user_id,
+            "email": email,
+            "password": password,
+            "created_at": time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+        insert_response = await supabase.table("user_profile").insert(user_profile_data).execute()
+
+        if insert_response.data:
+            logging.info(f"User signed up and profile created: {email}")
+            return jsonify({
+                "message": "Sign-up successful",
+                "user_id": user_id,
+                "access_token": response.session.access_token
+            }), 201
+        else:
+            await supabase.auth.admin.delete_user(user_id)
+            return jsonify({"error": "Failed to create user profile"}), 500
+
+    except Exception as e:
+        logging.error(f"Sign-up error: {e}")
+        return jsonify({"error": f"An error occurred during sign-up: {str(e)}"}), 500
+
+
+@app.route("/onboarding", methods=["POST"])
+@require_auth
+async def onboarding():
+    data = await request.get_json()
+    user_id = data.get("user_id")
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    try:
+        update_data = {key: data.get(key) for key in ("first_name", "last_name", "gender", "dob", "age", "address")}
+        update_data = {k: v for k, v in update_data.items() if v is not None}
+        update_response = await supabase.table("user_profile").update(update_data).eq("user_id", user_id).execute()
+        await run_io(profile_cache.invalidate, user_id)
+
+        if update_response.data:
+            logging.info(f"User profile updated for user_id: {user_id}")
+            return jsonify({"message": "Onboarding successful"}), 200
+        else:
+            return jsonify({"error": "Failed to update user profile"}), 500
+
+    except Exception as e:
+        logging.error(f"Onboarding error: {e}")
+        return jsonify({"error": f"An error occurred during onboarding: {str(e)}"}), 500
+
+
+@app.route("/signin", methods=["POST"])
+async def signin():
+    data = await request.get_json()
+    email = data.get("email")
+    password = data.get("password")
+
+    if not email or not password:
+        return jsonify({"error": "Email and password are required"}), 400
+
+    try:
+        response = await supabase.auth.sign_in_with_password({"email": email, "password": password})
+        if response.user:
+            logging.info(f"User signed in: {email}")
+            return jsonify({
+                "message": "Sign-in successful",
+                "user_id": response.user.id,
+                "access_token": response.session.access_token
+            }), 200
+        else:
+            return jsonify({"error": "Sign-in failed"}), 400
+    except Exception as e:
+        logging.error(f"Sign-in error: {e}")
+        return jsonify({"error": "Invalid email or password"}), 401
+
+
+@app.route("/profile", methods=["GET"])
+@admit(light_admission)
+@require_auth
+async def get_profile():
+    try:
+        user = request.user
+        user_id = user.id
+
+        cached = await run_io(profile_cache.get, user_id)
+        if cached is not None:
+            return send_profile(*cached)
+
+        generation = await run_io(profile_cache.generation, user_id)
+        profile_response = await supabase.table("user_profile").select(PROFILE_COLUMNS).eq("user_id", user_id).single().execute()
+        if not profile_response.data:
+            return jsonify({"error": "Profile not found"}), 404
+
+        avatar_url = user.user_metadata.get("avatar_url", None)
+
+        payload = {
+            "profile": profile_response.data,
+            "avatar_url": avatar_url
+        }
+        return send_profile(payload, await run_io(profile_cache.put, user_id, payload, generation))
+
+    except Exception as e:
+        logging.error(f"Error fetching profile: {e}")
+        return jsonify({"error": f"Failed to fetch profile: {str(e)}"}), 500
+
+
+@app.route("/profile", methods=["PUT"])
+@require_auth
+async def update_profile():
+    try:
+        user_id = request.user.id
+
+        data = await request.get_json()
+        update_data = {key: data.get(key) for key in ("first_name", "last_name", "gender", "dob", "age", "address")}
+        update_data = {k: v for k, v in update_data.items() if v is not None}
+
+        update_response = await supabase.table("user_profile").update(update_data).eq("user_id", user_id).execute()
+        await run_io(profile_cache.invalidate, user_id)
+
+        if not update_response.data:
+            return jsonify({"error": "Failed to update profile"}), 500
+
+        logging.info(f"Profile updated for user_id: {user_id}")
+        return jsonify({"message": "Profile updated successfully"}), 200
+
+    except Exception as e:
+        logging.error(f"Error updating profile: {e}")
+        return jsonify({"error": f"Failed to update profile: {str(e)}"}), 500
+
+
+@app.route("/profile/image", methods=["POST"])
+@require_auth
+async def upload_profile_image():
+    files = await request.files
+    if "file" not in files:
+        return jsonify({"error": "No file part"}), 400
+
+    file = files["file"]
+    if file.filename == "":
+        return jsonify({"error": "No selected file"}), 400
+
+    if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+        return jsonify({"error": "Invalid file format. Please upload an image (PNG, JPG, JPEG)."}), 400
+
+    try:
+        user_id = request.user.id
+
+        file_path = f"public/{user_id}.jpg"
+        await supabase.storage.from_("profile-images").upload(file_path, file.read(), {"upsert": "true"})
+
+        public_url = await supabase.storage.from_("profile-images").get_public_url(file_path)
+
+        await supabase.auth.admin.update_user_by_id(user_id, {"user_metadata": {"avatar_url": public_url}})
+        await run_io(profile_cache.invalidate, user_id)
+
+        logging.info(f"Profile image uploaded for user_id: {user_id}")
+        return jsonify({"message": "Profile image uploaded successfully", "avatar_url": public_url}), 200
+
+    except Exception as e:
+        logging.error(f"Error uploading profile image: {e}")
+        return jsonify({"error": f"Failed to upload profile image: {str(e)}"}), 500
+
+
+@app.route("/download_report", methods=["GET"])
+@require_auth
+async def download_report():
+    try:
+        scan_id = request.args.get("scanId")
+        if not scan_id:
+            return jsonify({"error": "Scan ID is required"}), 400
+
+        # Only the scan's owner gets its report, or learns that it hasn't changed. The owner is the
+        # requester, so their profile is looked up alongside the scan.
+        scan_response, user_data = await asyncio.gather(
+            supabase.table("scan_record").select("*").eq("scan_id", scan_id).limit(1).execute(),
+            load_report_profile(request.user.id)
+        )
+        if not scan_response.data or scan_response.data[0]["user_id"] != request.user.id:
+            return jsonify({"error": "Scan record not found"}), 404
+        scan_data = scan_response.data[0]
+        key = report_key(scan_id, user_data)
+
+        # The client already has this report, with the current profile name
+        if request.if_none_match.contains_weak(key):
+            response = Response(status=304)
+            response.set_etag(key, weak=True)
+            return response
+
+        # Serve the report pre-rendered after /predict
+        pdf = await report_fetcher.fetch_path_async(supabase, f"{key}.pdf")
+        if pdf is not None:
+            return send_report(scan_id, key, pdf)
+
+        # Fetch the rest of the scan's records and its image at once
+        analysis_response, recommendation_response, image_content = await asyncio.gather(
+            supabase.table("analysis").select("*").eq("scan_id", scan_id).single().execute(),
+            supabase.table("recommendation").select("*").eq("scan_id", scan_id).single().execute(),
+            fetch_scan_image(scan_id, None)
+        )
+        analysis_data = analysis_response.data if analysis_response.data else {}
+        recommendation_data = recommendation_response.data if recommendation_response.data else {}
+
+        # Scans stored before thumbnails existed only have the full image
+        if image_content is None and scan_data.get("image_url"):
+            image_content = await fetch_scan_image(None, scan_data["image_url"], prefer_thumbnail=False)
+
+        # Generate the PDF and store it for later downloads
+        pdf = await store_report(scan_id, scan_data, analysis_data, recommendation_data, user_data, image_content)
+        return send_report(scan_id, key, pdf)
+    except Exception as e:
+        logging.error(f"Error generating report: {e}")
+        return jsonify({"error": f"Failed to generate report: {str(e)}"}), 500
+
+
+@app.route("/scans", methods=["GET"])
+@admit(light_admission)
+@require_auth
+async def get_scans():
+    try:
+        user_id = request.user.id
+        scans_response = await supabase.table("scan_record").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
+        return jsonify(scans_response.data), 200
+    except Exception as e:
+        logging.error(f"Error fetching scans: {e}")
+        return jsonify({"error": f"Failed to fetch scans: {str(e)}"}), 500
+
+
+@app.route("/scans/stats", methods=["GET"])
+@admit(light_admission)
+@require_auth
+async def get_scan_stats():
+    bucket = request.args.get("bucket", "month")
+    if bucket not in ("month", "week"):
+        return jsonify({"error": "bucket must be 'month' or 'week'"}), 400
+
+    try:
+        summary, _ = await load_scan_stats(request.user.id)
+        return jsonify(summary_view(summary, bucket)), 200
+    except Exception as e:
+        logging.error(f"Error fetching scan stats: {e}")
+        return jsonify({"error": f"Failed to fetch scan stats: {str(e)}"}), 500
+
+
+@app.route("/test-supabase", methods=["GET"])
+async def test_supabase():
+    try:
+        response = await supabase.table("user_profile").select("user_id").limit(1).execute()
+        return jsonify({"message": "Supabase connection successful", "data": response.data}), 200
+    except Exception as e:
+        return jsonify({"error": f"Supabase connection failed: {str(e)}"}), 500
+
+
+@app.route("/drift", methods=["GET"])
+@admit(light_admission)
+@require_auth
+async def drift_report():
+    try:
+        return jsonify(await run_cpu(drift_monitor.report, DRIFT_BASELINE)), 200
+    except Exception as e:
+        logging.error(f"Error building drift report: {str(e)}", exc_info=True)
+        return jsonify({"error": f"Failed to build drift report: {str(e)}"}), 500
+
+
+@app.route("/health", methods=["GET"])
+@admit(light_admission)
+async def health_check():
+    return jsonify({
+        "status": "Server is alive",
+        "inference": await run_io(inference_backend.stats),
+        "admission": {"inference": inference_admission.stats(), "light": light_admission.stats()},
+    }), 200
+
+
+if __name__ == '__main__':
+    app.run(debug=True, host="0.0.0.0", port=7000)
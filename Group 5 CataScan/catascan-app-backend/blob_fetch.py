@@ -0,0 +1,137 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared fetch layer for scan images.
+# Objects in our own bucket are read through the Supabase storage API, anything else through a
+# pooled keep-alive session with timeouts. Fetched objects are kept in a size-bounded on-disk
+# LRU cache (file mtime is the recency), which is safe to share between gunicorn workers.
+
+
+class BlobFetcher:
+    def __init__(self, supabase, supabase_url, bucket, cache_dir, max_cache_bytes=256 * 1024 * 1024,
+                 timeout=(3.05, 10), pool_size=10):
+        self.supabase = supabase
+        self.bucket = bucket
+        self.public_prefix = f"{supabase_url.rstrip('/')}/storage/v1/object/public/{bucket}/" if supabase_url else None
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.timeout = timeout
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504], allowed_methods=["GET"])
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self._cache_bytes = self._scan_cache_size()
+
+    def _cache_file(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest())
+
+    def _scan_cache_size(self):
+        return sum(entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.is_file())
+
+    def _cache_get(self, key):
+        path = self._cache_file(key)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            os.utime(path)  # Mark as recently used
+            return content
+        except FileNotFoundError:
+            return None
+
+    def _cache_put(self, key, content):
+        if len(content) > self.max_cache_bytes:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, self._cache_file(key))
+        with self._lock:
+            self._cache_bytes += len(content)
+            if self._cache_bytes > self.max_cache_bytes:
+                self._evict()
+
+    # Function to delete least recently used objects until the cache is back under 90% of its limit
+    def _evict(self):
+        entries = sorted(
+            (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+            for entry in os.scandir(self.cache_dir) if entry.is_file() and not entry.name.endswith(".tmp")
+        )
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_cache_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._cache_bytes = total
+
+    # Function to get the bucket path of a public URL in our bucket, or None
+    def bucket_path(self, url):
+        if self.public_prefix and url.split("?")[0].startswith(self.public_prefix):
+            return url.split("?")[0][len(self.public_prefix):]
+        return None
+
+    # Function to fetch an object from our bucket by path. Returns bytes or None.
+    def fetch_path(self, path):
+        key = f"{self.bucket}/{path}"
+        content = self._cache_get(key)
+        if content is not None:
+            return content
+        try:
+            content = self.supabase.storage.from_(self.bucket).download(path)
+        except Exception as e:
+            logging.info(f"Storage download of {path} failed: {str(e)}")
+            return None
+        self._cache_put(key, content)
+        return content
+
+    # Async variant of fetch_path, using an async Supabase client (supabase.acreate_client)
+    # The disk cache is read and written on a worker thread, so the event loop never waits on the disk
+    async def fetch_path_async(self, async_supabase, path):
+        key = f"{self.bucket}/{path}"
+        content = await asyncio.to_thread(self._cache_get, key)
+        if content is not None:
+            return content
+        try:
+            content = await async_supabase.storage.from_(self.bucket).download(path)
+        except Exception as e:
+            logging.info(f"Storage download of {path} failed: {str(e)}")
+            return None
+        await asyncio.to_thread(self._cache_put, key, content)
+        return content
+
+    # Function to fetch a URL, reading our own bucket through the storage API. Returns bytes or None.
+    def fetch(self, url):
+        path = self.bucket_path(url)
+        if path is not None:
+            return self.fetch_path(path)
+
+        content = self._cache_get(url)
+        if content is not None:
+            return content
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            logging.warning(f"Failed to fetch {url}: {str(e)}")
+            return None
+        if response.status_code != 200:
+            return None
+        self._cache_put(url, response.content)
+        return response.content
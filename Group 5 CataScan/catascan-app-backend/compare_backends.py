@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import numpy as np
+from PIL import Image as PilImage
+from inference import BACKENDS, create_backend, preprocess_batch, IMG_SIZE
+
+# Parity check and CPU benchmark for the inference backends.
+# Every backend scores the same preprocessed batch; each one is compared with the first (reference)
+# backend for the largest probability difference and top-1 agreement, then timed at batch size 1 and
+# at --batch-size. Exits with status 1 if any backend disagrees or fails to load or run, so it can gate
+# a backend switch.
+#
+#   python compare_backends.py --images ./images --backends tflite,keras,onnx
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+# The remote backend needs a running model_server.py, so it is only compared when asked for
+LOCAL_BACKENDS = [name for name in BACKENDS if name != "remote"]
+# Largest allowed probability difference per backend's artifact. The TFLite model is converted with
+# fp16/quantized weights, so it (and the model server, which serves it by default) drifts more from the
+# float32 Keras and ONNX models. A pair is checked against the larger tolerance of the two.
+DEFAULT_TOLERANCES = {"tflite": 2e-2, "keras": 1e-3, "onnx": 1e-3, "remote": 2e-2}
+
+
+# Function to parse --tolerance: one value for every backend, or name=value pairs over the defaults
+def parse_tolerances(value):
+    tolerances = dict(DEFAULT_TOLERANCES)
+    if not value:
+        return tolerances
+    if "=" not in value:
+        return {name: float(value) for name in BACKENDS}
+    for pair in value.split(","):
+        name, _, tolerance = pair.partition("=")
+        tolerances[name.strip()] = float(tolerance)
+    return tolerances
+
+
+# Function to load the sample batch: images from a folder, or seeded random inputs
+def load_inputs(images_dir, count):
+    if images_dir:
+        paths = sorted(
+            os.path.join(images_dir, name) for name in os.listdir(images_dir)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )[:count]
+        if not paths:
+            raise FileNotFoundError(f"No images found in {images_dir}")
+        return preprocess_batch([PilImage.open(path) for path in paths]), paths
+    rng = np.random.default_rng(0)
+    return rng.random((count, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32), None
+
+
+# Function to time repeated predict calls on a batch. Returns the median and p90 in milliseconds.
+def time_calls(backend, batch, runs):
+    backend.predict(batch)  # Warm-up for this batch shape
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        backend.predict(batch)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return round(statistics.median(timings), 2), round(timings[int(0.9 * (len(timings) - 1))], 2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that the inference backends agree and compare their speed")
+    parser.add_argument("--backends", default=",".join(LOCAL_BACKENDS),
+                        help="comma-separated, the first is the reference (add remote to include model_server.py)")
+    parser.add_argument("--images", help="folder of sample images; seeded random inputs are used if omitted")
+    parser.add_argument("--count", type=int, default=16, help="number of inputs to compare")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--tolerance", default=None,
+                        help="largest allowed probability difference: one value, or name=value pairs "
+                             f"(default: {','.join(f'{name}={value:g}' for name, value in DEFAULT_TOLERANCES.items())})")
+    parser.add_argument("--threads", type=int, default=None, help="inference threads for every backend")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    tolerances = parse_tolerances(args.tolerance)
+    inputs, paths = load_inputs(args.images, args.count)
+    print(f"Comparing on {len(inputs)} {'images' if paths else 'random inputs'}")
+
+    results = {}
+    reference = None
+    for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        try:
+            backend = create_backend(name, num_threads=args.threads)
+            outputs = backend.predict(inputs)
+        except Exception as e:
+            print(f"[{name}] FAILED: {e}")
+            results[name] = {"error": str(e)}
+            continue
+
+        entry = {"model_path": backend.model_path, "load_ms": round(backend.stats()["load_s"] * 1000, 1)}
+        if reference is None:
+            reference = (name, outputs)
+        else:
+            diff = float(np.abs(outputs - reference[1]).max())
+            agreement = float((outputs.argmax(axis=1) == reference[1].argmax(axis=1)).mean())
+            tolerance = max(tolerances.get(name, 1e-3), tolerances.get(reference[0], 1e-3))
+            entry.update({
+                "reference": reference[0],
+                "max_abs_diff": diff,
+                "tolerance": tolerance,
+                "top1_agreement": agreement,
+                "parity": diff <= tolerance and agreement == 1.0,
+            })
+
+        entry["batch1_ms"], entry["batch1_p90_ms"] = time_calls(backend, inputs[:1], args.runs)
+        batch = inputs[:args.batch_size]
+        entry[f"batch{len(batch)}_ms"], entry[f"batch{len(batch)}_p90_ms"] = time_calls(backend, batch, args.runs)
+        entry["images_per_s"] = round(len(batch) * 1000 / entry[f"batch{len(batch)}_ms"], 1)
+        results[name] = entry
+
+        parity = "reference" if "parity" not in entry else (
+            f"max diff {entry['max_abs_diff']:.2e} (tolerance {entry['tolerance']:.0e}), top-1 agreement {entry['top1_agreement']:.0%}, "
+            f"{'OK' if entry['parity'] else 'MISMATCH'}"
+        )
+        print(f"[{name}] load {entry['load_ms']} ms, batch 1 {entry['batch1_ms']} ms, "
+              f"batch {len(batch)} {entry[f'batch{len(batch)}_ms']} ms ({entry['images_per_s']} img/s), {parity}")
+
+    agreeing = [name for name, entry in results.items() if "error" not in entry and entry.get("parity", True)]
+    if agreeing:
+        fastest = min(agreeing, key=lambda name: results[name]["batch1_ms"])
+        print(f"Fastest agreeing backend at batch size 1: {fastest} (INFERENCE_BACKEND={fastest})")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if any(entry.get("parity") is False or "error" in entry for entry in results.values()):
+        sys.exit(1)
@@ -1,41 +1,198 @@
 import tensorflow as tf
+import numpy as np
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
 import time
+from artifacts import default_cache, resolve
 
-# Step 1: Load the 250 MB .h5 model
-try:
-    model = tf.keras.models.load_model('./CataScan_v1_best.h5')
-    print("Model loaded successfully")
-    # Optional: Print model summary to verify
-    model.summary()
-except Exception as e:
-    print(f"Error loading model: {e}")
-    exit()
+MODEL_NAME = 'CataScan_v1_best.h5'
+OUTPUT_PATH = 'CataScan_v1_best.tflite'
+REPORT_PATH = 'conversion_report.json'
+# Bump when the conversion below changes, so cached conversions of the same model are redone
+CONVERSION_VERSION = "1"
+FORCE = "--force" in sys.argv  # Convert even if this model was converted before
+# Path to the TFLite benchmark_model binary, used for per-op latency (TFLite profiler)
+BENCHMARK_MODEL_BIN = os.getenv("BENCHMARK_MODEL_BIN", "benchmark_model")
+LOAD_RUNS = 5
 
-# Step 2: Start timing and convert to TFLite
-start_time = time.time()
-try:
+# Conversion variants, tried in order. The first one that converts becomes OUTPUT_PATH.
+VARIANTS = {
+    "builtins": [tf.lite.OpsSet.TFLITE_BUILTINS],
+    "select_tf_ops": [
+        tf.lite.OpsSet.TFLITE_BUILTINS,  # Default TFLite ops
+        tf.lite.OpsSet.SELECT_TF_OPS     # Fallback for unsupported ops (needs the Flex delegate)
+    ],
+}
+
+# Function to convert the model with the given op sets
+def convert(model, supported_ops):
     converter = tf.lite.TFLiteConverter.from_keras_model(model)
-    # Add FP16 and extended ops support
     converter.target_spec.supported_types = [tf.float16]  # For your f16 tensors
-    converter.target_spec.supported_ops = [
-        tf.lite.OpsSet.TFLITE_BUILTINS,  # Default TFLite ops
-        tf.lite.OpsSet.SELECT_TF_OPS     # Fallback for unsupported ops
-    ]
-    converter.allow_custom_ops = True  # Handle potential custom ops
-    tflite_model = converter.convert()
-    print("Conversion successful")
-except Exception as e:
-    print(f"Error during conversion: {e}")
-    exit()
+    converter.target_spec.supported_ops = supported_ops
+    if tf.lite.OpsSet.SELECT_TF_OPS in supported_ops:
+        converter.allow_custom_ops = True  # Handle potential custom ops
+    return converter.convert()
+
+# Function to map a tensor name such as "model/block6a_expand_conv/Conv2D" to its Keras layer
+def layer_from_tensor_name(name):
+    parts = name.split(";")[0].split("/")
+    return parts[1] if len(parts) > 1 else parts[0]
+
+# Function to list the ops of a converted model, with the Flex ops and the layers they come from.
+# TensorFlow has no public API that returns the ops (tf.lite.experimental.Analyzer only prints them), so
+# this uses the interpreter's private _get_ops_details() and returns (None, None) if it is unavailable.
+def op_coverage(tflite_model):
+    interpreter = tf.lite.Interpreter(model_content=tflite_model)
+    get_ops_details = getattr(interpreter, "_get_ops_details", None)
+    if get_ops_details is None:
+        return None, None
+    try:
+        ops = get_ops_details()
+    except Exception as e:
+        print(f"Op listing failed: {e}")
+        return None, None
+    tensor_names = {t['index']: t['name'] for t in interpreter.get_tensor_details()}
+
+    op_counts = {}
+    flex_ops = []
+    for op in ops:
+        op_counts[op['op_name']] = op_counts.get(op['op_name'], 0) + 1
+        if op['op_name'].startswith("Flex"):
+            layers = sorted({layer_from_tensor_name(tensor_names[i]) for i in op['outputs'] if i in tensor_names})
+            flex_ops.append({"op": op['op_name'], "index": op['index'], "layers": layers})
+    return op_counts, flex_ops
+
+# Function to parse the Flex ops named in a failed builtins-only conversion
+def flex_ops_from_error(error):
+    match = re.search(r"Flex ops: ([^\n]+)", str(error))
+    return [op.strip().rstrip(".") for op in match.group(1).split(",")] if match else []
+
+# Function to measure interpreter load time and single-image invoke latency
+def measure_load_and_invoke(path):
+    load_times = []
+    for _ in range(LOAD_RUNS):
+        start = time.perf_counter()
+        interpreter = tf.lite.Interpreter(model_path=path)
+        interpreter.allocate_tensors()
+        load_times.append(time.perf_counter() - start)
 
-# Step 3: End timing and save the .tflite model
-end_time = time.time()
+    input_details = interpreter.get_input_details()
+    dummy = np.random.rand(*input_details[0]['shape']).astype(input_details[0]['dtype'])
+    interpreter.set_tensor(input_details[0]['index'], dummy)
+    interpreter.invoke()  # Warm-up
+    start = time.perf_counter()
+    interpreter.invoke()
+    invoke_time = time.perf_counter() - start
+
+    return {"load_ms": round(1000 * float(np.median(load_times)), 2), "invoke_ms": round(1000 * invoke_time, 2)}
+
+# Function to collect per-op latency with the TFLite profiler (benchmark_model --enable_op_profiling)
+def profile_ops(path):
+    binary = shutil.which(BENCHMARK_MODEL_BIN)
+    if not binary:
+        return None
+    result = subprocess.run(
+        [binary, f"--graph={path}", "--enable_op_profiling=true", "--num_runs=20"],
+        capture_output=True, text=True
+    )
+    # Parse the "Summary by node type" table: node type, count, avg ms, avg %, ...
+    per_op = {}
+    in_summary = False
+    for line in result.stdout.splitlines() + result.stderr.splitlines():
+        if "Summary by node type" in line:
+            in_summary = True
+            continue
+        if in_summary:
+            fields = line.split()
+            if len(fields) >= 4 and fields[0] not in ("[Node", "Timings"):
+                try:
+                    per_op[fields[0]] = {"count": int(fields[1]), "avg_ms": float(fields[2])}
+                except ValueError:
+                    continue
+            elif per_op and not line.strip():
+                break
+    return per_op
+
+# Function to convert the source model into output_path (steps 1 to 3). Returns the conversion report.
+def run_conversion(source_path, output_path):
+    # Step 1: Load the 250 MB .h5 model
+    try:
+        model = tf.keras.models.load_model(source_path)
+        print("Model loaded successfully")
+        # Optional: Print model summary to verify
+        model.summary()
+    except Exception as e:
+        print(f"Error loading model: {e}")
+        exit()
+
+    # Step 2: Convert every variant, builtins-only first
+    report = {"source": MODEL_NAME, "variants": {}}
+    chosen = None
+    for name, supported_ops in VARIANTS.items():
+        entry = {}
+        start_time = time.time()
+        try:
+            tflite_model = convert(model, supported_ops)
+        except Exception as e:
+            entry["error"] = str(e).splitlines()[0]
+            entry["flex_ops"] = [{"op": op, "layers": []} for op in flex_ops_from_error(e)]
+            report["variants"][name] = entry
+            print(f"[{name}] conversion failed: {entry['error']}")
+            continue
+        entry["conversion_s"] = round(time.time() - start_time, 2)
+
+        # Next to output_path, which converted() places in its scratch directory
+        variant_path = os.path.splitext(output_path)[0] + f".{name}.tflite"
+        with open(variant_path, 'wb') as f:
+            f.write(tflite_model)
+        entry["file"] = os.path.basename(variant_path)
+        entry["size_mb"] = round(len(tflite_model) / (1024 * 1024), 2)
+
+        # Step 3: Op coverage, load time and per-op latency for this variant
+        entry["op_counts"], entry["flex_ops"] = op_coverage(tflite_model)
+        # Unknown without the op listing
+        entry["needs_flex_delegate"] = bool(entry["flex_ops"]) if entry["flex_ops"] is not None else None
+        entry.update(measure_load_and_invoke(variant_path))
+        entry["per_op_latency"] = profile_ops(variant_path)
+        report["variants"][name] = entry
+
+        flex_summary = f"{len(entry['flex_ops'])} Flex ops" if entry["flex_ops"] is not None else "op listing unavailable"
+        print(f"[{name}] {entry['size_mb']} MB, load {entry['load_ms']} ms, invoke {entry['invoke_ms']} ms, {flex_summary}")
+        for op in entry["flex_ops"] or []:
+            print(f"    {op['op']} <- {', '.join(op['layers'])}")
+        if entry["per_op_latency"] is None:
+            print(f"    Per-op latency skipped: {BENCHMARK_MODEL_BIN} not found")
+
+        if chosen is None:
+            chosen = name
+
+    if chosen is None:
+        print("Error during conversion: no variant converted")
+        exit()
+
+    shutil.copyfile(os.path.join(os.path.dirname(output_path), report["variants"][chosen]["file"]), output_path)
+    report["chosen"] = chosen
+    return report
+
+# Step 0: Find the source model in the artifact cache. If this exact model was already converted with
+# this TensorFlow version and conversion, the cached .tflite and report are reused.
+source_path = resolve(MODEL_NAME)
+recipe = f"convert.py v{CONVERSION_VERSION}, tensorflow {tf.__version__}, variants {','.join(VARIANTS)}"
+cache = default_cache()
+tflite_path, report, converted_now = cache.converted(source_path, recipe, OUTPUT_PATH, run_conversion, force=FORCE)
+if not converted_now:
+    print(f"{MODEL_NAME} is unchanged since its last conversion, reusing the cached {OUTPUT_PATH} (--force to convert again)")
+
+# Step 4: Save the preferred variant and the report
 try:
-    with open('CataScan_v1_best.tflite', 'wb') as f:
-        f.write(tflite_model)
-    print("Model saved successfully")
+    cache.export(tflite_path, OUTPUT_PATH)
+    with open(REPORT_PATH, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Model saved successfully ({report['chosen']}), report written to {REPORT_PATH}")
 except Exception as e:
     print(f"Error saving model: {e}")
     exit()
-
-print(f"Conversion took {end_time - start_time:.2f} seconds")
\ No newline at end of file
@@ -1,21 +1,13 @@
-import tensorflow as tf
 import numpy as np
 from PIL import Image as PilImage
 import matplotlib.pyplot as plt
 import os
-from huggingface_hub import hf_hub_download
+from artifacts import resolve
+from inference import create_backend
 
-# Set float32 policy
-tf.keras.mixed_precision.set_global_policy('float32')
-
-# Load the Keras .h5 model from Hugging Face
-repo_id = "GeorgeET15/CataScan_v1_best"
-filename = "CataScan_v1_best.h5"
-model_path = "CataScan_v1_best.h5"
-
-if not os.path.exists(model_path):
-    hf_hub_download(repo_id=repo_id, filename=filename, local_dir="./")
-model = tf.keras.models.load_model(model_path)
+# Load the Keras .h5 model through the artifact cache (downloaded from Hugging Face the first time)
+model_path = resolve("CataScan_v1_best.h5")
+backend = create_backend("keras", model_path)
 
 # Function to load an image from a local file
 def load_image(file_path):
@@ -103,8 +95,9 @@ def run_demo(file_path, save_path="output_visualization.png"):
     stages, final_input = process_image_with_stages(image)
     
     print("Making prediction...")
-    prediction = model.predict(final_input)
-    predicted_class = tf.argmax(prediction, axis=1).numpy()[0]
+    prediction = backend.predict(final_input)
+    print(f"Inference took {backend.stats()['last_call_s'] * 1000:.1f} ms")
+    predicted_class = np.argmax(prediction, axis=1)[0]
     class_names = {0: "immature", 1: "mature", 2: "normal"}  # Adjust based on your model's classes
     confidence = prediction[0][predicted_class] * 100
     
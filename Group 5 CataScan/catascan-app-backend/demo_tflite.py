@@ -1,20 +1,13 @@
-import tensorflow as tf
 import numpy as np
 from PIL import Image as PilImage
 import matplotlib.pyplot as plt
 import os
+from artifacts import resolve
+from inference import create_backend
 
-# Load the TFLite model
-tflite_path = "./CataScan_v1_best.tflite"
-if not os.path.exists(tflite_path):
-    raise FileNotFoundError(f"TFLite model not found at: {tflite_path}. Please ensure it exists.")
-
-interpreter = tf.lite.Interpreter(model_path=tflite_path)
-interpreter.allocate_tensors()
-
-# Get input and output details
-input_details = interpreter.get_input_details()
-output_details = interpreter.get_output_details()
+# Load the TFLite model through the artifact cache (run convert.py first if it isn't there)
+tflite_path = resolve("CataScan_v1_best.tflite")
+backend = create_backend("tflite", tflite_path)
 
 # Function to load an image from a local file
 def load_image(file_path):
@@ -91,20 +84,9 @@ def run_demo(file_path, save_path="output_visualization.png"):
     print("Processing image through stages...")
     stages, final_input = process_image_with_stages(image)
     
-    # Check input type compatibility
-    expected_dtype = input_details[0]['dtype']
-    if expected_dtype == np.float16:
-        final_input = final_input.astype(np.float16)
-        print("Converted input to float16 for TFLite model")
-    elif expected_dtype == np.float32:
-        print("Input already in float32, compatible with TFLite model")
-    else:
-        raise ValueError(f"Unexpected input dtype: {expected_dtype}. Expected float32 or float16.")
-
     print("Making prediction with TFLite...")
-    interpreter.set_tensor(input_details[0]['index'], final_input)
-    interpreter.invoke()
-    prediction = interpreter.get_tensor(output_details[0]['index'])
+    prediction = backend.predict(final_input)  # The backend casts to the model's input dtype
+    print(f"Inference took {backend.stats()['last_call_s'] * 1000:.1f} ms")
     
     predicted_class = np.argmax(prediction, axis=1)[0]
     class_names = {0: "immature", 1: "mature", 2: "normal"}  # Adjust based on your model
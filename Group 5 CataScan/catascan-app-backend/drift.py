@@ -0,0 +1,374 @@
+import argparse
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+import numpy as np
+
+# Online input drift monitoring.
+# Every scored image updates fixed-size histograms: per-channel pixel values and brightness of the model
+# input, the upload's long side and aspect ratio, and the predicted class probabilities. Memory is
+# constant however many images are seen, and an update takes a fraction of a millisecond (pixel
+# histograms use a subsampled grid), next to tens of milliseconds for the inference itself. Histograms decay with a half-life in images, so they describe recent traffic.
+#
+# Each process writes its sketch to DRIFT_DIR now and then, so /drift can merge all running gunicorn workers.
+# A baseline sketch is built once from the training images:
+#   python drift.py baseline --data ./model_training/eye_dataset/train --backend tflite
+# and /drift compares the live sketch with it using the population stability index (PSI) per feature:
+# below 0.1 is stable, 0.1 to 0.25 a moderate shift, above 0.25 drift.
+
+PIXEL_SUBSAMPLE = 4  # Pixel histograms use every 4th row and column of the 224x224 input
+FLUSH_INTERVAL = 10  # Seconds between writes of a process's sketch
+STALE_AFTER = 24 * 3600  # Sketches of processes that stopped writing this long ago are ignored
+MIN_SAMPLES = 100  # Below this many (decayed) images a feature is reported as insufficient_data
+PSI_MODERATE = 0.1
+PSI_DRIFT = 0.25
+CHANNELS = ("red", "green", "blue")
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114])  # Brightness from RGB (ITU-R BT.601)
+
+# Histogram groups, each updated by one kind of observation: name -> (low, high, bins, log scale)
+INPUT_FEATURES = {
+    **{channel: (0.0, 1.0, 32, False) for channel in CHANNELS},
+    "brightness": (0.0, 1.0, 32, False),
+}
+SIZE_FEATURES = {
+    "long_side": (64, 8192, 28, True),  # Pixels, quarter-octave bins
+    "aspect_ratio": (1.0, 4.0, 16, True),  # Long side / short side
+}
+
+
+def output_features(class_names):
+    features = {f"p_{name}": (0.0, 1.0, 20, False) for name in class_names}
+    features["predicted_class"] = (0, len(class_names), len(class_names), False)
+    return features
+
+
+# Function to map a value to its bin index, clamping out-of-range values to the edge bins
+def bin_index(value, low, high, bins, log):
+    value = float(value)
+    if log:
+        value, low, high = math.log(max(value, 1e-12)), math.log(low), math.log(high)
+    return min(max(int((value - low) / (high - low) * bins), 0), bins - 1)
+
+
+class DriftSketch:
+    def __init__(self, class_names, half_life=None):
+        self.class_names = list(class_names)
+        self.half_life = half_life
+        self.decay = 0.5 ** (1 / half_life) if half_life else 1.0
+        self.groups = {"input": INPUT_FEATURES, "size": SIZE_FEATURES, "output": output_features(self.class_names)}
+        self.histograms = {
+            name: np.zeros(spec[2]) for features in self.groups.values() for name, spec in features.items()
+        }
+        self.weights = {group: 0.0 for group in self.groups}  # Decayed image counts
+        self.count = 0  # Images seen, not decayed
+
+    def _decay(self, group):
+        if self.decay != 1.0:
+            for name in self.groups[group]:
+                self.histograms[name] *= self.decay
+        self.weights[group] = self.weights[group] * self.decay + 1.0
+
+    # Function to add one preprocessed (224, 224, 3) model input
+    def observe_input(self, model_input):
+        self._decay("input")
+        self.count += 1
+        pixels = np.asarray(model_input, dtype=np.float32)[::PIXEL_SUBSAMPLE, ::PIXEL_SUBSAMPLE].reshape(-1, 3)
+        # All channels share the [0, 1] range, so one bincount over offset bin indices covers them
+        bins = INPUT_FEATURES["red"][2]
+        indices = np.clip((pixels * bins).astype(np.int32), 0, bins - 1) + np.arange(3, dtype=np.int32) * bins
+        counts = np.bincount(indices.ravel(), minlength=3 * bins) / len(pixels)  # Each image adds a total weight of 1
+        for channel_index, channel in enumerate(CHANNELS):
+            self.histograms[channel] += counts[channel_index * bins:(channel_index + 1) * bins]
+        brightness = float(pixels.mean(axis=0) @ LUMA_WEIGHTS)
+        self.histograms["brightness"][bin_index(brightness, *INPUT_FEATURES["brightness"])] += 1
+
+    # Function to add the original dimensions of an upload
+    def observe_size(self, width, height):
+        self._decay("size")
+        long_side, short_side = max(width, height), max(1, min(width, height))
+        self.histograms["long_side"][bin_index(long_side, *SIZE_FEATURES["long_side"])] += 1
+        self.histograms["aspect_ratio"][bin_index(long_side / short_side, *SIZE_FEATURES["aspect_ratio"])] += 1
+
+    # Function to add one prediction, a (num_classes,) probability vector
+    def observe_output(self, probabilities):
+        self._decay("output")
+        probabilities = np.asarray(probabilities).reshape(-1).tolist()
+        for index, name in enumerate(self.class_names):
+            self.histograms[f"p_{name}"][bin_index(probabilities[index], *self.groups["output"][f"p_{name}"])] += 1
+        self.histograms["predicted_class"][probabilities.index(max(probabilities))] += 1
+
+    # Function to add another sketch's counts into this one
+    def merge(self, other):
+        for name, counts in other.histograms.items():
+            if name in self.histograms and len(counts) == len(self.histograms[name]):
+                self.histograms[name] += counts
+        for group, weight in other.weights.items():
+            self.weights[group] = self.weights.get(group, 0.0) + weight
+        self.count += other.count
+        return self
+
+    def to_dict(self):
+        return {
+            "class_names": self.class_names,
+            "half_life": self.half_life,
+            "count": self.count,
+            "weights": self.weights,
+            "histograms": {name: counts.tolist() for name, counts in self.histograms.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["class_names"], data.get("half_life"))
+        sketch.count = data["count"]
+        sketch.weights.update(data["weights"])
+        for name, counts in data["histograms"].items():
+            if name in sketch.histograms:
+                sketch.histograms[name] = np.asarray(counts, dtype=np.float64)
+        return sketch
+
+    # Function to find the group and spec of a feature
+    def spec(self, name):
+        for group, features in self.groups.items():
+            if name in features:
+                return group, features[name]
+        raise KeyError(name)
+
+
+# Function to estimate quantiles from a histogram, interpolating linearly within a bin
+def histogram_quantiles(counts, spec, quantiles=(0.1, 0.5, 0.9)):
+    low, high, bins, log = spec
+    total = counts.sum()
+    if total <= 0:
+        return None
+    cdf = np.cumsum(counts) / total
+    edges_low, edges_high = (math.log(low), math.log(high)) if log else (low, high)
+    width = (edges_high - edges_low) / bins
+    result = {}
+    for q in quantiles:
+        index = int(np.searchsorted(cdf, q))
+        index = min(index, bins - 1)
+        previous = cdf[index - 1] if index > 0 else 0.0
+        fraction = (q - previous) / (cdf[index] - previous) if cdf[index] > previous else 0.5
+        value = edges_low + (index + fraction) * width
+        result[f"p{int(q * 100)}"] = round(float(math.exp(value) if log else value), 4)
+    return result
+
+
+# Function to compute the population stability index between two histograms
+def psi(expected, actual, epsilon=1e-4):
+    expected = expected / expected.sum() + epsilon
+    actual = actual / actual.sum() + epsilon
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def psi_status(value):
+    if value < PSI_MODERATE:
+        return "stable"
+    return "moderate" if value < PSI_DRIFT else "drift"
+
+
+# Function to compare a live sketch with the baseline, feature by feature
+def compare(baseline, live, min_samples=MIN_SAMPLES):
+    features = {}
+    for name in live.histograms:
+        if name not in baseline.histograms:
+            continue
+        group, spec = live.spec(name)
+        entry = {"samples": round(live.weights[group], 1)}
+        if baseline.histograms[name].sum() <= 0:
+            entry["status"] = "no_baseline"
+        elif live.weights[group] < min_samples:
+            entry["status"] = "insufficient_data"
+        else:
+            entry["psi"] = round(psi(baseline.histograms[name], live.histograms[name]), 4)
+            entry["status"] = psi_status(entry["psi"])
+        if name == "predicted_class":
+            entry["baseline_share"] = shares(baseline.histograms[name], live.class_names)
+            entry["live_share"] = shares(live.histograms[name], live.class_names)
+        elif name not in CHANNELS:
+            entry["baseline_quantiles"] = histogram_quantiles(baseline.histograms[name], spec)
+            entry["live_quantiles"] = histogram_quantiles(live.histograms[name], spec)
+        features[name] = entry
+
+    scored = [entry["psi"] for entry in features.values() if "psi" in entry]
+    return {
+        "status": psi_status(max(scored)) if scored else "insufficient_data",
+        "max_psi": round(max(scored), 4) if scored else None,
+        "features": features,
+    }
+
+
+def shares(counts, class_names):
+    total = counts.sum()
+    return {name: round(float(counts[index] / total), 4) if total else None for index, name in enumerate(class_names)}
+
+
+# Function to check whether a process on this host is still running
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Running, but owned by another user
+    return True
+
+
+# Per-process sketch used by the app, written to a directory shared by all workers on the host
+class DriftMonitor:
+    def __init__(self, sketch_dir, class_names, half_life=2000, flush_interval=FLUSH_INTERVAL):
+        self.sketch_dir = sketch_dir
+        self.class_names = list(class_names)
+        self.half_life = half_life
+        self.flush_interval = flush_interval
+        os.makedirs(sketch_dir, exist_ok=True)
+        self._sketch = DriftSketch(self.class_names, half_life)
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._pid = os.getpid()
+        self._baseline = None  # (path, mtime, baseline dict, sketch)
+
+    # After a fork the child starts its own sketch instead of repeating the parent's
+    def _sketch_for_process(self):
+        if self._pid != os.getpid():
+            self._sketch = DriftSketch(self.class_names, self.half_life)
+            self._pid = os.getpid()
+        return self._sketch
+
+    def observe(self, model_input=None, probabilities=None):
+        with self._lock:
+            sketch = self._sketch_for_process()
+            if model_input is not None:
+                sketch.observe_input(model_input)
+            if probabilities is not None:
+                sketch.observe_output(probabilities)
+        self._maybe_flush()
+
+    def observe_size(self, width, height):
+        with self._lock:
+            self._sketch_for_process().observe_size(width, height)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._last_flush = time.monotonic()
+            data = json.dumps(self._sketch_for_process().to_dict())
+        fd, tmp_path = tempfile.mkstemp(dir=self.sketch_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(self.sketch_dir, f"{os.getpid()}.json"))
+
+    # Function to merge the sketches of every running process that wrote recently. Sketches left by
+    # exited workers are removed, so a restart doesn't count their images again next to its own.
+    def live_sketch(self):
+        self.flush()
+        merged = DriftSketch(self.class_names, self.half_life)
+        cutoff = time.time() - STALE_AFTER
+        for entry in os.scandir(self.sketch_dir):
+            name, extension = os.path.splitext(entry.name)
+            if extension != ".json":
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff or (name.isdigit() and not process_alive(int(name))):
+                    os.remove(entry.path)
+                    continue
+                with open(entry.path) as f:
+                    merged.merge(DriftSketch.from_dict(json.load(f)))
+            except (FileNotFoundError, ValueError, KeyError):
+                continue
+        return merged
+
+    # Function to load the baseline file, re-reading it only when it changes. Returns (info, sketch) or None.
+    def baseline(self, path):
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+        if self._baseline is None or self._baseline[:2] != (path, mtime):
+            with open(path) as f:
+                data = json.load(f)
+            info = {key: data.get(key) for key in ("created_at", "data", "images", "backend")}
+            self._baseline = (path, mtime, info, DriftSketch.from_dict(data["sketch"]))
+        return self._baseline[2], self._baseline[3]
+
+    # Function to build the /drift report
+    def report(self, baseline_path):
+        live = self.live_sketch()
+        baseline = self.baseline(baseline_path)
+        if baseline is None:
+            return {"status": "no_baseline", "baseline": None, "images_seen": live.count}
+        info, baseline_sketch = baseline
+        result = compare(baseline_sketch, live)
+        result.update({"baseline": info, "images_seen": live.count, "half_life": self.half_life})
+        return result
+
+
+# Function to build a baseline sketch from a folder of training images (one subfolder per class)
+def build_baseline(data_dir, class_names, backend=None, batch_size=32, workers=4):
+    from concurrent.futures import ThreadPoolExecutor
+    from PIL import Image as PilImage
+    from inference import preprocess_image
+
+    paths = sorted(
+        os.path.join(root, name) for root, _, names in os.walk(data_dir) for name in names
+        if name.lower().endswith((".jpg", ".jpeg", ".png", ".webp"))
+    )
+    if not paths:
+        raise FileNotFoundError(f"No images found in {data_dir}")
+
+    def load(path):
+        with PilImage.open(path) as image:
+            return image.size, preprocess_image(image)
+
+    sketch = DriftSketch(class_names)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(paths), batch_size):
+            loaded = list(executor.map(load, paths[start:start + batch_size]))
+            for (width, height), model_input in loaded:
+                sketch.observe_size(width, height)
+                sketch.observe_input(model_input)
+            if backend is not None:
+                for probabilities in backend.predict(np.stack([model_input for _, model_input in loaded])):
+                    sketch.observe_output(probabilities)
+            logging.info(f"Baseline: {min(start + batch_size, len(paths))}/{len(paths)} images")
+    return sketch, len(paths)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the drift baseline from the training images")
+    parser.add_argument("command", choices=["baseline"])
+    parser.add_argument("--data", default="./model_training/eye_dataset/train", help="training images")
+    parser.add_argument("--backend", default="tflite",
+                        help="inference backend for the probability baseline, or 'none' to skip it")
+    parser.add_argument("--model-path", default=None)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--output", default=os.getenv("DRIFT_BASELINE", "./drift_baseline.json"))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    backend = None
+    if args.backend != "none":
+        from inference import create_backend
+        backend = create_backend(args.backend, args.model_path)
+    class_names = ["immature", "mature", "normal"]  # Model output order, as in scan_service.CLASS_NAMES
+
+    sketch, images = build_baseline(args.data, class_names, backend, args.batch_size, args.workers)
+    with open(args.output, "w") as f:
+        json.dump({
+            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "data": args.data,
+            "images": images,
+            "backend": backend.name if backend else None,
+            "sketch": sketch.to_dict(),
+        }, f)
+    print(f"Baseline of {images} images written to {args.output}")
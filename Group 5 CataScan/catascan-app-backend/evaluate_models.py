@@ -0,0 +1,215 @@
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image as PilImage
+from inference import create_backend, preprocess_image
+
+# Accuracy and speed regression gate for the model artifacts.
+# Scores every artifact (.h5, the quantized .h5, each .tflite, .onnx) on the same held-out set, laid out
+# like the training data (one folder per class), with the same preprocessing the app uses. Images are
+# decoded in parallel once and shared by all artifacts; inference runs in batches. For each artifact it
+# reports accuracy, the confusion matrix, per-class precision and recall, batched throughput and batch
+# size 1 latency. Every artifact after the first (the reference) fails the gate if its accuracy or any
+# class's recall drops, or its latency grows, past the thresholds. Exits with status 1 on failure.
+#
+#   python evaluate_models.py --data ./model_training/eye_dataset/test \
+#       CataScan_v1_best.h5 CataScan_v1_quantized.h5 CataScan_v1_best.tflite
+
+CLASS_NAMES = ["immature", "mature", "normal"]  # Class folder names in index order, as in training
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+EXTENSION_BACKENDS = {".h5": "keras", ".keras": "keras", ".tflite": "tflite", ".onnx": "onnx"}
+DEFAULT_ARTIFACTS = ["CataScan_v1_best.h5", "CataScan_v1_quantized.h5", "CataScan_v1_best.tflite"]
+
+
+# Function to list the held-out images as (path, class index), in a fixed order
+def list_dataset(data_dir):
+    samples = []
+    for label, class_name in enumerate(CLASS_NAMES):
+        class_dir = os.path.join(data_dir, class_name)
+        if not os.path.isdir(class_dir):
+            raise FileNotFoundError(f"Missing class folder {class_dir}")
+        samples += [
+            (os.path.join(class_dir, name), label) for name in sorted(os.listdir(class_dir))
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+    if not samples:
+        raise FileNotFoundError(f"No images found in {data_dir}")
+    return samples
+
+
+# Function to fingerprint the held-out set from its file names and sizes, so reports can be compared
+def dataset_fingerprint(samples):
+    digest = hashlib.sha256()
+    for path, label in samples:
+        digest.update(f"{os.path.basename(path)}:{os.path.getsize(path)}:{label}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def load_image(path):
+    with PilImage.open(path) as image:
+        return preprocess_image(image)
+
+
+# Function to decode and preprocess the held-out images on a thread pool (Pillow releases the GIL while decoding)
+def load_dataset(samples, workers):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        inputs = np.stack(list(executor.map(load_image, [path for path, _ in samples])))
+    return inputs, np.array([label for _, label in samples])
+
+
+# Function to score the inputs in batches. Returns (predicted class indices, images per second).
+def run_batched(backend, inputs, batch_size):
+    backend.predict(inputs[:batch_size])  # Warm-up: model load and this batch shape
+    predictions = []
+    start = time.perf_counter()
+    for i in range(0, len(inputs), batch_size):
+        predictions.append(backend.predict(inputs[i:i + batch_size]).argmax(axis=1))
+    elapsed = time.perf_counter() - start
+    return np.concatenate(predictions), len(inputs) / elapsed
+
+
+# Function to time single-image calls, the way /predict runs. Returns the median and p90 in milliseconds.
+def time_single(backend, inputs, runs):
+    backend.predict(inputs[:1])
+    timings = []
+    for i in range(runs):
+        start = time.perf_counter()
+        backend.predict(inputs[i % len(inputs)])
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return round(statistics.median(timings), 2), round(timings[int(0.9 * (len(timings) - 1))], 2)
+
+
+# Function to compute accuracy, the confusion matrix (rows: true class, columns: predicted) and per-class metrics
+def classification_metrics(labels, predictions):
+    num_classes = len(CLASS_NAMES)
+    matrix = np.zeros((num_classes, num_classes), dtype=int)
+    np.add.at(matrix, (labels, predictions), 1)
+
+    per_class = {}
+    for index, class_name in enumerate(CLASS_NAMES):
+        true_positives = matrix[index, index]
+        predicted = matrix[:, index].sum()
+        actual = matrix[index, :].sum()
+        per_class[class_name] = {
+            "precision": round(true_positives / predicted, 4) if predicted else None,
+            "recall": round(true_positives / actual, 4) if actual else None,
+            "support": int(actual),
+        }
+    return {
+        "accuracy": round(float(np.trace(matrix) / matrix.sum()), 4),
+        "confusion_matrix": matrix.tolist(),
+        "per_class": per_class,
+    }
+
+
+# Function to check an artifact against the reference. Returns the list of failed checks.
+def regressions(entry, reference, args):
+    failures = []
+    if entry["accuracy"] < args.min_accuracy:
+        failures.append(f"accuracy {entry['accuracy']:.2%} is below {args.min_accuracy:.2%}")
+    if reference is None:
+        return failures
+
+    drop = reference["accuracy"] - entry["accuracy"]
+    if drop > args.max_accuracy_drop:
+        failures.append(f"accuracy dropped {drop:.2%} (limit {args.max_accuracy_drop:.2%})")
+    for class_name in CLASS_NAMES:
+        recall, reference_recall = entry["per_class"][class_name]["recall"], reference["per_class"][class_name]["recall"]
+        if recall is not None and reference_recall is not None and reference_recall - recall > args.max_recall_drop:
+            failures.append(f"{class_name} recall dropped {reference_recall - recall:.2%} (limit {args.max_recall_drop:.2%})")
+    ratio = entry["batch1_ms"] / reference["batch1_ms"]
+    if ratio > args.max_latency_ratio:
+        failures.append(f"batch 1 latency is {ratio:.2f}x the reference (limit {args.max_latency_ratio:.2f}x)")
+    return failures
+
+
+def print_report(path, entry):
+    print(f"\n[{path}] accuracy {entry['accuracy']:.2%}, batch {entry['batch_size']} {entry['images_per_s']} img/s, "
+          f"batch 1 {entry['batch1_ms']} ms (p90 {entry['batch1_p90_ms']} ms)")
+    width = max(len(name) for name in CLASS_NAMES)
+    print(" " * (width + 2) + " ".join(f"{name:>{width}}" for name in CLASS_NAMES) + "   precision  recall")
+    for class_name, row in zip(CLASS_NAMES, entry["confusion_matrix"]):
+        metrics = entry["per_class"][class_name]
+        precision = f"{metrics['precision']:.2%}" if metrics["precision"] is not None else "-"
+        recall = f"{metrics['recall']:.2%}" if metrics["recall"] is not None else "-"
+        print(f"{class_name:>{width}}  " + " ".join(f"{count:>{width}}" for count in row) + f"   {precision:>9}  {recall:>6}")
+    for failure in entry.get("failures", []):
+        print(f"  FAIL: {failure}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score model artifacts on a held-out set and gate regressions")
+    parser.add_argument("artifacts", nargs="*", help="model files, the first is the reference (default: the ones present of "
+                        + ", ".join(DEFAULT_ARTIFACTS) + ")")
+    parser.add_argument("--data", default="./model_training/eye_dataset/test", help="held-out set, one folder per class")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="threads decoding images")
+    parser.add_argument("--threads", type=int, default=None, help="inference threads for every artifact")
+    parser.add_argument("--latency-runs", type=int, default=50, help="single-image calls to time")
+    parser.add_argument("--min-accuracy", type=float, default=0.0, help="absolute accuracy floor for every artifact")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.01, help="largest allowed accuracy drop from the reference")
+    parser.add_argument("--max-recall-drop", type=float, default=0.03, help="largest allowed per-class recall drop")
+    parser.add_argument("--max-latency-ratio", type=float, default=1.25, help="largest allowed batch 1 latency vs the reference")
+    parser.add_argument("--output", help="also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    artifacts = args.artifacts or [path for path in DEFAULT_ARTIFACTS if os.path.exists(path)]
+    if not artifacts:
+        parser.error("no model artifacts given or found")
+
+    samples = list_dataset(args.data)
+    start = time.perf_counter()
+    inputs, labels = load_dataset(samples, args.workers)
+    print(f"Loaded {len(samples)} held-out images in {time.perf_counter() - start:.1f} s "
+          f"({', '.join(f'{name}: {int((labels == i).sum())}' for i, name in enumerate(CLASS_NAMES))})")
+
+    report = {"dataset": {"path": args.data, "images": len(samples), "fingerprint": dataset_fingerprint(samples)}, "artifacts": {}}
+    reference = None
+    failed = False
+    for path in artifacts:
+        backend_name = EXTENSION_BACKENDS.get(os.path.splitext(path)[1].lower())
+        if backend_name is None:
+            parser.error(f"don't know how to load {path}")
+        backend = create_backend(backend_name, path, num_threads=args.threads)
+
+        try:
+            predictions, images_per_s = run_batched(backend, inputs, args.batch_size)
+            batch1_ms, batch1_p90_ms = time_single(backend, inputs, args.latency_runs)
+        except Exception as e:
+            print(f"\n[{path}] FAIL: could not be evaluated: {e}")
+            report["artifacts"][path] = {"error": str(e)}
+            failed = True
+            continue
+
+        entry = {"backend": backend_name, "load_ms": round(backend.stats()["load_s"] * 1000, 1)}
+        entry.update(classification_metrics(labels, predictions))
+        entry.update({
+            "batch_size": args.batch_size,
+            "images_per_s": round(images_per_s, 1),
+            "batch1_ms": batch1_ms,
+            "batch1_p90_ms": batch1_p90_ms,
+        })
+        entry["failures"] = regressions(entry, reference, args)
+        if reference is None:
+            reference = entry
+            entry["reference"] = True
+        failed = failed or bool(entry["failures"])
+        report["artifacts"][path] = entry
+        print_report(path, entry)
+
+    report["passed"] = not failed
+    print(f"\n{'PASSED' if not failed else 'FAILED'}: {len(artifacts)} artifacts against {artifacts[0]}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if failed:
+        sys.exit(1)
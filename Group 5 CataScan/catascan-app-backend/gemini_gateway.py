@@ -0,0 +1,201 @@
+import asyncio
+import io
+import logging
+import threading
+import time
+from collections import OrderedDict
+from PIL import Image as PilImage, ImageOps
+
+# Gateway for the Gemini "is this an eye?" check on uploads.
+# Sends a small JPEG thumbnail instead of the full upload, caches verdicts by content hash,
+# caps concurrent outbound calls, enforces a deadline and fails fast through a circuit breaker
+# while Gemini is slow or failing. Only Gemini's own errors and slow answers count toward the breaker;
+# waiting too long for a local slot raises EyeCheckBusy instead. The genai client is passed in, so it can point at a local stub
+# (genai.Client(http_options=types.HttpOptions(base_url=...))).
+
+EYE_CHECK_PROMPT = "Is this a close-up image of a single human eye, where the eye is the primary focus and occupies most of the frame? Return only 'yes' or 'no' as the response, nothing else."
+THUMBNAIL_SIZE = 512  # Longest side, in pixels
+THUMBNAIL_QUALITY = 85
+
+
+class EyeCheckUnavailable(Exception):
+    pass
+
+
+# Raised when all local call slots stay taken for the deadline; Gemini itself may be healthy
+class EyeCheckBusy(EyeCheckUnavailable):
+    pass
+
+
+# Function to downscale an image to a JPEG thumbnail for the eye check
+def make_thumbnail(file_content, size=THUMBNAIL_SIZE):
+    image = PilImage.open(io.BytesIO(file_content))
+    image.draft("RGB", (size, size))  # Lets JPEG decode at a reduced scale
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    image.thumbnail((size, size))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+
+class EyeCheckGateway:
+    def __init__(self, client, model_id, max_concurrency=4, deadline=10.0, cache_size=1024,
+                 cache_ttl=24 * 3600, failure_threshold=5, slow_call_threshold=None, reset_timeout=30.0):
+        self.client = client
+        self.model_id = model_id
+        self.deadline = deadline
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.failure_threshold = failure_threshold
+        # Calls slower than this count as failures for the circuit breaker
+        self.slow_call_threshold = slow_call_threshold if slow_call_threshold is not None else deadline / 2
+        self.reset_timeout = reset_timeout
+
+        self.max_concurrency = max_concurrency
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._async_semaphore = None  # Created on first use inside the event loop
+        self._cache = OrderedDict()  # content hash -> (verdict, cached_at)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._half_open_trial = False
+
+    # Function to look up a cached verdict
+    def _cached(self, content_hash):
+        with self._lock:
+            entry = self._cache.get(content_hash)
+            if entry is None:
+                return None
+            verdict, cached_at = entry
+            if time.time() - cached_at > self.cache_ttl:
+                del self._cache[content_hash]
+                return None
+            self._cache.move_to_end(content_hash)
+            return verdict
+
+    def _store(self, content_hash, verdict):
+        with self._lock:
+            self._cache[content_hash] = (verdict, time.time())
+            self._cache.move_to_end(content_hash)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # Function to decide whether a call may go out: closed, or half-open with one trial call
+    def _allow_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.time() - self._opened_at >= self.reset_timeout and not self._half_open_trial:
+                self._half_open_trial = True
+                return True
+            return False
+
+    # Function to give back a half-open trial that never reached Gemini
+    def _abandon_call(self):
+        with self._lock:
+            self._half_open_trial = False
+
+    def _record(self, success):
+        with self._lock:
+            self._half_open_trial = False
+            if success:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logging.warning("Gemini circuit breaker opened")
+                self._opened_at = time.time()
+
+    # Function to check whether an image shows an eye. Returns True/False, or raises
+    # EyeCheckUnavailable when the circuit is open or the call fails, EyeCheckBusy when the gateway is saturated.
+    def is_eye(self, file_content, content_hash):
+        verdict = self._cached(content_hash)
+        if verdict is not None:
+            logging.info(f"Gemini verdict cache hit for {content_hash}")
+            return verdict
+
+        if not self._allow_call():
+            raise EyeCheckUnavailable("Gemini circuit breaker is open")
+
+        if not self._semaphore.acquire(timeout=self.deadline):
+            self._abandon_call()
+            raise EyeCheckBusy("Too many concurrent Gemini calls")
+        try:
+            thumbnail = make_thumbnail(file_content)
+        except Exception:
+            self._semaphore.release()
+            self._abandon_call()
+            raise
+        start = time.time()
+        try:
+            response = self.client.models.generate_content(
+                model=self.model_id,
+                contents=[
+                    {"inline_data": {"mime_type": "image/jpeg", "data": thumbnail}},
+                    EYE_CHECK_PROMPT
+                ]
+            )
+            answer = response.text.strip().lower()
+        except Exception as e:
+            self._record(False)
+            raise EyeCheckUnavailable(f"Gemini call failed: {e}") from e
+        finally:
+            self._semaphore.release()
+
+        return self._finish(content_hash, answer, time.time() - start)
+
+    # Async variant of is_eye for the asyncio app; shares the cache and the circuit breaker
+    async def is_eye_async(self, file_content, content_hash):
+        verdict = self._cached(content_hash)
+        if verdict is not None:
+            logging.info(f"Gemini verdict cache hit for {content_hash}")
+            return verdict
+
+        if not self._allow_call():
+            raise EyeCheckUnavailable("Gemini circuit breaker is open")
+
+        if self._async_semaphore is None:
+            self._async_semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            await asyncio.wait_for(self._async_semaphore.acquire(), timeout=self.deadline)
+        except asyncio.TimeoutError:
+            self._abandon_call()
+            raise EyeCheckBusy("Too many concurrent Gemini calls")
+        try:
+            thumbnail = await asyncio.to_thread(make_thumbnail, file_content)
+        except BaseException:
+            self._async_semaphore.release()
+            self._abandon_call()
+            raise
+        start = time.time()
+        try:
+            response = await asyncio.wait_for(
+                self.client.aio.models.generate_content(
+                    model=self.model_id,
+                    contents=[
+                        {"inline_data": {"mime_type": "image/jpeg", "data": thumbnail}},
+                        EYE_CHECK_PROMPT
+                    ]
+                ),
+                timeout=max(0.0, self.deadline - (time.time() - start))
+            )
+            answer = response.text.strip().lower()
+        except Exception as e:
+            self._record(False)
+            raise EyeCheckUnavailable(f"Gemini call failed: {e}") from e
+        finally:
+            self._async_semaphore.release()
+
+        return self._finish(content_hash, answer, time.time() - start)
+
+    # Function to record a completed call and cache its verdict. elapsed runs from dispatch, so time spent
+    # waiting for a slot isn't held against Gemini; an answer already in hand is used even if it was slow.
+    def _finish(self, content_hash, answer, elapsed):
+        self._record(elapsed <= self.slow_call_threshold)
+
+        logging.info(f"Gemini API response: {answer} ({elapsed:.2f}s)")
+        verdict = answer == "yes"
+        self._store(content_hash, verdict)
+        return verdict
@@ -0,0 +1,24 @@
+import os
+
+# Gunicorn configuration for CataScan: gunicorn -c gunicorn.conf.py app:app
+#
+# preload_app imports app.py (TensorFlow, Supabase client, ...) once in the master and forks the
+# workers from it, so those pages are shared copy-on-write. The TFLite model itself is memory-mapped
+# read-only by each worker's interpreter, so all workers share one copy of it through the page cache.
+
+bind = f"0.0.0.0:{os.getenv('PORT', '7000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# Requests queued by admission control (admission.py) wait on a worker thread, so each worker needs more
+# threads than INFERENCE_MAX_IN_FLIGHT + INFERENCE_QUEUE_SIZE; with a single thread the queue never fills
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = True
+
+
+# Load the worker's model (every pooled TFLite interpreter) right after fork so no request pays for it
+def post_fork(server, worker):
+    import scan_service
+    try:
+        scan_service.inference_backend.warm_up()
+    except Exception as e:
+        server.log.warning(f"Worker {worker.pid}: could not load {scan_service.INFERENCE_BACKEND} model: {e}")
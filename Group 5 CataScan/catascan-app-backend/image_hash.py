@@ -0,0 +1,44 @@
+import io
+from PIL import Image as PilImage, ImageOps
+
+# Perceptual hashing for near-duplicate scan uploads.
+# dhash compares the brightness of neighbouring pixels on a 9x8 grayscale thumbnail, giving a 64-bit
+# hash that survives re-encoding, small crops and exposure changes. Two uploads whose hashes differ in
+# only a few bits (Hamming distance) are treated as shots of the same eye.
+
+HASH_SIZE = 8  # The hash has HASH_SIZE * HASH_SIZE bits
+
+
+# Function to compute the difference hash of an image, as a 16-character hex string
+def dhash(file_content, orientation=1, hash_size=HASH_SIZE):
+    image = PilImage.open(io.BytesIO(file_content))
+    image.draft("L", (hash_size * 8, hash_size * 8))  # Lets JPEG decode at a reduced scale
+    if orientation != 1:
+        image = ImageOps.exif_transpose(image)
+    image = image.convert("L").resize((hash_size + 1, hash_size), PilImage.LANCZOS)
+
+    pixels = list(image.getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def hamming_distance(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+# Function to find the closest earlier upload within max_distance bits.
+# candidates are rows with a "dhash" key. Returns (row, distance) or (None, None).
+def find_near_duplicate(image_hash, candidates, max_distance):
+    best, best_distance = None, None
+    for row in candidates:
+        distance = hamming_distance(image_hash, row["dhash"])
+        if distance <= max_distance and (best_distance is None or distance < best_distance):
+            best, best_distance = row, distance
+            if distance == 0:
+                break
+    return best, best_distance
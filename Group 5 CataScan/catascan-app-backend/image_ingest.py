@@ -0,0 +1,44 @@
+import io
+from PIL import Image as PilImage, ImageOps
+
+# Ingest stage for scan uploads: decode once, apply the EXIF orientation, and re-encode
+# a bounded-resolution copy for storage plus a 224x224 thumbnail for reports and display.
+
+STORED_MAX_SIDE = 1024  # Longest side of the stored scan, in pixels
+MODEL_INPUT_SIZE = 224
+STORED_QUALITY = 90
+THUMBNAIL_QUALITY = 95
+FORMATS = {
+    "JPEG": ("image/jpeg", "jpg"),
+    "WEBP": ("image/webp", "webp"),
+}
+
+
+# Function to encode a PIL image; returns the bytes
+def _encode(image, image_format, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=quality)
+    return buffer.getvalue()
+
+
+# Function to normalize an uploaded scan.
+# Returns a dict with the stored image (bytes, mime type, extension) and the 224x224 JPEG thumbnail.
+def normalize_scan(file_content, image_format="JPEG", max_side=STORED_MAX_SIDE):
+    mime_type, extension = FORMATS[image_format]
+
+    image = PilImage.open(io.BytesIO(file_content))
+    image.draft("RGB", (max_side, max_side))  # Lets JPEG decode at a reduced scale
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), PilImage.LANCZOS)
+
+    # Same resize as process_image(), so the thumbnail shows what the model sees
+    thumbnail = image.resize((MODEL_INPUT_SIZE, MODEL_INPUT_SIZE))
+
+    return {
+        "content": _encode(image, image_format, STORED_QUALITY),
+        "mime_type": mime_type,
+        "extension": extension,
+        "size": image.size,
+        "thumbnail": _encode(thumbnail, "JPEG", THUMBNAIL_QUALITY),
+    }
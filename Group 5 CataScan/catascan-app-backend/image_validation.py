@@ -0,0 +1,115 @@
+import struct
+
+# Header-only validation of uploaded scan images.
+# Reads the format from the magic bytes and the dimensions and EXIF orientation from the
+# JPEG/PNG headers, so bad inputs are rejected before any pixel decode, Gemini or storage call.
+
+MIN_IMAGE_SIZE = 32  # Smallest side, in pixels
+MAX_IMAGE_PIXELS = 25_000_000  # Larger images are treated as decompression bombs
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+JPEG_SIGNATURE = b"\xff\xd8\xff"
+MIME_TYPES = {"jpeg": "image/jpeg", "png": "image/png"}
+
+# JPEG start-of-frame markers (baseline, progressive, lossless, arithmetic); not DHT (C4), JPG (C8), DAC (CC)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Markers that have no length field
+JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8}
+EXIF_ORIENTATION_TAG = 0x0112
+
+
+class ImageValidationError(ValueError):
+    pass
+
+
+# Function to read the EXIF orientation (1-8) from the TIFF block of a JPEG APP1 segment
+def _exif_orientation(tiff):
+    if len(tiff) < 8:
+        return 1
+    if tiff[:2] == b"II":
+        endian = "<"
+    elif tiff[:2] == b"MM":
+        endian = ">"
+    else:
+        return 1
+    ifd_offset = struct.unpack(endian + "I", tiff[4:8])[0]
+    if ifd_offset + 2 > len(tiff):
+        return 1
+    entry_count = struct.unpack(endian + "H", tiff[ifd_offset:ifd_offset + 2])[0]
+    for i in range(entry_count):
+        entry = ifd_offset + 2 + 12 * i
+        if entry + 12 > len(tiff):
+            break
+        tag = struct.unpack(endian + "H", tiff[entry:entry + 2])[0]
+        if tag == EXIF_ORIENTATION_TAG:
+            orientation = struct.unpack(endian + "H", tiff[entry + 8:entry + 10])[0]
+            return orientation if 1 <= orientation <= 8 else 1
+    return 1
+
+
+# Function to read width, height and EXIF orientation from the JPEG segments before the scan data
+def _jpeg_header(data):
+    orientation = 1
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            raise ImageValidationError("Corrupt JPEG header.")
+        marker = data[pos + 1]
+        if marker == 0xFF:  # Fill byte
+            pos += 1
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            pos += 2
+            continue
+        length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        segment = data[pos + 4:pos + 2 + length]
+        if marker == 0xE1 and segment[:6] == b"Exif\x00\x00":
+            orientation = _exif_orientation(segment[6:])
+        elif marker in JPEG_SOF_MARKERS:
+            if len(segment) < 5:
+                raise ImageValidationError("Corrupt JPEG header.")
+            height, width = struct.unpack(">HH", segment[1:5])
+            return width, height, orientation
+        elif marker == 0xDA:  # Start of scan before any frame header
+            break
+        pos += 2 + length
+    raise ImageValidationError("Corrupt JPEG header.")
+
+
+# Function to read width and height from the PNG IHDR chunk
+def _png_header(data):
+    if len(data) < 24 or data[12:16] != b"IHDR":
+        raise ImageValidationError("Corrupt PNG header.")
+    width, height = struct.unpack(">II", data[16:24])
+    return width, height, 1
+
+
+# Function to validate an image from its header bytes.
+# Returns a dict with format, mime_type, width and height (after EXIF rotation) and orientation;
+# orientation != 1 means the decoded pixels must be transposed (PIL ImageOps.exif_transpose).
+def inspect_image(data):
+    if data.startswith(JPEG_SIGNATURE):
+        image_format = "jpeg"
+        width, height, orientation = _jpeg_header(data)
+    elif data.startswith(PNG_SIGNATURE):
+        image_format = "png"
+        width, height, orientation = _png_header(data)
+    else:
+        raise ImageValidationError("Invalid file format. Please upload an image (PNG, JPG, JPEG).")
+
+    # Orientations 5-8 rotate by 90 degrees
+    if orientation >= 5:
+        width, height = height, width
+
+    if min(width, height) < MIN_IMAGE_SIZE:
+        raise ImageValidationError("Image is too small. Please upload a larger image.")
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageValidationError("Image dimensions are too large.")
+
+    return {
+        "format": image_format,
+        "mime_type": MIME_TYPES[image_format],
+        "width": width,
+        "height": height,
+        "orientation": orientation,
+    }
@@ -0,0 +1,430 @@
+import atexit
+import contextlib
+import logging
+import os
+import queue
+import threading
+import time
+import numpy as np
+
+# Inference backends for the CataScan model.
+# Every backend takes the same preprocessed (N, 224, 224, 3) float32 batch and returns (N, num_classes)
+# probabilities, splits large batches into chunks of max_batch_size, and keeps its own load and
+# inference timings. INFERENCE_BACKEND picks one: "tflite" (default), "keras", "onnx", or "remote" to send
+# batches to a model_server.py process.
+# TensorFlow and ONNX Runtime are only imported by the backend that needs them.
+
+IMG_SIZE = 224
+DEFAULT_MODEL_ARTIFACTS = {
+    "tflite": "CataScan_v1_best.tflite",
+    "keras": "CataScan_v1_best.h5",
+    "onnx": "CataScan_v1_best.onnx",
+}
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "/tmp/catascan-model.sock")
+SERVER_STATS_INTERVAL = 5.0  # Seconds the model server's stats are cached for /health
+SERVER_STATS_TIMEOUT = 1.0  # Seconds a stats request may take
+
+
+# Function to turn a PIL image into the model input: RGB, 224x224, scaled to [0, 1], float32
+def preprocess_image(image, size=IMG_SIZE):
+    image = image.convert("RGB").resize((size, size))
+    return np.asarray(image, dtype=np.float32) / 255.0
+
+
+# Function to preprocess several PIL images into one (N, 224, 224, 3) batch
+def preprocess_batch(images, size=IMG_SIZE):
+    return np.stack([preprocess_image(image, size) for image in images])
+
+
+class InferenceBackend:
+    name = None
+
+    def __init__(self, model_path, max_batch_size=32):
+        self.model_path = model_path
+        self.max_batch_size = max_batch_size
+        self._stats_lock = threading.Lock()
+        self._stats = {"loads": 0, "load_s": 0.0, "calls": 0, "images": 0, "inference_s": 0.0, "last_call_s": 0.0}
+
+    # Subclasses run one batch that fits in max_batch_size
+    def _run(self, batch):
+        raise NotImplementedError
+
+    def _record_load(self, seconds):
+        with self._stats_lock:
+            self._stats["loads"] += 1
+            self._stats["load_s"] += seconds
+        logging.info(f"Loaded {self.name} model from {self.model_path} in {seconds * 1000:.0f} ms")
+
+    # Function to score a preprocessed batch. Returns (N, num_classes) probabilities.
+    def predict(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        if batch.ndim == 3:
+            batch = batch[np.newaxis]
+
+        start = time.perf_counter()
+        outputs = [np.asarray(self._run(batch[i:i + self.max_batch_size]))
+                   for i in range(0, len(batch), self.max_batch_size)]
+        elapsed = time.perf_counter() - start
+
+        with self._stats_lock:
+            self._stats["calls"] += 1
+            self._stats["images"] += len(batch)
+            self._stats["inference_s"] += elapsed
+            self._stats["last_call_s"] = elapsed
+        return np.concatenate(outputs)
+
+    # Function to preprocess and score PIL images in one batched call
+    def predict_images(self, images):
+        return self.predict(preprocess_batch(images))
+
+    # Function to load the model and run it once, so the first request doesn't pay for either
+    def warm_up(self):
+        self.predict(np.zeros((1, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32))
+
+    # Function to get the average inference time per image in this process, in seconds (None before the first call)
+    def seconds_per_image(self):
+        with self._stats_lock:
+            return self._stats["inference_s"] / self._stats["images"] if self._stats["images"] else None
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["backend"] = self.name
+        stats["avg_ms_per_image"] = round(stats["inference_s"] * 1000 / stats["images"], 3) if stats["images"] else None
+        return stats
+
+
+class TFLiteBackend(InferenceBackend):
+    name = "tflite"
+
+    def __init__(self, model_path, max_batch_size=32, num_threads=None, pool_size=1):
+        super().__init__(model_path, max_batch_size)
+        self.num_threads = num_threads
+        # TFLite interpreters are not thread-safe, and each one holds its own tensor arena. So every
+        # invocation borrows one from a per-process pool of at most pool_size interpreters (the number of
+        # inferences that may run at once), and waits when all are busy, however many threads the worker has.
+        self.pool_size = max(1, pool_size)
+        self._pool_lock = threading.Lock()
+        self._pool = None  # Idle interpreters
+        self._pool_pid = None
+        self._created = 0
+
+    # Loading from a path makes TFLite memory-map the flatbuffer read-only, so the model weights live in
+    # the page cache once and are shared by every gunicorn worker instead of being copied into each one.
+    def _load(self):
+        import tensorflow as tf
+        start = time.perf_counter()
+        interpreter = tf.lite.Interpreter(model_path=self.model_path, num_threads=self.num_threads)
+        interpreter.allocate_tensors()
+        self._record_load(time.perf_counter() - start)
+        return interpreter
+
+    # Function to get this process's pool. The pid check keeps interpreters created in the gunicorn
+    # master (--preload) from being reused after fork.
+    def _idle(self):
+        if self._pool_pid != os.getpid():
+            with self._pool_lock:
+                if self._pool_pid != os.getpid():
+                    self._pool = queue.LifoQueue()
+                    self._created = 0
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    # Function to reserve room in the pool for count more interpreters. Returns how many may be created.
+    def _reserve(self, count):
+        with self._pool_lock:
+            count = min(count, self.pool_size - self._created)
+            self._created += count
+        return count
+
+    def _release(self, count):
+        with self._pool_lock:
+            self._created -= count
+
+    # Function to borrow an idle interpreter, creating one while the pool isn't full
+    @contextlib.contextmanager
+    def interpreter(self):
+        pool = self._idle()
+        try:
+            interpreter = pool.get_nowait()
+        except queue.Empty:
+            if self._reserve(1):
+                try:
+                    interpreter = self._load()
+                except BaseException:
+                    self._release(1)
+                    raise
+            else:
+                interpreter = pool.get()
+        try:
+            yield interpreter
+        finally:
+            pool.put(interpreter)
+
+    # Function to create every interpreter of the pool and run the model once, so no request pays for loading
+    def warm_up(self):
+        pool = self._idle()
+        missing = self._reserve(self.pool_size)
+        for loaded in range(missing):
+            try:
+                pool.put(self._load())
+            except BaseException:
+                self._release(missing - loaded)
+                raise
+        super().warm_up()
+
+    # Runs one invocation, resizing the input tensor when the batch size changes
+    def _run(self, batch):
+        with self.interpreter() as interpreter:
+            input_details = interpreter.get_input_details()
+            if input_details[0]['shape'][0] != batch.shape[0]:
+                interpreter.resize_tensor_input(input_details[0]['index'], list(batch.shape))
+                interpreter.allocate_tensors()
+                input_details = interpreter.get_input_details()
+            output_details = interpreter.get_output_details()
+
+            interpreter.set_tensor(input_details[0]['index'], batch.astype(input_details[0]['dtype']))
+            interpreter.invoke()
+            return interpreter.get_tensor(output_details[0]['index'])
+
+
+class KerasBackend(InferenceBackend):
+    name = "keras"
+
+    def __init__(self, model_path, max_batch_size=32, num_threads=None):
+        super().__init__(model_path, max_batch_size)
+        self.num_threads = num_threads
+        self._model = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # One model per process; calling a loaded Keras model is safe from several threads
+    def model(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    import tensorflow as tf
+                    tf.keras.mixed_precision.set_global_policy('float32')
+                    if self.num_threads:
+                        try:
+                            tf.config.threading.set_intra_op_parallelism_threads(self.num_threads)
+                        except RuntimeError:
+                            logging.warning("TensorFlow is already initialized, keeping its thread count")
+                    start = time.perf_counter()
+                    with self._custom_objects_scope():
+                        self._model = tf.keras.models.load_model(self.model_path, compile=False)
+                    self._record_load(time.perf_counter() - start)
+                    self._pid = os.getpid()
+        return self._model
+
+    # Quantization-aware models (CataScan_v1_quantized.h5) need tfmot's layers to load; plain models don't
+    @staticmethod
+    def _custom_objects_scope():
+        try:
+            import tensorflow_model_optimization as tfmot
+        except ImportError:
+            return contextlib.nullcontext()
+        return tfmot.quantization.keras.quantize_scope()
+
+    # Calling the model directly skips the per-call setup of model.predict, which dominates for small batches
+    def _run(self, batch):
+        return self.model()(batch, training=False).numpy()
+
+
+class OnnxBackend(InferenceBackend):
+    name = "onnx"
+
+    def __init__(self, model_path, max_batch_size=32, num_threads=None):
+        super().__init__(model_path, max_batch_size)
+        self.num_threads = num_threads
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    # One session per process; InferenceSession.run is safe from several threads
+    def session(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    try:
+                        import onnxruntime as ort
+                    except ImportError as e:
+                        raise RuntimeError("INFERENCE_BACKEND=onnx needs the onnxruntime package") from e
+                    options = ort.SessionOptions()
+                    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                    if self.num_threads:
+                        options.intra_op_num_threads = self.num_threads
+                    start = time.perf_counter()
+                    self._session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+                    self._input_name = self._session.get_inputs()[0].name
+                    self._record_load(time.perf_counter() - start)
+                    self._pid = os.getpid()
+        return self._session
+
+    def _run(self, batch):
+        session = self.session()
+        return session.run(None, {self._input_name: batch})[0]
+
+
+class RemoteBackend(InferenceBackend):
+    name = "remote"
+
+    # model_path is the model server's socket (see model_server.py)
+    def __init__(self, model_path, max_batch_size=32, num_threads=None, timeout=30.0):
+        super().__init__(model_path, max_batch_size)
+        self.timeout = timeout
+        # One connection and shared-memory segment per worker process and thread
+        self._local = threading.local()
+        self._segments = []  # (pid, segment) created here, unlinked at exit
+        self._segments_lock = threading.Lock()
+        self._server_stats = None  # (time.monotonic(), stats reply)
+        self._refreshing = False
+        atexit.register(self._release_segments)
+
+    def _release_segments(self):
+        with self._segments_lock:
+            for pid, segment in self._segments:
+                if pid == os.getpid():
+                    segment.close()
+                    segment.unlink()
+            self._segments = []
+
+    def _connect(self):
+        import socket
+        start = time.perf_counter()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.model_path)
+        except OSError as e:
+            sock.close()
+            raise RuntimeError(f"Model server at {self.model_path} is not reachable: {e}") from e
+        self._record_load(time.perf_counter() - start)
+        return sock
+
+    def _disconnect(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = None
+
+    # Function to get this thread's connection, opening it on first use (or first use after fork)
+    def _socket(self):
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.sock = None
+            self._local.segment = None
+            self._local.pid = os.getpid()
+        if self._local.sock is None:
+            self._local.sock = self._connect()
+        return self._local.sock
+
+    # Function to get this thread's shared-memory segment, replacing it if it holds less than nbytes
+    def _segment(self, nbytes):
+        from multiprocessing import shared_memory
+        segment = self._local.segment
+        if segment is None or segment.size < nbytes:
+            # Sized for a full chunk, so the segment is normally created once
+            size = max(nbytes, self.max_batch_size * IMG_SIZE * IMG_SIZE * 3 * 4)
+            new_segment = shared_memory.SharedMemory(create=True, size=size)
+            with self._segments_lock:
+                if segment is not None:
+                    self._segments.remove((os.getpid(), segment))
+                    segment.close()
+                    segment.unlink()
+                self._segments.append((os.getpid(), new_segment))
+            self._local.segment = segment = new_segment
+        return segment
+
+    def _request(self, message, batch):
+        from model_server import send_message, recv_message
+        sock = self._socket()
+        if batch is not None:
+            segment = self._segment(batch.nbytes)
+            np.ndarray(batch.shape, dtype=np.float32, buffer=segment.buf)[...] = batch
+            message = dict(message, shm=segment.name, shape=list(batch.shape))
+        send_message(sock, message)
+        reply = recv_message(sock)
+        if reply is None:
+            raise ConnectionError("Model server closed the connection")
+        return reply
+
+    # Function to send one request, retrying once on a broken connection (e.g. the model server
+    # restarted). Every request is idempotent.
+    def _call(self, message, batch=None):
+        for attempt in range(2):
+            try:
+                reply = self._request(message, batch)
+                break
+            except (ConnectionError, OSError) as e:
+                self._disconnect()
+                if attempt:
+                    raise RuntimeError(f"Model server request failed: {e}") from e
+        if "error" in reply:
+            raise RuntimeError(f"Model server error: {reply['error']}")
+        return reply
+
+    def _run(self, batch):
+        return np.asarray(self._call({"op": "predict"}, batch)["probabilities"], dtype=np.float32)
+
+    # Function to fetch the model server's stats on a separate short-timeout connection, so a stuck
+    # model server can't hold it, and cache them for stats()
+    def _refresh_server_stats(self):
+        import socket
+        from model_server import send_message, recv_message
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(SERVER_STATS_TIMEOUT)
+                sock.connect(self.model_path)
+                send_message(sock, {"op": "stats"})
+                reply = recv_message(sock) or {"error": "Model server closed the connection"}
+        except (OSError, ValueError) as e:
+            reply = {"error": f"Model server stats failed: {e}"}
+        with self._stats_lock:
+            self._server_stats = (time.monotonic(), reply)
+            self._refreshing = False
+
+    # This worker's timings, plus the model server's own under "server". Those are served from a cache
+    # refreshed in the background, so stats() (and /health) never waits on the model server.
+    def stats(self):
+        stats = super().stats()
+        with self._stats_lock:
+            cached = self._server_stats
+            refresh = not self._refreshing and (cached is None or time.monotonic() - cached[0] >= SERVER_STATS_INTERVAL)
+            if refresh:
+                self._refreshing = True
+        if refresh:
+            threading.Thread(target=self._refresh_server_stats, daemon=True, name="model-server-stats").start()
+        if cached is None:
+            stats["server"] = {"pending": True}
+        else:
+            stats["server"] = dict(cached[1], age_s=round(time.monotonic() - cached[0], 1))
+        return stats
+
+BACKENDS = {
+    "tflite": TFLiteBackend,
+    "keras": KerasBackend,
+    "onnx": OnnxBackend,
+    "remote": RemoteBackend,
+}
+
+
+# Function to find a backend's default model through the artifact cache (see artifacts.py).
+# Falls back to the working directory copy, so a missing model still only fails when it is loaded.
+def default_model_path(name):
+    if name == "remote":
+        return MODEL_SERVER_SOCKET
+    from artifacts import resolve, ArtifactError
+    artifact = DEFAULT_MODEL_ARTIFACTS[name]
+    try:
+        return resolve(artifact)
+    except ArtifactError as e:
+        logging.warning(f"Could not resolve {artifact}: {e}")
+        return os.path.join(".", artifact)
+
+
+# Function to create a backend by name, using its default model unless a path is given
+def create_backend(name, model_path=None, **options):
+    name = name.lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of: {', '.join(BACKENDS)}")
+    return BACKENDS[name](model_path or default_model_path(name), **options)
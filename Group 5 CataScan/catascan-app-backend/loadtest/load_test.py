@@ -0,0 +1,178 @@
+import argparse
+import io
+import json
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+import requests
+from PIL import Image as PilImage, ImageDraw
+
+# Load generator for the CataScan backend.
+# Each virtual user signs up once, then keeps running the upload-image -> predict -> download_report
+# flow until the run ends. At the end it prints throughput, error rate and latency percentiles
+# for each endpoint. Run it against an app that points at stub_services.py (see the README).
+# Every upload is a distinct file, so the server can't answer it from caches keyed by the file's hash
+# (such as the eye check's verdict cache), and is sent with allow_duplicate=true so near-duplicate
+# detection doesn't link it to the user's previous upload; each request goes through the full flow.
+
+ENDPOINTS = ["signup", "upload-image", "predict", "download_report"]
+
+
+# Function to build a synthetic eye-like image when no sample image is given
+def synthetic_image(size=1024):
+    image = PilImage.new("RGB", (size, size), (205, 170, 150))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((size * 0.1, size * 0.3, size * 0.9, size * 0.7), fill=(245, 245, 240))
+    draw.ellipse((size * 0.35, size * 0.35, size * 0.65, size * 0.65), fill=(90, 120, 160))
+    draw.ellipse((size * 0.45, size * 0.45, size * 0.55, size * 0.55), fill=(15, 15, 15))
+    return image
+
+
+# Function to make a distinct JPEG of the sample image for one upload: a few random pixels are changed
+# before encoding, which changes the file's bytes but not what the model sees
+def image_variant(image, rng, pixels_changed=8):
+    variant = image.copy()
+    pixels = variant.load()
+    for _ in range(pixels_changed):
+        pixels[rng.randrange(variant.width), rng.randrange(variant.height)] = tuple(rng.randrange(256) for _ in range(3))
+    buffer = io.BytesIO()
+    variant.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)  # endpoint -> seconds, successful requests only
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.flows = 0
+
+    def record(self, endpoint, elapsed, status, ok):
+        with self.lock:
+            self.statuses[endpoint][status] += 1
+            if ok:
+                self.latencies[endpoint].append(elapsed)
+            else:
+                self.errors[endpoint] += 1
+
+    def flow_done(self):
+        with self.lock:
+            self.flows += 1
+
+    def summary(self, duration):
+        report = {"duration": round(duration, 2), "flows": self.flows,
+                  "flows_per_second": round(self.flows / duration, 2) if duration else 0, "endpoints": {}}
+        for endpoint in ENDPOINTS:
+            latencies = self.latencies[endpoint]
+            total = len(latencies) + self.errors[endpoint]
+            if not total:
+                continue
+            report["endpoints"][endpoint] = {
+                "requests": total,
+                "throughput": round(total / duration, 2),
+                "error_rate": round(self.errors[endpoint] / total, 4),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+                "p90_ms": round(percentile(latencies, 0.90) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+                "max_ms": round(max(latencies) * 1000, 1) if latencies else 0.0,
+                "statuses": dict(self.statuses[endpoint]),
+            }
+        return report
+
+
+# Function to time one request and record it. Returns the response, or None on a connection error.
+def call(results, endpoint, method, url, expected=(200,), **kwargs):
+    start = time.perf_counter()
+    try:
+        response = method(url, **kwargs)
+    except requests.RequestException:
+        results.record(endpoint, time.perf_counter() - start, "connection error", False)
+        return None
+    results.record(endpoint, time.perf_counter() - start, response.status_code, response.status_code in expected)
+    return response if response.status_code in expected else None
+
+
+def virtual_user(base_url, image, results, stop_at, use_tta, timeout):
+    session = requests.Session()
+    rng = random.Random()
+    response = call(results, "signup", session.post, f"{base_url}/signup", expected=(201,), timeout=timeout,
+                    json={"email": f"load-{uuid.uuid4().hex[:12]}@example.com", "password": "load-test-password"})
+    if response is None:
+        return
+    user_id = response.json()["user_id"]
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    while time.time() < stop_at:
+        response = call(results, "upload-image", session.post, f"{base_url}/upload-image", timeout=timeout,
+                        files={"file": ("eye.jpg", image_variant(image, rng), "image/jpeg")}, data={"user_id": user_id, "allow_duplicate": "true"})
+        if response is None:
+            continue
+        upload = response.json()
+
+        response = call(results, "predict", session.post, f"{base_url}/predict", timeout=timeout, json={
+            "image_url": upload["image_url"], "scan_id": upload["scan_id"], "user_id": user_id, "tta": use_tta
+        })
+        if response is None:
+            continue
+
+        response = call(results, "download_report", session.get, f"{base_url}/download_report", timeout=timeout,
+                        headers=headers, params={"scanId": upload["scan_id"]})
+        if response is not None:
+            results.flow_done()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay upload -> predict -> report flows against the CataScan backend")
+    parser.add_argument("--base-url", default="http://127.0.0.1:7000")
+    parser.add_argument("--concurrency", type=int, default=8, help="number of virtual users")
+    parser.add_argument("--duration", type=float, default=60, help="seconds")
+    parser.add_argument("--ramp-up", type=float, default=5, help="seconds over which the users are started")
+    parser.add_argument("--image", help="sample image to upload; a synthetic JPEG is used if omitted")
+    parser.add_argument("--tta", action="store_true", help="request test-time augmentation on /predict")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout in seconds")
+    parser.add_argument("--output", help="also write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    if args.image:
+        with PilImage.open(args.image) as f:
+            image = f.convert("RGB")
+    else:
+        image = synthetic_image()
+
+    results = Results()
+    start = time.time()
+    stop_at = start + args.duration
+    threads = []
+    for i in range(args.concurrency):
+        thread = threading.Thread(target=virtual_user, daemon=True,
+                                  args=(args.base_url.rstrip("/"), image, results, stop_at, args.tta, args.timeout))
+        thread.start()
+        threads.append(thread)
+        if args.concurrency > 1:
+            time.sleep(args.ramp_up / args.concurrency)
+    for thread in threads:
+        thread.join()
+
+    summary = results.summary(time.time() - start)
+    print(f"{summary['flows']} complete flows in {summary['duration']}s ({summary['flows_per_second']} flows/s)")
+    print(f"{'endpoint':<16}{'requests':>9}{'req/s':>8}{'errors':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for endpoint, stats in summary["endpoints"].items():
+        print(f"{endpoint:<16}{stats['requests']:>9}{stats['throughput']:>8}{stats['error_rate']:>8.1%}"
+              f"{stats['p50_ms']:>9}{stats['p90_ms']:>9}{stats['p99_ms']:>9}{stats['max_ms']:>9}")
+        if stats["error_rate"]:
+            print(f"{'':<16}statuses: {stats['statuses']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
@@ -0,0 +1,312 @@
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl, unquote
+
+# Local stand-ins for the services app.py talks to, for load testing without real Supabase/Gemini.
+#
+#   /auth/v1/...     Supabase auth (signup, password sign-in, get user, admin update/delete)
+#   /rest/v1/...     PostgREST tables (select with eq/order/limit/single, insert, update)
+#   /storage/v1/...  Supabase storage (upload, download, public download, list, remove)
+#   /v1beta/...      Gemini generateContent (always answers "yes")
+#
+# Everything is kept in memory. Each service gets its own latency, set on the command line.
+# Point the app at it with:
+#   SUPABASE_URL=http://127.0.0.1:8900 SUPABASE_KEY=stub.stub.stub GEMINI_BASE_URL=http://127.0.0.1:8900
+
+STATE_LOCK = threading.Lock()
+USERS = {}  # user id -> user dict
+USERS_BY_EMAIL = {}
+TABLES = {}  # table name -> list of rows
+OBJECTS = {}  # (bucket, path) -> (content, content type, created_at)
+LATENCY = {"auth": 0.0, "rest": 0.0, "storage": 0.0, "gemini": 0.0}  # seconds
+JITTER = 0.0  # fraction of the latency
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+# Function to issue an unsigned JWT carrying the user id, which is all the app reads from it
+def make_token(user_id):
+    def encode(part):
+        return base64.urlsafe_b64encode(json.dumps(part).encode()).rstrip(b"=").decode()
+    payload = {"sub": user_id, "role": "authenticated", "exp": int(time.time()) + 3600}
+    return f"{encode({'alg': 'none', 'typ': 'JWT'})}.{encode(payload)}.stub"
+
+
+def user_from_token(token):
+    try:
+        payload = token.split(".")[1]
+        return USERS.get(json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))["sub"])
+    except Exception:
+        return None
+
+
+def session_for(user):
+    return {
+        "access_token": make_token(user["id"]),
+        "refresh_token": uuid.uuid4().hex,
+        "token_type": "bearer",
+        "expires_in": 3600,
+        "expires_at": int(time.time()) + 3600,
+        "user": user,
+    }
+
+
+# Function to apply PostgREST query parameters (col=eq.value, order=col.desc, limit=n) to rows
+def filter_rows(rows, query):
+    for key, value in query:
+        if key in ("select", "order", "limit", "offset", "columns"):
+            continue
+        operator, _, operand = value.partition(".")
+        if operator == "eq":
+            rows = [row for row in rows if str(row.get(key)) == operand]
+        elif operator == "gt":
+            rows = [row for row in rows if str(row.get(key)) > operand]
+        elif operator == "lt":
+            rows = [row for row in rows if str(row.get(key)) < operand]
+        elif operator == "in":
+            values = set(operand.strip("()").split(","))
+            rows = [row for row in rows if str(row.get(key)) in values]
+    params = dict(query)
+    for order in reversed(params.get("order", "").split(",") if params.get("order") else []):
+        column, _, direction = order.partition(".")
+        rows = sorted(rows, key=lambda row: str(row.get(column)), reverse=direction.startswith("desc"))
+    if "offset" in params:
+        rows = rows[int(params["offset"]):]
+    if "limit" in params:
+        rows = rows[:int(params["limit"])]
+    columns = params.get("select", "*")
+    if columns != "*":
+        names = [c.strip() for c in columns.split(",")]
+        rows = [{name: row.get(name) for name in names} for row in rows]
+    return rows
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _json_body(self):
+        body = self._body()
+        return json.loads(body) if body else {}
+
+    def _send(self, status, payload=None, content_type="application/json"):
+        if payload is None:
+            body = b""
+        elif isinstance(payload, bytes):
+            body = payload
+        else:
+            body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay(self, service):
+        latency = LATENCY[service]
+        if latency:
+            time.sleep(max(0.0, latency * (1 + random.uniform(-JITTER, JITTER))))
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        path = unquote(url.path)
+        query = parse_qsl(url.query, keep_blank_values=True)
+        for prefix, service, handler in (
+            ("/auth/v1/", "auth", self._auth),
+            ("/rest/v1/", "rest", self._rest),
+            ("/storage/v1/", "storage", self._storage),
+            ("/v1beta/", "gemini", self._gemini),
+        ):
+            if path.startswith(prefix):
+                self._delay(service)
+                return handler(method, path[len(prefix):], query)
+        self._send(404, {"message": "Not found"})
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def do_HEAD(self):
+        self._dispatch("HEAD")
+
+    def _auth(self, method, path, query):
+        if method == "POST" and path == "signup":
+            body = self._json_body()
+            with STATE_LOCK:
+                if body.get("email") in USERS_BY_EMAIL:
+                    return self._send(422, {"msg": "User already registered", "code": 422})
+                user = {
+                    "id": str(uuid.uuid4()), "aud": "authenticated", "role": "authenticated",
+                    "email": body.get("email"), "app_metadata": {}, "user_metadata": {},
+                    "created_at": now_iso(), "password": body.get("password"),
+                }
+                USERS[user["id"]] = user
+                USERS_BY_EMAIL[user["email"]] = user
+            return self._send(200, session_for(public_user(user)))
+        if method == "POST" and path == "token":
+            body = self._json_body()
+            user = USERS_BY_EMAIL.get(body.get("email"))
+            if not user or user["password"] != body.get("password"):
+                return self._send(400, {"error": "invalid_grant", "error_description": "Invalid login credentials"})
+            return self._send(200, session_for(public_user(user)))
+        if method == "GET" and path == "user":
+            user = user_from_token(self.headers.get("Authorization", "").replace("Bearer ", ""))
+            if not user:
+                return self._send(401, {"msg": "Invalid token", "code": 401})
+            return self._send(200, public_user(user))
+        if path.startswith("admin/users/"):
+            user = USERS.get(path.split("/")[-1])
+            if not user:
+                return self._send(404, {"msg": "User not found", "code": 404})
+            if method == "PUT":
+                user["user_metadata"].update(self._json_body().get("user_metadata", {}))
+                return self._send(200, public_user(user))
+            if method == "DELETE":
+                with STATE_LOCK:
+                    USERS.pop(user["id"], None)
+                    USERS_BY_EMAIL.pop(user["email"], None)
+                return self._send(200, {})
+        self._send(404, {"msg": "Not found", "code": 404})
+
+    def _rest(self, method, table, query):
+        with STATE_LOCK:
+            rows = TABLES.setdefault(table, [])
+            if method == "GET":
+                result = filter_rows(rows, query)
+            elif method == "POST":
+                body = self._json_body()
+                new_rows = body if isinstance(body, list) else [body]
+                rows.extend(dict(row) for row in new_rows)
+                result = new_rows
+            elif method == "PATCH":
+                changes = self._json_body()
+                matched = filter_rows(rows, [(k, v) for k, v in query if k != "select"])
+                ids = {id(row) for row in rows if row in matched}
+                result = []
+                for row in rows:
+                    if id(row) in ids:
+                        row.update(changes)
+                        result.append(dict(row))
+            elif method == "DELETE":
+                matched = filter_rows(rows, query)
+                TABLES[table] = [row for row in rows if row not in matched]
+                result = matched
+            else:
+                return self._send(405, {"message": "Method not allowed"})
+
+        if "vnd.pgrst.object" in self.headers.get("Accept", ""):
+            if len(result) != 1:
+                return self._send(406, {"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned",
+                                        "details": f"The result contains {len(result)} rows", "hint": None})
+            return self._send(200, result[0])
+        self._send(201 if method == "POST" else 200, result)
+
+    def _storage(self, method, path, query):
+        if path.startswith("object/list/") and method == "POST":
+            bucket = path[len("object/list/"):]
+            body = self._json_body()
+            prefix = body.get("prefix", "")
+            with STATE_LOCK:
+                names = sorted(p for (b, p) in OBJECTS if b == bucket and p.startswith(prefix))
+            offset, limit = body.get("offset", 0), body.get("limit", 100)
+            entries = []
+            for name in names[offset:offset + limit]:
+                content, content_type, created_at = OBJECTS[(bucket, name)]
+                entries.append({"name": name[len(prefix):].lstrip("/"), "id": name, "created_at": created_at,
+                                "updated_at": created_at, "metadata": {"size": len(content), "mimetype": content_type}})
+            return self._send(200, entries)
+
+        public = path.startswith("object/public/")
+        bucket, _, object_path = path[len("object/public/" if public else "object/"):].partition("/")
+        if method == "DELETE" and not object_path:
+            prefixes = self._json_body().get("prefixes", [])
+            with STATE_LOCK:
+                removed = [{"name": p} for p in prefixes if OBJECTS.pop((bucket, p), None) is not None]
+            return self._send(200, removed)
+        if method in ("POST", "PUT"):
+            content, content_type = self._multipart_file()
+            with STATE_LOCK:
+                OBJECTS[(bucket, object_path)] = (content, content_type, now_iso())
+            return self._send(200, {"Key": f"{bucket}/{object_path}"})
+        if method in ("GET", "HEAD"):
+            stored = OBJECTS.get((bucket, object_path))
+            if stored is None:
+                return self._send(400, {"statusCode": "404", "error": "not_found", "message": "Object not found"})
+            return self._send(200, stored[0] if method == "GET" else b"", stored[1])
+        self._send(405, {"message": "Method not allowed"})
+
+    # Function to pull the "file" part out of a multipart upload
+    def _multipart_file(self):
+        body = self._body()
+        content_type = self.headers.get("Content-Type", "")
+        if not content_type.startswith("multipart/"):
+            return body, content_type or "application/octet-stream"
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                return part.get_payload(decode=True), part.get_content_type()
+        return b"", "application/octet-stream"
+
+    def _gemini(self, method, path, query):
+        if method == "POST" and path.endswith(":generateContent"):
+            self._body()
+            return self._send(200, {
+                "candidates": [{"content": {"parts": [{"text": "yes"}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+                "usageMetadata": {"promptTokenCount": 1, "candidatesTokenCount": 1, "totalTokenCount": 2},
+            })
+        self._send(404, {"error": {"code": 404, "message": "Not found"}})
+
+
+def public_user(user):
+    return {k: v for k, v in user.items() if k != "password"}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Supabase and Gemini stand-ins for load testing")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--auth-latency", type=float, default=20, help="milliseconds")
+    parser.add_argument("--rest-latency", type=float, default=15, help="milliseconds")
+    parser.add_argument("--storage-latency", type=float, default=40, help="milliseconds")
+    parser.add_argument("--gemini-latency", type=float, default=800, help="milliseconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="fraction of the latency, e.g. 0.2 for +-20%%")
+    args = parser.parse_args()
+
+    LATENCY.update({
+        "auth": args.auth_latency / 1000, "rest": args.rest_latency / 1000,
+        "storage": args.storage_latency / 1000, "gemini": args.gemini_latency / 1000,
+    })
+    JITTER = args.jitter
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), StubHandler)
+    print(f"Stub services listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
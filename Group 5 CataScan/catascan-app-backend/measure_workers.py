@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+import time
+import requests
+
+# Measures per-worker and total memory of the gunicorn preload-and-fork serving mode
+# for 1 to 16 workers. Linux only (reads /proc).
+#
+# RSS counts shared pages (TensorFlow, the memory-mapped model) in every process, so summing it
+# overstates usage. PSS divides shared pages between the processes sharing them; the sum of PSS
+# over the master and its workers is the real total.
+
+WORKER_COUNTS = [1, 2, 4, 8, 16]
+PORT = int(os.getenv("MEASURE_PORT", "7100"))
+STARTUP_TIMEOUT = 180  # seconds
+SETTLE_TIME = 5  # seconds after all workers are up
+
+
+# Function to read RSS and PSS (in MB) of a process from /proc/<pid>/smaps_rollup
+def memory_of(pid):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            fields = line.split()
+            if fields[0] in ("Rss:", "Pss:"):
+                values[fields[0][:-1].lower()] = int(fields[1]) / 1024
+    return values
+
+
+# Function to list the worker pids forked by the gunicorn master
+def children_of(pid):
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as f:
+            children.extend(int(child) for child in f.read().split())
+    return children
+
+
+def measure(num_workers):
+    env = dict(os.environ, PORT=str(PORT), WEB_CONCURRENCY=str(num_workers))
+    master = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.time() + STARTUP_TIMEOUT
+        while time.time() < deadline:
+            try:
+                if len(children_of(master.pid)) == num_workers and \
+                        requests.get(f"http://127.0.0.1:{PORT}/health", timeout=1).status_code == 200:
+                    break
+            except (requests.RequestException, FileNotFoundError):
+                pass
+            time.sleep(0.5)
+        else:
+            raise RuntimeError(f"gunicorn did not start {num_workers} workers in {STARTUP_TIMEOUT}s")
+
+        time.sleep(SETTLE_TIME)
+        master_memory = memory_of(master.pid)
+        workers = [memory_of(pid) for pid in children_of(master.pid)]
+        return {
+            "workers": num_workers,
+            "master_rss": master_memory["rss"],
+            "worker_rss": sum(w["rss"] for w in workers) / len(workers),
+            "worker_pss": sum(w["pss"] for w in workers) / len(workers),
+            "sum_rss": master_memory["rss"] + sum(w["rss"] for w in workers),
+            "total_pss": master_memory["pss"] + sum(w["pss"] for w in workers),
+        }
+    finally:
+        master.terminate()
+        master.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    print(f"{'workers':>7} {'master RSS':>11} {'worker RSS':>11} {'worker PSS':>11} {'sum RSS':>9} {'total PSS':>10}  (MB)")
+    for count in WORKER_COUNTS:
+        r = measure(count)
+        print(f"{r['workers']:>7} {r['master_rss']:>11.1f} {r['worker_rss']:>11.1f} {r['worker_pss']:>11.1f} "
+              f"{r['sum_rss']:>9.1f} {r['total_pss']:>10.1f}")
@@ -0,0 +1,176 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from inference import create_backend
+
+# Local model server: one process owns the model, and web workers send it preprocessed batches.
+#   python model_server.py --backend tflite --workers 2
+# and run the app with INFERENCE_BACKEND=remote (inference.RemoteBackend).
+#
+# Web workers then don't load TensorFlow, and a slow inference doesn't hold up their HTTP handling.
+# Inference concurrency is set here (--workers threads, each with its own interpreter), separately
+# from the number of web workers.
+#
+# Protocol, over a Unix socket: every message is a 4-byte big-endian length followed by a JSON object.
+# The tensor itself goes through shared memory. Each client connection owns a segment, writes the
+# float32 batch into it, and sends
+#   {"op": "predict", "shm": <segment name>, "shape": [N, 224, 224, 3]}
+# The server reads the batch in place and answers {"probabilities": [[...], ...]} or {"error": "..."}.
+# {"op": "stats"} returns the server's backend stats.
+
+DEFAULT_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "/tmp/catascan-model.sock")
+HEADER = struct.Struct(">I")
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+# Function to send one length-prefixed JSON message
+def send_message(sock, message):
+    payload = json.dumps(message).encode()
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+# Function to receive one message. Returns None when the peer closed the connection.
+def recv_message(sock):
+    header = _recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_MESSAGE_SIZE:
+        raise ValueError(f"Message of {size} bytes is too large")
+    payload = _recv_exactly(sock, size)
+    if payload is None:
+        return None
+    return json.loads(payload)
+
+
+# Function to map a client's segment. The client created it and unlinks it, so the server's resource
+# tracker must not also claim it (it would unlink the segment, or warn about a leak, at exit).
+def attach_shared_memory(name):
+    segment = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+def close_shared_memory(segment):
+    try:
+        segment.close()
+    except BufferError:
+        pass  # A view of the buffer is still alive; the mapping is released with it
+
+
+class ConnectionHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        segment = None
+        try:
+            while True:
+                try:
+                    message = recv_message(self.request)
+                except (OSError, ValueError) as e:
+                    logging.warning(f"Dropping model server connection: {e}")
+                    return
+                if message is None:
+                    return
+
+                try:
+                    if message.get("op") == "predict":
+                        if segment is None or segment.name.lstrip("/") != message["shm"].lstrip("/"):
+                            if segment is not None:
+                                close_shared_memory(segment)
+                            segment = attach_shared_memory(message["shm"])
+                        batch = np.ndarray(tuple(message["shape"]), dtype=np.float32, buffer=segment.buf)
+                        probabilities = self.server.executor.submit(self.server.backend.predict, batch).result()
+                        del batch
+                        reply = {"probabilities": probabilities.tolist()}
+                    elif message.get("op") == "stats":
+                        reply = self.server.stats()
+                    else:
+                        reply = {"error": f"Unknown op {message.get('op')!r}"}
+                except Exception as e:
+                    logging.error(f"Model server request failed: {str(e)}", exc_info=True)
+                    reply = {"error": str(e)}
+                send_message(self.request, reply)
+        finally:
+            if segment is not None:
+                close_shared_memory(segment)
+
+
+class ModelServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, backend, workers):
+        # A socket file left behind by a previous run would make bind fail
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, ConnectionHandler)
+        os.chmod(socket_path, 0o660)
+        self.backend = backend
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="model")
+        self._connections = 0
+        self._lock = threading.Lock()
+
+    def process_request_thread(self, request, client_address):
+        with self._lock:
+            self._connections += 1
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            with self._lock:
+                self._connections -= 1
+
+    def stats(self):
+        stats = self.backend.stats()
+        stats.update({"workers": self.workers, "connections": self._connections, "pid": os.getpid()})
+        return stats
+
+
+# Function to load the model (every pooled TFLite interpreter) before taking connections
+def warm_up(server):
+    server.backend.warm_up()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the CataScan model to local web workers")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path (MODEL_SERVER_SOCKET)")
+    parser.add_argument("--backend", default=os.getenv("MODEL_SERVER_BACKEND", "tflite"), help="tflite, keras or onnx")
+    parser.add_argument("--model-path", default=os.getenv("MODEL_PATH") or None)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("MODEL_SERVER_WORKERS", "2")),
+                        help="concurrent inferences")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("INFERENCE_THREADS", "0")) or None,
+                        help="threads per inference")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.backend == "remote":
+        parser.error("the model server needs a local backend")
+
+    options = {"pool_size": args.workers} if args.backend == "tflite" else {}
+    backend = create_backend(args.backend, args.model_path, num_threads=args.threads, **options)
+    server = ModelServer(args.socket, backend, args.workers)
+    warm_up(server)
+    logging.info(f"Serving {backend.model_path} ({backend.name}, {args.workers} workers) on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
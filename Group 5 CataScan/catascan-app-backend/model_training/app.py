@@ -1,23 +1,36 @@
 import tensorflow as tf
 from tensorflow.keras.models import load_model
 from tensorflow.keras.preprocessing.image import img_to_array, load_img
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Request, request, jsonify, send_file
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
 import numpy as np
 from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas
 from reportlab.lib import colors
+import io
 import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime
-from flask import after_this_request
+
+# Uploaded files are buffered in memory instead of Werkzeug's temporary files. MAX_CONTENT_LENGTH bounds
+# the buffer: larger requests are refused with a 413 before (or while) their body is read.
+class InMemoryRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
 
 # Initialize Flask app
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 CORS(app)
-app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload size
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+# Reports are kept in memory under a per-request ID until they expire or the store is full
+REPORT_TTL = int(os.getenv("REPORT_TTL", "600"))  # seconds
+REPORT_STORE_SIZE = int(os.getenv("REPORT_STORE_SIZE", "100"))  # reports
 
 # Load the Keras model
 tf.keras.mixed_precision.set_global_policy('float32')
@@ -25,9 +38,43 @@ model = load_model("CataScan_v1_best.h5")
 IMG_SIZE = 224
 class_names = {0: "immature", 1: "mature", 2: "normal"}
 
-def preprocess_image(image_path):
+# Bounded in-memory store of rendered reports: report ID -> (PDF bytes, created_at)
+class ReportStore:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._reports = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        now = time.time()
+        while self._reports:
+            report_id, (_, created_at) = next(iter(self._reports.items()))
+            if now - created_at <= self.ttl:
+                break
+            del self._reports[report_id]
+
+    # Function to store a report. Returns its new ID; the oldest report is dropped when full.
+    def put(self, pdf):
+        report_id = uuid.uuid4().hex
+        with self._lock:
+            self._expire()
+            self._reports[report_id] = (pdf, time.time())
+            while len(self._reports) > self.max_size:
+                self._reports.popitem(last=False)
+        return report_id
+
+    def get(self, report_id):
+        with self._lock:
+            self._expire()
+            entry = self._reports.get(report_id)
+        return entry[0] if entry else None
+
+report_store = ReportStore(REPORT_STORE_SIZE, REPORT_TTL)
+
+def preprocess_image(file_content):
     try:
-        img = load_img(image_path, target_size=(IMG_SIZE, IMG_SIZE))
+        img = load_img(io.BytesIO(file_content), target_size=(IMG_SIZE, IMG_SIZE))
         img_array = img_to_array(img) / 255.0
         img_array = np.expand_dims(img_array, axis=0)
         return img_array
@@ -56,9 +103,11 @@ def get_severity_analysis(prediction):
         "description": description
     }
 
-def generate_pdf_report(analysis, image_path, output_path):
+# Function to render the report into memory. Returns the PDF bytes.
+def generate_pdf_report(analysis, file_content):
     try:
-        c = canvas.Canvas(output_path, pagesize=letter)
+        pdf_buffer = io.BytesIO()
+        c = canvas.Canvas(pdf_buffer, pagesize=letter)
         width, height = letter
         
         c.setFont("Helvetica-Bold", 16)
@@ -66,7 +115,7 @@ def generate_pdf_report(analysis, image_path, output_path):
         c.setFont("Helvetica", 12)
         c.drawString(50, height - 70, f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
-        c.drawImage(image_path, 50, height - 300, width=200, height=200)
+        c.drawImage(ImageReader(io.BytesIO(file_content)), 50, height - 300, width=200, height=200)
         
         c.setFont("Helvetica-Bold", 14)
         c.drawString(50, height - 330, "Analysis Results")
@@ -86,9 +135,14 @@ def generate_pdf_report(analysis, image_path, output_path):
         c.drawString(50, 50, "Generated by CataScan - xAI")
         c.showPage()
         c.save()
+        return pdf_buffer.getvalue()
     except Exception as e:
         raise Exception(f"Error generating PDF: {str(e)}")
 
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": "File too large"}), 413
+
 @app.route('/predict', methods=['POST'])
 def predict():
     try:
@@ -99,54 +153,39 @@ def predict():
         if image.filename == '':
             return jsonify({"error": "No file selected"}), 400
             
-        filename = secure_filename(image.filename)
-        image_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        
-        image.save(image_path)
-        file_size = os.path.getsize(image_path)
-        if file_size > app.config['MAX_CONTENT_LENGTH']:
-            os.remove(image_path)
-            return jsonify({"error": "File too large"}), 400
+        file_content = image.read()
 
-        img_array = preprocess_image(image_path)
+        img_array = preprocess_image(file_content)
         prediction = model.predict(img_array)[0]
         analysis = get_severity_analysis(prediction)
         
-        pdf_path = "report.pdf"
-        generate_pdf_report(analysis, image_path, pdf_path)
+        report_id = report_store.put(generate_pdf_report(analysis, file_content))
         
         response = {
             "prediction": analysis["class"],
             "confidence": analysis["confidence"],
             "severity": analysis["severity"],
             "description": analysis["description"],
-            "pdf_url": "/download_report"
+            "report_id": report_id,
+            "pdf_url": f"/download_report?report_id={report_id}"
         }
         return jsonify(response), 200
     
     except Exception as e:
         app.logger.error(f"Prediction error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
-    
-    finally:
-        if os.path.exists(image_path):
-            os.remove(image_path)
 
 @app.route('/download_report', methods=['GET'])
 def download_report():
-    pdf_path = "report.pdf"
-    if not os.path.exists(pdf_path):
+    report_id = request.args.get("report_id")
+    if not report_id:
+        return jsonify({"error": "Report ID is required"}), 400
+
+    pdf = report_store.get(report_id)
+    if pdf is None:
         return jsonify({"error": "Report not found"}), 404
     
-    @after_this_request
-    def cleanup(response):
-        try:
-            os.remove(pdf_path)
-        except:
-            pass
-        return response
-    
-    return send_file(pdf_path, as_attachment=True, download_name="CataScan_Report.pdf")
+    return send_file(io.BytesIO(pdf), mimetype="application/pdf", as_attachment=True, download_name="CataScan_Report.pdf")
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -6,11 +6,35 @@ from tensorflow.keras.models import Model, load_model
 from tensorflow.keras.optimizers import Adam
 from tensorflow.keras.callbacks import EarlyStopping
 from tensorflow.keras.metrics import Precision, Recall
+import argparse
+import json
+import os
+import shutil
+import statistics
+import time
 import numpy as np
 import tensorflow_model_optimization as tfmot
 from tensorflow.keras.optimizers import schedules
 from sklearn.utils.class_weight import compute_class_weight
 
+# Training pipeline: four progressive-resize stages, fine-tuning, then the post-training steps
+# (save, QAT wrapping, evaluation, TFLite conversion).
+#
+#   python train_model.py                     # Full run
+#   python train_model.py --resume            # Continue after a crash, skipping completed stages
+#   python train_model.py --steps evaluate,convert --model CataScan_v1_quantized.h5
+#
+# After every epoch the model (with its optimizer state) is saved to checkpoints/latest.keras and the
+# current stage and epoch to checkpoints/state.json; each finished stage is also kept as
+# checkpoints/<stage>.keras. --resume reloads latest.keras and continues the interrupted stage from
+# its next epoch. Early stopping restarts its patience count on resume.
+#
+#   python train_model.py --profile           # Profile training throughput instead of training
+#
+# Profiling times each training step, split into waiting for the batch (JPEG decoding and augmentation)
+# and compute, for each batch size in --batch-sizes, captures a TensorBoard trace of a window of steps,
+# and prints which of decoding, augmentation or compute is the bottleneck and the fastest batch size.
+
 # Enable Mixed Precision for Training
 tf.keras.mixed_precision.set_global_policy('mixed_float16')
 
@@ -20,6 +44,22 @@ BATCH_SIZE = 32
 NUM_CLASSES = 3
 VALIDATION_SPLIT = 0.2
 
+# Stages, in order: (name, image size, epochs)
+TRAINING_STAGES = [
+    ("resize_128", 128, 3),  # Reduced to 3
+    ("resize_160", 160, 3),
+    ("resize_192", 192, 3),
+    ("resize_224", 224, 3),
+    ("fine_tune", 224, 5),  # Reduced to 5
+]
+POST_TRAINING_STEPS = ["save", "qat", "evaluate", "convert"]
+HEAD_LAYERS = 5  # Layers added on top of the backbone
+FINE_TUNE_FROZEN_LAYERS = 150  # Backbone layers kept frozen while fine-tuning
+
+BEST_MODEL_PATH = "CataScan_v1_best.h5"
+QUANTIZED_MODEL_PATH = "CataScan_v1_quantized.h5"
+TFLITE_PATH = "CataScan_v1_best.tflite"
+
 # Data Augmentation
 def get_augmentor():
     return ImageDataGenerator(
@@ -32,51 +72,13 @@ def get_augmentor():
         validation_split=VALIDATION_SPLIT
     )
 
-# Base Model
-base_model = EfficientNetV2S(weights="imagenet", include_top=False, input_shape=(IMG_SIZE, IMG_SIZE, 3))
-base_model.trainable = False
-
-# Modify Model
-x = base_model.output
-x = GlobalAveragePooling2D()(x)
-x = Dense(512, activation="swish")(x)
-x = BatchNormalization()(x)
-x = Dropout(0.5)(x)
-output_layer = Dense(NUM_CLASSES, activation="softmax", dtype='float32')(x)
-model = Model(inputs=base_model.input, outputs=output_layer)
-
-# Compile
-model.compile(
-    optimizer=Adam(learning_rate=0.001),
-    loss="categorical_crossentropy",
-    metrics=["accuracy", Precision(name="precision"), Recall(name="recall")]
-)
-
-# Class Weights
-class_counts = [244, 370, 407]
-class_weights = compute_class_weight(
-    class_weight="balanced",
-    classes=np.arange(NUM_CLASSES),
-    y=np.concatenate([np.full(count, i) for i, count in enumerate(class_counts)])
-)
-class_weight_dict = dict(enumerate(class_weights))
-print("Class weights:", class_weight_dict)
-
-# Callbacks
-steps_per_epoch = int((1021 * (1 - VALIDATION_SPLIT)) // BATCH_SIZE)
-lr_scheduler = tf.keras.callbacks.LearningRateScheduler(
-    schedules.CosineDecayRestarts(initial_learning_rate=0.001, first_decay_steps=steps_per_epoch * 5), 
-    verbose=1
-)
-early_stop = EarlyStopping(monitor="val_loss", patience=5, restore_best_weights=True)
-
-# Progressive Resizing
-for size in [128, 160, 192, 224]:
-    augmentor = get_augmentor()
+# Function to build the training and validation iterators for an image size
+def get_data(size, batch_size=BATCH_SIZE, augmentor=None):
+    augmentor = augmentor or get_augmentor()
     train_data = augmentor.flow_from_directory(
         "./eye_dataset/train",
         target_size=(size, size),
-        batch_size=BATCH_SIZE,
+        batch_size=batch_size,
         class_mode="categorical",
         subset="training",
         shuffle=True
@@ -84,86 +86,380 @@ for size in [128, 160, 192, 224]:
     val_data = augmentor.flow_from_directory(
         "./eye_dataset/train",
         target_size=(size, size),
-        batch_size=BATCH_SIZE,
+        batch_size=batch_size,
         class_mode="categorical",
         subset="validation",
         shuffle=False
     )
-    print(f"Training with image size: {size}x{size}")
-    print(f"Training samples: {train_data.samples}, Validation samples: {val_data.samples}")
-    model.fit(
-        train_data,
-        validation_data=val_data,
-        epochs=3,  # Reduced to 3
-        callbacks=[lr_scheduler, early_stop],
-        class_weight=class_weight_dict
+    return train_data, val_data
+
+# Function to build and compile the model on a frozen EfficientNetV2S backbone
+def build_model():
+    base_model = EfficientNetV2S(weights="imagenet", include_top=False, input_shape=(IMG_SIZE, IMG_SIZE, 3))
+    base_model.trainable = False
+
+    # Modify Model
+    x = base_model.output
+    x = GlobalAveragePooling2D()(x)
+    x = Dense(512, activation="swish")(x)
+    x = BatchNormalization()(x)
+    x = Dropout(0.5)(x)
+    output_layer = Dense(NUM_CLASSES, activation="softmax", dtype='float32')(x)
+    model = Model(inputs=base_model.input, outputs=output_layer)
+
+    # Compile
+    model.compile(
+        optimizer=Adam(learning_rate=0.001),
+        loss="categorical_crossentropy",
+        metrics=["accuracy", Precision(name="precision"), Recall(name="recall")]
+    )
+    return model
+
+# Function to unfreeze the backbone except its first layers and recompile with a lower learning rate.
+# The backbone's layers are part of the model itself, so this also works on a reloaded checkpoint.
+def prepare_fine_tune(model):
+    backbone = model.layers[:-HEAD_LAYERS]
+    for layer in backbone:
+        layer.trainable = True
+    for layer in backbone[:FINE_TUNE_FROZEN_LAYERS]:
+        layer.trainable = False
+    model.compile(
+        optimizer=Adam(learning_rate=0.0005),
+        loss="categorical_crossentropy",
+        metrics=["accuracy", Precision(name="precision"), Recall(name="recall")]
     )
 
-# Fine-tune
-base_model.trainable = True
-for layer in base_model.layers[:150]:
-    layer.trainable = False
-model.compile(
-    optimizer=Adam(learning_rate=0.0005),
-    loss="categorical_crossentropy",
-    metrics=["accuracy", Precision(name="precision"), Recall(name="recall")]
-)
-model.fit(
-    train_data,
-    validation_data=val_data,
-    epochs=5,  # Reduced to 5
-    callbacks=[lr_scheduler, early_stop],
-    class_weight=class_weight_dict
-)
-
-# Save Trained Model
-model.save("CataScan_v1_best.h5")
-
-# Convert to Float32 for Quantization
-tf.keras.mixed_precision.set_global_policy('float32')
-model_float32 = load_model("CataScan_v1_best.h5")
-
-# Ensure all weights are float32
-for layer in model_float32.layers:
-    if hasattr(layer, 'kernel') and layer.kernel.dtype == tf.float16:
-        layer.kernel = tf.cast(layer.kernel, tf.float32)
-    if hasattr(layer, 'bias') and layer.bias.dtype == tf.float16:
-        layer.bias = tf.cast(layer.bias, tf.float32)
-
-quant_aware_model = tfmot.quantization.keras.quantize_model(model_float32)
-
-# Compile Quantized Model
-quant_aware_model.compile(
-    optimizer=Adam(learning_rate=0.0005),
-    loss="categorical_crossentropy",
-    metrics=["accuracy", Precision(name="precision"), Recall(name="recall")]
-)
-
-# Save Quantized Model
-quant_aware_model.save("CataScan_v1_quantized.h5")
-
-# Evaluate
-loss, accuracy, precision, recall = quant_aware_model.evaluate(val_data)
-print(f"Validation Accuracy: {accuracy*100:.2f}%")
-print(f"Validation Precision: {precision*100:.2f}%")
-print(f"Validation Recall: {recall*100:.2f}%")
-
-# TFLite Conversion
-converter = tf.lite.TFLiteConverter.from_keras_model(quant_aware_model)
-converter.optimizations = [tf.lite.Optimize.DEFAULT]
-def representative_dataset():
-    for _ in range(100):
-        batch = next(val_data)[0]
-        yield [batch.astype(np.float32)]
-converter.representative_dataset = representative_dataset
-tflite_model = converter.convert()
-with open("CataScan_v1_best.tflite", "wb") as f:
-    f.write(tflite_model)
-
-# Print Class Indices and Sample Counts
-print("Class indices:", train_data.class_indices)
-print(f"Total samples: {train_data.samples + val_data.samples}")
-print(f"Training samples: {train_data.samples}")
-print(f"Validation samples: {val_data.samples}")
+# Function to write a file atomically, so a crash never leaves a half-written checkpoint behind
+def replace_with(path, write):
+    tmp_path = f"{path}.tmp{os.path.splitext(path)[1]}"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+def load_state(checkpoint_dir):
+    try:
+        with open(os.path.join(checkpoint_dir, "state.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"stage": None, "epochs_done": 0, "completed": []}
+
+def save_state(checkpoint_dir, state):
+    def write(path):
+        with open(path, "w") as f:
+            json.dump(state, f, indent=2)
+    replace_with(os.path.join(checkpoint_dir, "state.json"), write)
+
+# Function to save the model (weights and optimizer state) and then the state that points at it
+def save_checkpoint(checkpoint_dir, model, state):
+    replace_with(os.path.join(checkpoint_dir, "latest.keras"), model.save)
+    save_state(checkpoint_dir, state)
+
+# Saves a checkpoint after every epoch of a stage
+class StageCheckpoint(tf.keras.callbacks.Callback):
+    def __init__(self, checkpoint_dir, stage, completed):
+        super().__init__()
+        self.checkpoint_dir = checkpoint_dir
+        self.stage = stage
+        self.completed = completed
+
+    def on_epoch_end(self, epoch, logs=None):
+        save_checkpoint(self.checkpoint_dir, self.model, {
+            "stage": self.stage, "epochs_done": epoch + 1, "completed": list(self.completed)
+        })
+        print(f"Checkpoint saved: {self.stage}, epoch {epoch + 1}")
+
+# Function to run the training stages, skipping the completed ones. Returns the trained model.
+def train(checkpoint_dir, state):
+    # Class Weights
+    class_counts = [244, 370, 407]
+    class_weights = compute_class_weight(
+        class_weight="balanced",
+        classes=np.arange(NUM_CLASSES),
+        y=np.concatenate([np.full(count, i) for i, count in enumerate(class_counts)])
+    )
+    class_weight_dict = dict(enumerate(class_weights))
+    print("Class weights:", class_weight_dict)
+
+    # Callbacks
+    steps_per_epoch = int((1021 * (1 - VALIDATION_SPLIT)) // BATCH_SIZE)
+    lr_scheduler = tf.keras.callbacks.LearningRateScheduler(
+        schedules.CosineDecayRestarts(initial_learning_rate=0.001, first_decay_steps=steps_per_epoch * 5),
+        verbose=1
+    )
+    early_stop = EarlyStopping(monitor="val_loss", patience=5, restore_best_weights=True)
+
+    latest_path = os.path.join(checkpoint_dir, "latest.keras")
+    if state["completed"] or state["stage"]:
+        model = load_model(latest_path)
+        print(f"Resumed from {latest_path}: completed {state['completed'] or 'nothing'}, "
+              f"{state['stage'] or 'next stage'} at epoch {state['epochs_done']}")
+    else:
+        model = build_model()
+
+    completed = list(state["completed"])
+    for name, size, epochs in TRAINING_STAGES:
+        if name in completed:
+            continue
+        initial_epoch = state["epochs_done"] if state["stage"] == name else 0
+        # Fine-tuning recompiles with a new optimizer, unless it is resumed mid-stage with the saved one
+        if name == "fine_tune" and initial_epoch == 0:
+            prepare_fine_tune(model)
+
+        train_data, val_data = get_data(size)
+        print(f"[{name}] Training with image size: {size}x{size}, from epoch {initial_epoch + 1} of {epochs}")
+        print(f"Training samples: {train_data.samples}, Validation samples: {val_data.samples}")
+        print("Class indices:", train_data.class_indices)
+        if initial_epoch < epochs:
+            model.fit(
+                train_data,
+                validation_data=val_data,
+                epochs=epochs,
+                initial_epoch=initial_epoch,
+                callbacks=[lr_scheduler, early_stop, StageCheckpoint(checkpoint_dir, name, completed)],
+                class_weight=class_weight_dict
+            )
+
+        completed.append(name)
+        save_checkpoint(checkpoint_dir, model, {"stage": None, "epochs_done": 0, "completed": completed})
+        shutil.copyfile(latest_path, os.path.join(checkpoint_dir, f"{name}.keras"))
+
+    return model
+
+# Function to load a model for a post-training step: the one passed in, else the file the step reads
+def load_for_step(model_path, default_path):
+    path = model_path or default_path
+    print(f"Loading {path}")
+    with tfmot.quantization.keras.quantize_scope():
+        return load_model(path)
+
+# Step: Save Trained Model
+def save_best(model):
+    model.save(BEST_MODEL_PATH)
+
+# Step: Quantization-aware wrapping of the float32 model
+def quantize(model_path=None):
+    # Convert to Float32 for Quantization
+    tf.keras.mixed_precision.set_global_policy('float32')
+    model_float32 = load_model(model_path or BEST_MODEL_PATH)
+
+    # Ensure all weights are float32
+    for layer in model_float32.layers:
+        if hasattr(layer, 'kernel') and layer.kernel.dtype == tf.float16:
+            layer.kernel = tf.cast(layer.kernel, tf.float32)
+        if hasattr(layer, 'bias') and layer.bias.dtype == tf.float16:
+            layer.bias = tf.cast(layer.bias, tf.float32)
+
+    quant_aware_model = tfmot.quantization.keras.quantize_model(model_float32)
+
+    # Compile Quantized Model
+    quant_aware_model.compile(
+        optimizer=Adam(learning_rate=0.0005),
+        loss="categorical_crossentropy",
+        metrics=["accuracy", Precision(name="precision"), Recall(name="recall")]
+    )
+
+    # Save Quantized Model
+    quant_aware_model.save(QUANTIZED_MODEL_PATH)
+    return quant_aware_model
+
+# Step: Evaluate (a QAT model loaded from disk comes back compiled with the same metrics)
+def evaluate(quant_aware_model, val_data):
+    loss, accuracy, precision, recall = quant_aware_model.evaluate(val_data)
+    print(f"Validation Accuracy: {accuracy*100:.2f}%")
+    print(f"Validation Precision: {precision*100:.2f}%")
+    print(f"Validation Recall: {recall*100:.2f}%")
+
+# Step: TFLite Conversion
+def convert(quant_aware_model, val_data):
+    converter = tf.lite.TFLiteConverter.from_keras_model(quant_aware_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    def representative_dataset():
+        for _ in range(100):
+            batch = next(val_data)[0]
+            yield [batch.astype(np.float32)]
+    converter.representative_dataset = representative_dataset
+    tflite_model = converter.convert()
+    with open(TFLITE_PATH, "wb") as f:
+        f.write(tflite_model)
+
+# Function to run post-training steps in order. A step that needs the previous step's model loads it from
+# disk when run on its own (e.g. --steps evaluate reads CataScan_v1_quantized.h5).
+def post_train(steps, checkpoint_dir, state, model=None, model_path=None):
+    completed = list(state["completed"])
+    quant_aware_model = None
+    val_data = None
+    for step in steps:
+        if step == "save":
+            if model is None:
+                model = load_model(model_path or os.path.join(checkpoint_dir, "latest.keras"))
+            save_best(model)
+        elif step == "qat":
+            quant_aware_model = quantize(model_path if "save" not in steps else None)
+        elif step in ("evaluate", "convert"):
+            if quant_aware_model is None:
+                tf.keras.mixed_precision.set_global_policy('float32')
+                quant_aware_model = load_for_step(model_path, QUANTIZED_MODEL_PATH)
+            if val_data is None:
+                _, val_data = get_data(IMG_SIZE)
+            if step == "evaluate":
+                evaluate(quant_aware_model, val_data)
+            else:
+                convert(quant_aware_model, val_data)
+        print(f"Step {step} done")
+        if step not in completed:
+            completed.append(step)
+            save_state(checkpoint_dir, {"stage": None, "epochs_done": 0, "completed": completed})
+
+PROFILE_WARMUP_STEPS = 3  # Steps left out of the timings while the graph is traced and memory allocated
+
+# Function to time fetching batches from an iterator without training on them
+def time_batches(iterator, steps):
+    times = []
+    for _ in range(steps):
+        start = time.perf_counter()
+        next(iterator)
+        times.append(time.perf_counter() - start)
+    return times
+
+# Function to time training steps at one batch size: how long each step waited for its batch and how long
+# the model took on it. The measured steps from trace_window[0] up to trace_window[1] are captured as a
+# TensorBoard trace in trace_dir.
+def profile_steps(stage, batch_size, steps, trace_window=None, trace_dir=None):
+    name, size, _ = stage
+    tf.keras.backend.clear_session()
+    model = build_model()
+    if name == "fine_tune":
+        prepare_fine_tune(model)
+    train_data, _ = get_data(size, batch_size)
+
+    records = []
+    tracing = False
+    try:
+        for step in range(-PROFILE_WARMUP_STEPS, steps):
+            if trace_window and step == trace_window[0]:
+                tf.profiler.experimental.start(trace_dir)
+                tracing = True
+            start = time.perf_counter()
+            x, y = next(train_data)
+            loaded = time.perf_counter()
+            with tf.profiler.experimental.Trace("train", step_num=step, _r=1):
+                model.train_on_batch(x, y)  # Returns the loss as NumPy, so the step has finished
+            done = time.perf_counter()
+            if tracing and step == trace_window[1] - 1:
+                tf.profiler.experimental.stop()
+                tracing = False
+            if step >= 0:
+                records.append({"step": step, "images": len(x), "data_wait": loaded - start, "compute": done - loaded})
+    finally:
+        if tracing:
+            tf.profiler.experimental.stop()
+    return records
+
+# Function to summarize the step records of one batch size. Steps run one after the other here, so the
+# throughput counts data wait and compute; overlapped_images_per_second is the upper bound if loading the
+# next batch fully overlapped compute.
+def summarize_steps(records):
+    images = sum(record["images"] for record in records)
+    return {
+        "data_wait_median": statistics.median(record["data_wait"] for record in records),
+        "compute_median": statistics.median(record["compute"] for record in records),
+        "images_per_second": images / sum(record["data_wait"] + record["compute"] for record in records),
+        "overlapped_images_per_second": images / sum(max(record["data_wait"], record["compute"]) for record in records),
+    }
+
+# Function to profile training throughput for a stage across batch sizes and report the bottleneck
+def profile(stage_name, batch_sizes, steps, trace_window, output_dir):
+    stage = next(stage for stage in TRAINING_STAGES if stage[0] == stage_name)
+    _, size, _ = stage
+    trace_dir = os.path.join(output_dir, "profile")
+    traced_batch_size = BATCH_SIZE if BATCH_SIZE in batch_sizes else batch_sizes[0]
+    report = {"stage": stage_name, "image_size": size, "batch_sizes": {}}
+
+    for batch_size in batch_sizes:
+        print(f"[profile] {stage_name} at {size}x{size}, batch size {batch_size}: {steps} steps")
+        try:
+            records = profile_steps(
+                stage, batch_size, steps,
+                trace_window if batch_size == traced_batch_size else None, trace_dir
+            )
+        except tf.errors.ResourceExhaustedError:
+            print(f"[profile] Batch size {batch_size} ran out of memory; skipping larger ones")
+            report["batch_sizes"][batch_size] = {"out_of_memory": True}
+            break
+        report["batch_sizes"][batch_size] = dict(summarize_steps(records), steps=records)
+
+    # Split the data wait into JPEG decoding and augmentation by loading the same files without augmenting
+    decode_only = ImageDataGenerator(rescale=1./255, validation_split=VALIDATION_SPLIT)
+    decode_data, _ = get_data(size, traced_batch_size, decode_only)
+    augmented_data, _ = get_data(size, traced_batch_size)
+    decode = statistics.median(time_batches(decode_data, steps))
+    augment = max(statistics.median(time_batches(augmented_data, steps)) - decode, 0.0)
+    report["input"] = {"batch_size": traced_batch_size, "decode_median": decode, "augment_median": augment}
+
+    measured = {batch_size: result for batch_size, result in report["batch_sizes"].items() if "images_per_second" in result}
+    if not measured:
+        print("[profile] No batch size fit in memory")
+        return report
+    reference = measured.get(traced_batch_size)
+    best_batch_size = max(measured, key=lambda batch_size: measured[batch_size]["images_per_second"])
+    if reference is None:
+        bottleneck = "unknown"
+    elif reference["data_wait_median"] > reference["compute_median"]:
+        bottleneck = "JPEG decoding" if decode >= augment else "augmentation"
+    else:
+        bottleneck = "compute"
+    report["summary"] = {"bottleneck": bottleneck, "best_batch_size": best_batch_size}
+
+    print(f"\n{'Batch':>6} {'Data wait':>10} {'Compute':>10} {'Images/s':>9} {'Overlapped':>11}")
+    for batch_size, result in report["batch_sizes"].items():
+        if "images_per_second" in result:
+            print(f"{batch_size:>6} {result['data_wait_median']*1000:>8.1f}ms {result['compute_median']*1000:>8.1f}ms "
+                  f"{result['images_per_second']:>9.1f} {result['overlapped_images_per_second']:>11.1f}")
+        else:
+            print(f"{batch_size:>6} {'out of memory':>43}")
+    print(f"\nInput per batch of {traced_batch_size}: decoding {decode*1000:.1f}ms, augmentation {augment*1000:.1f}ms")
+    print(f"Bottleneck: {bottleneck}")
+    print(f"Best batch size: {best_batch_size} ({measured[best_batch_size]['images_per_second']:.1f} images/s)")
+    if trace_window:
+        print(f"Trace of steps {trace_window[0]}-{trace_window[1] - 1} at batch size {traced_batch_size}: "
+              f"tensorboard --logdir {trace_dir}")
+
+    with open(os.path.join(output_dir, "profile.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the CataScan model")
+    parser.add_argument("--checkpoint-dir", default="./checkpoints")
+    parser.add_argument("--resume", action="store_true", help="continue from the last checkpoint, skipping completed stages")
+    parser.add_argument("--steps", help="only run these post-training steps (comma-separated: " + ", ".join(POST_TRAINING_STEPS) + ")")
+    parser.add_argument("--model", help="model the first of --steps starts from (default: the file that step normally reads)")
+    parser.add_argument("--profile", action="store_true", help="profile training throughput instead of training")
+    parser.add_argument("--profile-stage", default="fine_tune", choices=[stage[0] for stage in TRAINING_STAGES])
+    parser.add_argument("--profile-steps", type=int, default=20, help="timed steps per batch size")
+    parser.add_argument("--batch-sizes", default="16,32,64", help="batch sizes to sweep (comma-separated)")
+    parser.add_argument("--trace-steps", default="5:10", help="steps to capture in the TensorBoard trace (start:end, empty for none)")
+    args = parser.parse_args()
 
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+    state = load_state(args.checkpoint_dir)
 
+    if args.profile:
+        batch_sizes = sorted(int(batch_size) for batch_size in args.batch_sizes.split(","))
+        trace_window = tuple(int(step) for step in args.trace_steps.split(":")) if args.trace_steps else None
+        profile(args.profile_stage, batch_sizes, args.profile_steps, trace_window, args.checkpoint_dir)
+    elif args.steps:
+        steps = [step.strip() for step in args.steps.split(",") if step.strip()]
+        unknown = [step for step in steps if step not in POST_TRAINING_STEPS]
+        if unknown:
+            parser.error(f"unknown steps: {', '.join(unknown)}")
+        post_train(sorted(steps, key=POST_TRAINING_STEPS.index), args.checkpoint_dir, state, model_path=args.model)
+    else:
+        if not args.resume:
+            if state["completed"] or state["stage"]:
+                print(f"Starting over; {args.checkpoint_dir} has an earlier run (use --resume to continue it)")
+            state = {"stage": None, "epochs_done": 0, "completed": []}
+            save_state(args.checkpoint_dir, state)
+        model = train(args.checkpoint_dir, state)
+        state = load_state(args.checkpoint_dir)
+        remaining = [step for step in POST_TRAINING_STEPS if step not in state["completed"]]
+        post_train(remaining, args.checkpoint_dir, state, model=model)
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+# Per-user cache of the GET /profile response.
+# Entries are small JSON files (payload + ETag), so every gunicorn worker and the async app on the
+# same host see the same entries, and deleting one invalidates it for all of them. PUT /profile,
+# /onboarding and /profile/image invalidate the user's entry; the TTL bounds staleness from changes
+# made outside the app.
+#
+# Invalidating also replaces the user's generation token (a second small file). A GET reads the token
+# before it reads the profile and passes it to put(), which drops the entry if the token changed
+# meanwhile, so a read that raced a PUT never caches the old row.
+
+PRUNE_EVERY = 100  # Expired entries are swept after this many writes
+
+# user_profile columns that are returned and cached; never the password column written at sign-up
+PROFILE_COLUMNS = "user_id, email, first_name, last_name, gender, dob, age, address, created_at"
+
+
+class ProfileCache:
+    def __init__(self, cache_dir, ttl=300):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _cache_file(self, user_id):
+        return os.path.join(self.cache_dir, hashlib.sha256(str(user_id).encode()).hexdigest() + ".json")
+
+    def _generation_file(self, user_id):
+        return os.path.join(self.cache_dir, hashlib.sha256(str(user_id).encode()).hexdigest() + ".gen")
+
+    # Function to get the user's generation token, to pass to put() after reading the profile
+    def generation(self, user_id):
+        try:
+            with open(self._generation_file(user_id)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_file(self, path, text):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    # Function to compute the ETag of a profile payload from its content
+    @staticmethod
+    def etag_for(payload):
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+    # Function to get a user's cached (payload, etag), or None if missing or expired
+    def get(self, user_id):
+        path = self._cache_file(user_id)
+        try:
+            if time.time() - os.stat(path).st_mtime > self.ttl:
+                self._remove(path)
+                return None
+            with open(path) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return entry["payload"], entry["etag"]
+
+    # Function to cache a user's profile payload, read after generation(user_id) returned generation.
+    # Returns its ETag. The entry is dropped if the user's profile was invalidated since.
+    def put(self, user_id, payload, generation):
+        etag = self.etag_for(payload)
+        if self.generation(user_id) != generation:
+            return etag
+        self._write_file(self._cache_file(user_id), json.dumps({"payload": payload, "etag": etag}, default=str))
+        # An invalidation between the check and the write would otherwise be undone
+        if self.generation(user_id) != generation:
+            self._remove(self._cache_file(user_id))
+            return etag
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        if prune:
+            self._prune()
+        return etag
+
+    # Function to drop a user's entry after their profile changed. The generation is replaced first, so a
+    # read in progress doesn't cache the old profile afterwards.
+    def invalidate(self, user_id):
+        self._write_file(self._generation_file(user_id), uuid.uuid4().hex)
+        self._remove(self._cache_file(user_id))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    # Function to delete expired entries
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.cache_dir):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,91 @@
+import io
+import logging
+import time
+from PIL import Image as PilImage
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib import colors
+
+# PDF rendering for /download_report.
+# The styles are built once in ReportTemplate and reused for every report; the scan image is
+# downsampled to its 200x200 display size before it is embedded.
+
+IMAGE_DISPLAY_SIZE = 200  # Points; the image is embedded at this many pixels
+
+
+class ReportTemplate:
+    def __init__(self):
+        self.styles = getSampleStyleSheet()
+
+        # Custom Styles
+        self.title_style = ParagraphStyle("TitleStyle", parent=self.styles["Heading1"], fontSize=22, textColor=colors.HexColor("#004d99"), alignment=1)
+        self.label_style = ParagraphStyle("LabelStyle", parent=self.styles["Normal"], fontSize=12, textColor=colors.darkgreen)
+        self.value_style = ParagraphStyle("ValueStyle", parent=self.styles["Normal"], fontSize=12)
+        self.normal_style = self.styles["Normal"]
+
+        self.table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#004d99")),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('INNERGRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('BOX', (0, 0), (-1, -1), 1, colors.black)
+        ])
+
+
+# Function to downsample the scan image to its display size as a small JPEG
+def downsample_image(image_content, size=IMAGE_DISPLAY_SIZE):
+    image = PilImage.open(io.BytesIO(image_content))
+    image.draft("RGB", (size, size))  # Lets JPEG decode at a reduced scale
+    image = image.convert("RGB").resize((size, size), PilImage.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    buffer.seek(0)
+    return buffer
+
+
+# Function to render a scan report. Returns the PDF bytes.
+def render_report(template, scan_id, scan_data, analysis_data, recommendation_data, user_data, image_content=None):
+    pdf_buffer = io.BytesIO()
+    doc = SimpleDocTemplate(pdf_buffer, pagesize=letter)
+
+    story = [Paragraph("CataScan Report", template.title_style), Spacer(1, 12)]
+
+    user_name = f"{user_data.get('first_name') or ''} {user_data.get('last_name') or ''}".strip() or "User"
+    story.append(Paragraph(f"Prepared for: <b>{user_name}</b>", template.normal_style))
+    story.append(Spacer(1, 10))
+
+    # Scanned Image
+    if image_content:
+        try:
+            story.append(Image(downsample_image(image_content), width=IMAGE_DISPLAY_SIZE, height=IMAGE_DISPLAY_SIZE, hAlign="CENTER"))
+            story.append(Spacer(1, 20))
+        except Exception as e:
+            logging.error(f"Error adding image to PDF: {str(e)}")
+            story.append(Paragraph("Scanned Image: <i>Unable to load image</i>", template.value_style))
+
+    # Report Details Table
+    details = [
+        ["Scan ID:", scan_id],
+        ["Severity Level:", scan_data.get("severity_level", "N/A")],
+        ["Confidence:", scan_data.get("confidence", "N/A")],
+        ["Feedback:", scan_data.get("feedback", "N/A")],
+        ["Recommendation:", recommendation_data.get("r_text", "N/A")],
+        ["Processing Time:", f"{analysis_data.get('processing_time', 'N/A')} seconds"],
+        ["Date:", scan_data.get("created_at", "N/A")]
+    ]
+
+    table = Table(details, colWidths=[120, 300])
+    table.setStyle(template.table_style)
+
+    story.append(table)
+    story.append(Spacer(1, 20))
+
+    # Footer
+    story.append(Paragraph("Generated by CataScan_V1", template.normal_style))
+    story.append(Paragraph(f"Date Generated: {time.strftime('%Y-%m-%d %H:%M:%S')}", template.normal_style))
+
+    doc.build(story)
+    return pdf_buffer.getvalue()
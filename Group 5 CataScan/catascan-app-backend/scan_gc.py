@@ -0,0 +1,248 @@
+import argparse
+import base64
+import itertools
+import json
+import logging
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from scan_stats import parse_time
+
+# Garbage collection of orphaned scan uploads.
+# /upload-image stores scans/{scan_id}.{jpg|webp} and the thumbnail scans/{scan_id}_224.jpg before any
+# scan_record exists, so uploads whose /predict never comes leave both behind. This job deletes them:
+#   python scan_gc.py --dry-run          # Log what would be deleted
+#   python scan_gc.py --interval 3600    # Run every hour
+#
+# The bucket listing (sorted by name, which starts with the scan_id) and scan_record (keyset pagination,
+# scan_id > last seen) are both read in scan_id order, one page at a time, and merged. An object is an
+# orphan when no record has its scan_id and it is older than the grace period. Orphans are deleted in
+# batches, rate limited, after re-checking that their scan_ids still have no record (a /predict may have
+# landed since the records were read). Their scan_hashes rows are deleted with them, so near-duplicate
+# detection doesn't link new uploads to deleted images.
+#
+# The storage list API only pages by offset, so the listing keeps a keyset cursor (the last scan_id seen)
+# and uses the offset as a hint: it is lowered by the objects deleted before it, and entries at or before
+# the cursor are skipped when uploads made during the run shift the listing.
+#
+# Deleting needs the service role key: with a key that row level security restricts, scan_record would
+# look empty and every upload would look orphaned. So the job refuses to delete with any other key, and
+# stops if the bucket has scans but no scan_record row is visible.
+
+SCAN_BUCKET = "scan-images"
+SCAN_FOLDER = "scans"
+OBJECT_NAME = re.compile(r"^([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})(_224)?\.[a-z]+$")
+
+GRACE_HOURS = float(os.getenv("SCAN_GC_GRACE_HOURS", "24"))  # Uploads younger than this may still be predicted
+PAGE_SIZE = 1000  # Objects or records per listing request
+BATCH_SIZE = 100  # Objects per delete request
+DELETES_PER_SECOND = float(os.getenv("SCAN_GC_DELETES_PER_SECOND", "50"))
+
+
+class ScanGCError(Exception):
+    pass
+
+
+# Function to get the role of a Supabase API key: a secret key (sb_secret_...) or a legacy JWT key whose
+# role claim is service_role. Returns None if it can't tell.
+def key_role(key):
+    if not key:
+        return None
+    if key.startswith("sb_secret_"):
+        return "service_role"
+    if key.startswith("sb_publishable_"):
+        return "anon"
+    try:
+        payload = key.split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4))).get("role")
+    except (IndexError, ValueError, AttributeError):
+        return None
+
+
+# Spaces out delete batches so the job never removes more than rate objects per second
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_time = time.monotonic()
+
+    # Function to wait until count more objects may be deleted
+    def wait(self, count):
+        now = time.monotonic()
+        if self.next_time > now:
+            time.sleep(self.next_time - now)
+            now = self.next_time
+        self.next_time = now + count * self.interval
+
+
+class ScanGarbageCollector:
+    def __init__(self, supabase, grace_period=timedelta(hours=GRACE_HOURS), page_size=PAGE_SIZE,
+                 batch_size=BATCH_SIZE, deletes_per_second=DELETES_PER_SECOND, dry_run=False, bucket=SCAN_BUCKET):
+        self.supabase = supabase
+        self.grace_period = grace_period
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.rate_limiter = RateLimiter(deletes_per_second)
+        self.dry_run = dry_run
+        self.bucket = bucket
+        self._deleted = 0
+
+    # Function to list the scans folder page by page. Yields (scan_id, object) with scan_ids ascending;
+    # names that aren't scan uploads are skipped.
+    def _objects(self):
+        offset = 0
+        cursor = None
+        cursor_names = set()  # Names seen for the cursor's scan_id (the image and its thumbnail)
+        while True:
+            deleted_before = self._deleted
+            page = self.supabase.storage.from_(self.bucket).list(SCAN_FOLDER, {
+                "limit": self.page_size,
+                "offset": offset,
+                "sortBy": {"column": "name", "order": "asc"},
+            })
+            for item in page:
+                match = OBJECT_NAME.match(item.get("name", ""))
+                if not match:
+                    continue
+                scan_id = match.group(1)
+                if cursor is not None and (scan_id < cursor or (scan_id == cursor and item["name"] in cursor_names)):
+                    continue  # Seen already; an upload made during the run shifted the listing
+                if scan_id != cursor:
+                    cursor = scan_id
+                    cursor_names = set()
+                cursor_names.add(item["name"])
+                yield scan_id, item
+            if len(page) < self.page_size:
+                return
+            # Everything deleted meanwhile was listed before the next page
+            offset = max(offset + len(page) - (self._deleted - deleted_before), 0)
+
+    # Function to read scan_record's scan_ids in ascending order by keyset pagination
+    def _record_ids(self):
+        last = None
+        while True:
+            query = self.supabase.table("scan_record").select("scan_id").order("scan_id").limit(self.page_size)
+            if last is not None:
+                query = query.gt("scan_id", last)
+            rows = query.execute().data
+            for row in rows:
+                yield row["scan_id"]
+            if len(rows) < self.page_size:
+                return
+            last = rows[-1]["scan_id"]
+
+    # Function to delete a batch of orphan candidates that still have no scan_record
+    def _delete(self, candidates, stats):
+        scan_ids = sorted({scan_id for scan_id, _, _ in candidates})
+        rows = self.supabase.table("scan_record").select("scan_id").in_("scan_id", scan_ids).execute().data
+        recorded = {row["scan_id"] for row in rows}
+        orphans = [candidate for candidate in candidates if candidate[0] not in recorded]
+        if not orphans:
+            return
+        stats["orphans"] += len(orphans)
+        stats["orphan_bytes"] += sum(size for _, _, size in orphans)
+
+        if self.dry_run:
+            for _, path, size in orphans:
+                logging.info(f"Would delete {path} ({size} bytes)")
+            return
+
+        self.rate_limiter.wait(len(orphans))
+        paths = [path for _, path, _ in orphans]
+        try:
+            removed = self.supabase.storage.from_(self.bucket).remove(paths)
+        except Exception as e:
+            logging.error(f"Failed to delete {len(paths)} orphaned scan objects: {str(e)}")
+            stats["failed"] += len(paths)
+            return
+        deleted = len(removed) if isinstance(removed, list) else len(paths)
+        self._deleted += deleted
+        stats["deleted"] += deleted
+        logging.info(f"Deleted {deleted} orphaned scan objects")
+
+        try:
+            orphan_ids = sorted({scan_id for scan_id, _, _ in orphans})
+            self.supabase.table("scan_hashes").delete().in_("scan_id", orphan_ids).execute()
+        except Exception as e:
+            logging.warning(f"Failed to remove deleted scans from the duplicate index: {str(e)}")
+
+    # Function to run one pass over the bucket. Returns counts of what was found and deleted.
+    def run(self):
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - self.grace_period
+        stats = {"objects": 0, "recorded": 0, "recent": 0, "orphans": 0, "orphan_bytes": 0, "deleted": 0, "failed": 0}
+        self._deleted = 0
+
+        objects = self._objects()
+        first = next(objects, None)
+        if first is None:
+            return stats
+        records = self._record_ids()
+        record = next(records, None)
+        if record is None:
+            message = "The bucket has scan uploads but no scan_record row is visible; is SUPABASE_KEY the service role key?"
+            if not self.dry_run:
+                raise ScanGCError(message)
+            logging.warning(message)
+
+        candidates = []  # (scan_id, path, size)
+        for scan_id, item in itertools.chain([first], objects):
+            stats["objects"] += 1
+            while record is not None and record < scan_id:
+                record = next(records, None)
+            if record == scan_id:
+                stats["recorded"] += 1
+                continue
+            created_at = item.get("created_at")
+            if not created_at or parse_time(created_at) > cutoff:
+                stats["recent"] += 1
+                continue
+            size = (item.get("metadata") or {}).get("size", 0)
+            candidates.append((scan_id, f"{SCAN_FOLDER}/{item['name']}", size))
+            if len(candidates) >= self.batch_size:
+                self._delete(candidates, stats)
+                candidates = []
+        if candidates:
+            self._delete(candidates, stats)
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete scan uploads that never got a scan_record")
+    parser.add_argument("--dry-run", action="store_true", help="only log what would be deleted")
+    parser.add_argument("--grace-hours", type=float, default=GRACE_HOURS, help="keep uploads younger than this (SCAN_GC_GRACE_HOURS)")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="objects per delete request")
+    parser.add_argument("--deletes-per-second", type=float, default=DELETES_PER_SECOND,
+                        help="maximum objects deleted per second (SCAN_GC_DELETES_PER_SECOND)")
+    parser.add_argument("--interval", type=float, default=0, help="seconds between runs (default: run once)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    load_dotenv()
+    supabase_key = os.getenv("SUPABASE_KEY")
+    if not args.dry_run and key_role(supabase_key) != "service_role":
+        parser.error("deleting needs SUPABASE_KEY to be the service role key (--dry-run works with any key)")
+    from supabase import create_client
+    supabase = create_client(os.getenv("SUPABASE_URL"), supabase_key)
+    collector = ScanGarbageCollector(
+        supabase, timedelta(hours=args.grace_hours), args.page_size, args.batch_size,
+        args.deletes_per_second, args.dry_run
+    )
+
+    while True:
+        started = time.monotonic()
+        try:
+            stats = collector.run()
+            prefix = "Dry run: " if args.dry_run else ""
+            logging.info(f"{prefix}{stats['objects']} scan objects, {stats['recorded']} with a record, "
+                         f"{stats['recent']} within the grace period, {stats['orphans']} orphaned "
+                         f"({stats['orphan_bytes'] / 1024 / 1024:.1f} MB), {stats['deleted']} deleted, {stats['failed']} failed")
+        except Exception as e:
+            logging.error(f"Scan garbage collection failed: {str(e)}", exc_info=True)
+            if not args.interval:
+                sys.exit(1)
+        if not args.interval:
+            break
+        time.sleep(max(args.interval - (time.monotonic() - started), 0))
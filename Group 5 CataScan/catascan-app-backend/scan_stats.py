@@ -0,0 +1,110 @@
+from datetime import datetime
+
+# Per-user scan statistics, kept as one summary row per user in the scan_stats table
+# (user_id primary key, version integer, summary jsonb, updated_at timestamp).
+# /predict folds each new scan into the summary with apply_scan, so updating and reading the
+# statistics costs the same however long the user's history is. The summary is only rebuilt from
+# scan_record (build_summary) the first time a user without one is seen.
+
+ROLLING_WINDOW = 10  # Scans in the rolling confidence average
+MAX_MONTH_BUCKETS = 24
+MAX_WEEK_BUCKETS = 26
+
+
+def empty_summary():
+    return {
+        "total_scans": 0,
+        "counts": {},
+        "confidence_sum": 0.0,
+        "latest_scan": None,
+        "recent": [],  # Last ROLLING_WINDOW scans as {"scan_id", "confidence"}, newest last
+        "months": {},  # "YYYY-MM" -> bucket
+        "weeks": {},  # "YYYY-Www" -> bucket
+    }
+
+
+# Function to parse a created_at value, which is "YYYY-MM-DD HH:MM:SS" or ISO 8601
+def parse_time(value):
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+
+
+def _add_to_bucket(buckets, key, severity, confidence, limit):
+    bucket = buckets.setdefault(key, {"scans": 0, "counts": {}, "confidence_sum": 0.0})
+    bucket["scans"] += 1
+    bucket["counts"][severity] = bucket["counts"].get(severity, 0) + 1
+    bucket["confidence_sum"] += confidence
+    # Keys sort chronologically, so the oldest buckets go first
+    for old_key in sorted(buckets)[:-limit]:
+        del buckets[old_key]
+
+
+# Function to fold one scan_record row into a summary. Rows already in the rolling window are
+# skipped, so a scan counted by a concurrent rebuild is not counted twice.
+def apply_scan(summary, scan):
+    if any(entry["scan_id"] == scan["scan_id"] for entry in summary["recent"]):
+        return summary
+
+    severity = scan["severity_level"]
+    confidence = float(scan["confidence"])
+    created_at = parse_time(scan["created_at"])
+
+    summary["total_scans"] += 1
+    summary["counts"][severity] = summary["counts"].get(severity, 0) + 1
+    summary["confidence_sum"] += confidence
+    summary["recent"] = (summary["recent"] + [{"scan_id": scan["scan_id"], "confidence": confidence}])[-ROLLING_WINDOW:]
+
+    latest = summary["latest_scan"]
+    if latest is None or created_at >= parse_time(latest["created_at"]):
+        summary["latest_scan"] = {
+            "scan_id": scan["scan_id"],
+            "severity_level": severity,
+            "confidence": confidence,
+            "created_at": created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+    iso_year, iso_week, _ = created_at.isocalendar()
+    _add_to_bucket(summary["months"], created_at.strftime("%Y-%m"), severity, confidence, MAX_MONTH_BUCKETS)
+    _add_to_bucket(summary["weeks"], f"{iso_year}-W{iso_week:02d}", severity, confidence, MAX_WEEK_BUCKETS)
+    return summary
+
+
+# Function to build a summary from a user's scan_record rows, oldest first
+def build_summary(scans):
+    summary = empty_summary()
+    for scan in sorted(scans, key=lambda scan: parse_time(scan["created_at"])):
+        apply_scan(summary, scan)
+    return summary
+
+
+# Function to turn a stored summary into the /scans/stats response
+def summary_view(summary, bucket="month"):
+    def average(total, count):
+        return round(total / count, 2) if count else None
+
+    buckets = summary["months"] if bucket == "month" else summary["weeks"]
+    recent = summary["recent"]
+    return {
+        "total_scans": summary["total_scans"],
+        "counts": summary["counts"],
+        "latest_scan": summary["latest_scan"],
+        "average_confidence": average(summary["confidence_sum"], summary["total_scans"]),
+        "rolling_average_confidence": {
+            "window": len(recent),
+            "value": average(sum(entry["confidence"] for entry in recent), len(recent)),
+        },
+        "bucket": bucket,
+        "trend": [
+            {
+                "period": key,
+                "scans": buckets[key]["scans"],
+                "counts": buckets[key]["counts"],
+                "average_confidence": average(buckets[key]["confidence_sum"], buckets[key]["scans"]),
+            }
+            for key in sorted(buckets)
+        ],
+    }
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend modules are flat files next to this folder, so tests import them by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+import pytest
+from admission import AdmissionController, AdmissionRejected
+
+
+def test_admits_up_to_max_in_flight():
+    controller = AdmissionController("test", max_in_flight=2, max_queue=0, queue_timeout=1)
+    with controller.admit():
+        with controller.admit():
+            assert controller.stats()["in_flight"] == 2
+            with pytest.raises(AdmissionRejected) as rejected:
+                with controller.admit():
+                    pass
+            assert rejected.value.status == 429
+            assert rejected.value.retry_after >= 1
+    stats = controller.stats()
+    assert stats["in_flight"] == 0
+    assert stats["admitted"] == 2
+    assert stats["rejected_429"] == 1
+
+
+def test_queued_request_gets_the_released_slot():
+    controller = AdmissionController("test", max_in_flight=1, max_queue=1, queue_timeout=5)
+    entered = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def holder():
+        with controller.admit():
+            entered.set()
+            release.wait(5)
+            order.append("holder")
+
+    def waiter():
+        with controller.admit():
+            order.append("waiter")
+
+    first = threading.Thread(target=holder)
+    first.start()
+    entered.wait(5)
+    second = threading.Thread(target=waiter)
+    second.start()
+    while controller.stats()["queued"] == 0:
+        time.sleep(0.001)
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert order == ["holder", "waiter"]
+    stats = controller.stats()
+    assert stats["in_flight"] == 0
+    assert stats["queued"] == 0
+    assert stats["admitted"] == 2
+
+
+def test_wait_timeout_rejects_with_503():
+    controller = AdmissionController("test", max_in_flight=1, max_queue=1, queue_timeout=0.05)
+    with controller.admit():
+        with pytest.raises(AdmissionRejected) as rejected:
+            with controller.admit():
+                pass
+        assert rejected.value.status == 503
+        assert controller.stats()["queued"] == 0
+    assert controller.stats()["rejected_503"] == 1
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_expected_wait_rejects_without_queueing():
+    controller = AdmissionController("test", max_in_flight=1, max_queue=10, queue_timeout=1)
+    controller._service_time = 5.0  # One request takes longer than the queue timeout
+    with controller.admit():
+        with pytest.raises(AdmissionRejected) as rejected:
+            with controller.admit():
+                pass
+    assert rejected.value.status == 503
+    assert rejected.value.retry_after >= 5
+
+
+def test_cancelled_async_waiter_leaves_the_queue():
+    controller = AdmissionController("test", max_in_flight=1, max_queue=1, queue_timeout=5)
+
+    async def scenario():
+        async def wait_for_slot():
+            async with controller.admit_async():
+                pass
+
+        async with controller.admit_async():
+            task = asyncio.create_task(wait_for_slot())
+            await asyncio.sleep(0.01)
+            assert controller.stats()["queued"] == 1
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert controller.stats()["queued"] == 0
+
+    asyncio.run(scenario())
+    assert controller.stats()["in_flight"] == 0
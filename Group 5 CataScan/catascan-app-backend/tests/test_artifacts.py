@@ -0,0 +1,128 @@
+import hashlib
+import os
+import shutil
+import pytest
+import artifacts
+from artifacts import ArtifactCache, ArtifactError
+
+CONTENT = b"model weights"
+CONTENT_SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+@pytest.fixture
+def workdir(tmp_path):
+    directory = tmp_path / "work"
+    directory.mkdir()
+    (directory / "model.tflite").write_bytes(CONTENT)
+    return directory
+
+
+def count_hashes(monkeypatch):
+    calls = []
+    original = artifacts.sha256_file
+
+    def counting(path):
+        calls.append(path)
+        return original(path)
+
+    monkeypatch.setattr(artifacts, "sha256_file", counting)
+    return calls
+
+
+# Cross-filesystem caches can't hard-link, so the cache holds a copy and names/<name>.source records the source
+def no_hard_links(monkeypatch):
+    def link(source, dest):
+        raise OSError("Invalid cross-device link")
+
+    monkeypatch.setattr(os, "link", link)
+
+
+def test_resolve_adds_a_working_directory_copy(tmp_path, workdir):
+    cache = ArtifactCache(str(tmp_path / "cache"), manifest={}, offline=True)
+    path = cache.resolve("model.tflite", search_dirs=(str(workdir),))
+    assert os.path.basename(path) == CONTENT_SHA256
+    assert open(path, "rb").read() == CONTENT
+    assert cache.expected_hash("model.tflite") == CONTENT_SHA256
+
+
+def test_resolve_hard_linked_copy_is_not_rehashed(tmp_path, workdir, monkeypatch):
+    cache = ArtifactCache(str(tmp_path / "cache"), manifest={}, offline=True)
+    cache.resolve("model.tflite", search_dirs=(str(workdir),))
+    calls = count_hashes(monkeypatch)
+    assert os.path.basename(cache.resolve("model.tflite", search_dirs=(str(workdir),))) == CONTENT_SHA256
+    assert calls == []
+
+
+def test_resolve_copied_source_is_not_rehashed(tmp_path, workdir, monkeypatch):
+    no_hard_links(monkeypatch)
+    cache = ArtifactCache(str(tmp_path / "cache"), manifest={}, offline=True)
+    path = cache.resolve("model.tflite", search_dirs=(str(workdir),))
+    assert not os.path.samefile(path, workdir / "model.tflite")
+
+    calls = count_hashes(monkeypatch)
+    assert cache.resolve("model.tflite", search_dirs=(str(workdir),)) == path
+    assert calls == []
+
+
+def test_resolve_follows_a_replaced_unpinned_copy(tmp_path, workdir):
+    cache = ArtifactCache(str(tmp_path / "cache"), manifest={}, offline=True)
+    cache.resolve("model.tflite", search_dirs=(str(workdir),))
+    os.remove(workdir / "model.tflite")
+    (workdir / "model.tflite").write_bytes(b"retrained weights")
+    path = cache.resolve("model.tflite", search_dirs=(str(workdir),))
+    assert open(path, "rb").read() == b"retrained weights"
+
+
+def test_pinned_hash_mismatch_raises(tmp_path, workdir):
+    cache = ArtifactCache(str(tmp_path / "cache"), manifest={"model.tflite": {"sha256": "0" * 64}}, offline=True)
+    with pytest.raises(ArtifactError):
+        cache.resolve("model.tflite", search_dirs=(str(workdir),))
+
+
+def test_pinned_blob_resolves_without_a_copy(tmp_path, workdir):
+    cache_dir = str(tmp_path / "cache")
+    ArtifactCache(cache_dir, manifest={}, offline=True).resolve("model.tflite", search_dirs=(str(workdir),))
+    cache = ArtifactCache(cache_dir, manifest={"model.tflite": {"sha256": CONTENT_SHA256}}, offline=True)
+    assert os.path.basename(cache.resolve("model.tflite", search_dirs=(str(tmp_path / "missing"),))) == CONTENT_SHA256
+
+
+def test_corrupt_blob_is_replaced_from_the_copy(tmp_path, workdir, monkeypatch):
+    no_hard_links(monkeypatch)
+    cache = ArtifactCache(str(tmp_path / "cache"), manifest={}, offline=True)
+    path = cache.resolve("model.tflite", search_dirs=(str(workdir),))
+    assert cache.verify_all() == []
+    with open(path, "ab") as f:
+        f.write(b"garbage")
+    assert cache.verify_all() == [CONTENT_SHA256]
+    assert open(cache.resolve("model.tflite", search_dirs=(str(workdir),)), "rb").read() == CONTENT
+
+
+def test_missing_artifact_offline_raises(tmp_path):
+    cache = ArtifactCache(str(tmp_path / "cache"), manifest={"model.tflite": {"repo_id": "org/repo"}}, offline=True)
+    with pytest.raises(ArtifactError):
+        cache.resolve("model.tflite", search_dirs=(str(tmp_path),))
+
+
+def test_converted_is_memoized_by_source_and_recipe(tmp_path, workdir):
+    cache = ArtifactCache(str(tmp_path / "cache"), manifest={}, offline=True)
+    source = cache.resolve("model.tflite", search_dirs=(str(workdir),))
+    conversions = []
+
+    def convert(source_path, output_path):
+        conversions.append(source_path)
+        shutil.copyfile(source_path, output_path)
+        with open(output_path, "ab") as f:
+            f.write(b" int8")
+        return {"size": os.path.getsize(output_path)}
+
+    path, metadata, fresh = cache.converted(source, "int8", "model_int8.tflite", convert)
+    assert fresh and metadata == {"size": len(CONTENT) + 5}
+    assert open(path, "rb").read() == CONTENT + b" int8"
+
+    again = cache.converted(source, "int8", "model_int8.tflite", convert)
+    assert again == (path, metadata, False)
+    assert len(conversions) == 1
+
+    cache.converted(source, "float16", "model_fp16.tflite", convert)
+    cache.converted(source, "int8", "model_int8.tflite", convert, force=True)
+    assert len(conversions) == 3
@@ -0,0 +1,79 @@
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+from drift import DriftMonitor, DriftSketch, compare, process_alive, psi, psi_status
+
+CLASS_NAMES = ["Mature", "Immature", "Normal"]
+
+
+def filled_sketch(brightness, count, half_life=None):
+    sketch = DriftSketch(CLASS_NAMES, half_life)
+    for _ in range(count):
+        sketch.observe_input(np.full((224, 224, 3), brightness, dtype=np.float32))
+        sketch.observe_size(1024, 768)
+        sketch.observe_output([0.7, 0.2, 0.1])
+    return sketch
+
+
+def test_psi_of_identical_histograms_is_zero():
+    counts = np.array([10.0, 20.0, 30.0])
+    assert abs(psi(counts, counts * 3)) < 1e-12
+    assert psi(counts, counts[::-1]) > 0
+
+
+def test_psi_status_thresholds():
+    assert psi_status(0.05) == "stable"
+    assert psi_status(0.1) == "moderate"
+    assert psi_status(0.3) == "drift"
+
+
+def test_compare_same_traffic_is_stable():
+    result = compare(filled_sketch(0.5, 150), filled_sketch(0.5, 150))
+    assert result["status"] == "stable"
+    assert result["features"]["brightness"]["psi"] == 0
+    assert result["features"]["predicted_class"]["live_share"]["Mature"] == 1.0
+
+
+def test_compare_detects_brightness_drift():
+    result = compare(filled_sketch(0.5, 150), filled_sketch(0.9, 150))
+    assert result["status"] == "drift"
+    assert result["features"]["brightness"]["status"] == "drift"
+    assert result["features"]["long_side"]["status"] == "stable"
+
+
+def test_compare_needs_min_samples():
+    result = compare(filled_sketch(0.5, 150), filled_sketch(0.9, 10))
+    assert result["status"] == "insufficient_data"
+    assert result["max_psi"] is None
+    assert result["features"]["brightness"]["status"] == "insufficient_data"
+
+
+def test_half_life_decays_old_images():
+    sketch = filled_sketch(0.5, 100, half_life=10)
+    assert sketch.count == 100
+    assert sketch.weights["input"] < 15
+
+
+def test_sketch_round_trip_and_merge():
+    sketch = filled_sketch(0.5, 5)
+    copy = DriftSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    merged = copy.merge(sketch)
+    assert merged.count == 10
+    assert np.allclose(merged.histograms["brightness"], sketch.histograms["brightness"] * 2)
+
+
+def test_live_sketch_drops_exited_workers(tmp_path):
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    assert not process_alive(exited.pid)
+    with open(tmp_path / f"{exited.pid}.json", "w") as f:
+        json.dump(filled_sketch(0.5, 3).to_dict(), f)
+
+    monitor = DriftMonitor(str(tmp_path), CLASS_NAMES, flush_interval=3600)
+    monitor.observe(np.full((224, 224, 3), 0.5, dtype=np.float32), [0.1, 0.2, 0.7])
+    live = monitor.live_sketch()
+    assert live.count == 1
+    assert not os.path.exists(tmp_path / f"{exited.pid}.json")
+    assert os.path.exists(tmp_path / f"{os.getpid()}.json")
@@ -0,0 +1,66 @@
+import io
+from PIL import Image as PilImage
+from image_hash import dhash, hamming_distance, find_near_duplicate
+
+
+def encode(image, format="JPEG", **options):
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **options)
+    return buffer.getvalue()
+
+
+def gradient(width=320, height=240):
+    image = PilImage.new("RGB", (width, height))
+    image.putdata([((x * 7 + y) % 256, (x * y) % 256, (255 - x) % 256) for y in range(height) for x in range(width)])
+    return image
+
+
+def test_hamming_distance():
+    assert hamming_distance("0000000000000000", "0000000000000000") == 0
+    assert hamming_distance("0000000000000000", "0000000000000003") == 2
+    assert hamming_distance("ffffffffffffffff", "0000000000000000") == 64
+
+
+def test_dhash_survives_reencoding():
+    image = gradient()
+    original = dhash(encode(image, quality=95))
+    assert len(original) == 16
+    assert hamming_distance(original, dhash(encode(image, quality=60))) <= 4
+    assert hamming_distance(original, dhash(encode(image, format="PNG"))) <= 4
+
+
+def test_dhash_applies_orientation():
+    image = gradient()
+    upright = dhash(encode(image.transpose(PilImage.Transpose.ROTATE_90)))
+    exif = image.getexif()
+    exif[0x0112] = 8  # Displayed rotated 90 degrees counter-clockwise
+    content = encode(image, exif=exif)
+    assert hamming_distance(upright, dhash(content, orientation=8)) <= 4
+    assert hamming_distance(upright, dhash(content)) > 4
+
+
+def test_find_near_duplicate_picks_closest_within_distance():
+    candidates = [
+        {"scan_id": "far", "dhash": "00000000000000ff"},
+        {"scan_id": "near", "dhash": "0000000000000007"},
+        {"scan_id": "nearer", "dhash": "0000000000000001"},
+    ]
+    row, distance = find_near_duplicate("0000000000000000", candidates, max_distance=4)
+    assert row["scan_id"] == "nearer"
+    assert distance == 1
+
+
+def test_find_near_duplicate_stops_at_exact_match():
+    candidates = [
+        {"scan_id": "exact", "dhash": "0000000000000000"},
+        {"scan_id": "bad"},  # Never reached
+    ]
+    row, distance = find_near_duplicate("0000000000000000", candidates, max_distance=4)
+    assert row["scan_id"] == "exact"
+    assert distance == 0
+
+
+def test_find_near_duplicate_none_within_distance():
+    candidates = [{"scan_id": "far", "dhash": "00000000000000ff"}]
+    assert find_near_duplicate("0000000000000000", candidates, max_distance=4) == (None, None)
+    assert find_near_duplicate("0000000000000000", [], max_distance=4) == (None, None)
@@ -0,0 +1,54 @@
+import os
+from profile_cache import ProfileCache
+
+PROFILE = {"user_id": "u1", "first_name": "Ada", "last_name": "Lovelace"}
+
+
+def test_put_then_get(tmp_path):
+    cache = ProfileCache(str(tmp_path))
+    etag = cache.put("u1", PROFILE, cache.generation("u1"))
+    assert cache.get("u1") == (PROFILE, etag)
+    assert etag == ProfileCache.etag_for(dict(reversed(list(PROFILE.items()))))
+    assert cache.get("u2") is None
+
+
+def test_etag_changes_with_the_profile(tmp_path):
+    cache = ProfileCache(str(tmp_path))
+    assert cache.etag_for(PROFILE) != cache.etag_for({**PROFILE, "last_name": "King"})
+
+
+def test_invalidate_drops_the_entry(tmp_path):
+    cache = ProfileCache(str(tmp_path))
+    cache.put("u1", PROFILE, cache.generation("u1"))
+    cache.invalidate("u1")
+    assert cache.get("u1") is None
+
+
+def test_read_that_raced_an_update_is_not_cached(tmp_path):
+    cache = ProfileCache(str(tmp_path))
+    generation = cache.generation("u1")
+    # A PUT lands between the read of the profile and the put()
+    cache.invalidate("u1")
+    cache.put("u1", PROFILE, generation)
+    assert cache.get("u1") is None
+
+    cache.put("u1", {**PROFILE, "last_name": "King"}, cache.generation("u1"))
+    assert cache.get("u1")[0]["last_name"] == "King"
+
+
+def test_expired_entry_is_removed(tmp_path):
+    cache = ProfileCache(str(tmp_path), ttl=60)
+    cache.put("u1", PROFILE, cache.generation("u1"))
+    path = cache._cache_file("u1")
+    os.utime(path, (0, 0))
+    assert cache.get("u1") is None
+    assert not os.path.exists(path)
+
+
+def test_caches_share_entries_through_the_directory(tmp_path):
+    writer = ProfileCache(str(tmp_path))
+    reader = ProfileCache(str(tmp_path))
+    writer.put("u1", PROFILE, writer.generation("u1"))
+    assert reader.get("u1")[0] == PROFILE
+    reader.invalidate("u1")
+    assert writer.get("u1") is None
@@ -0,0 +1,192 @@
+import base64
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+import pytest
+from scan_gc import ScanGarbageCollector, ScanGCError, OBJECT_NAME, SCAN_FOLDER, key_role
+
+
+class Result:
+    def __init__(self, data):
+        self.data = data
+
+
+# Just enough of the Supabase query builder for scan_record and scan_hashes
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.filters = []
+        self.row_limit = None
+        self.deleting = False
+
+    def select(self, columns):
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row[column] > value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda row: row[column] in values)
+        return self
+
+    def delete(self):
+        self.deleting = True
+        return self
+
+    def execute(self):
+        rows = sorted(self.client.tables[self.table], key=lambda row: row["scan_id"])
+        matched = [row for row in rows if all(check(row) for check in self.filters)]
+        if self.deleting:
+            self.client.tables[self.table] = [row for row in rows if row not in matched]
+            return Result(matched)
+        self.client.reads[self.table] += 1
+        return Result(matched[:self.row_limit] if self.row_limit else matched)
+
+
+class FakeBucket:
+    def __init__(self, client):
+        self.client = client
+
+    def list(self, folder, options):
+        assert folder == SCAN_FOLDER
+        self.client.list_calls += 1
+        items = sorted(self.client.objects.values(), key=lambda item: item["name"])
+        return [dict(item) for item in items[options["offset"]:options["offset"] + options["limit"]]]
+
+    def remove(self, paths):
+        self.client.removed.extend(paths)
+        for path in paths:
+            del self.client.objects[path.split("/", 1)[1]]
+        return [{"name": path} for path in paths]
+
+
+class FakeStorage:
+    def __init__(self, client):
+        self.client = client
+
+    def from_(self, bucket):
+        return FakeBucket(self.client)
+
+
+class FakeSupabase:
+    def __init__(self, objects, records):
+        self.objects = {item["name"]: item for item in objects}
+        self.tables = {
+            "scan_record": [{"scan_id": scan_id} for scan_id in records],
+            "scan_hashes": [{"scan_id": scan_id} for scan_id in sorted({
+                OBJECT_NAME.match(item["name"]).group(1) for item in objects if OBJECT_NAME.match(item["name"])
+            })],
+        }
+        self.reads = {"scan_record": 0, "scan_hashes": 0}
+        self.removed = []
+        self.list_calls = 0
+        self.storage = FakeStorage(self)
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+OLD = (datetime.now(timezone.utc) - timedelta(days=3)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+NEW = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def upload(scan_id, created_at=OLD):
+    return [
+        {"name": f"{scan_id}.jpg", "created_at": created_at, "metadata": {"size": 1000}},
+        {"name": f"{scan_id}_224.jpg", "created_at": created_at, "metadata": {"size": 100}},
+    ]
+
+
+def scan_ids(count):
+    return sorted(str(uuid.uuid4()) for _ in range(count))
+
+
+def collector(client, **options):
+    options.setdefault("page_size", 3)
+    options.setdefault("batch_size", 4)
+    return ScanGarbageCollector(client, grace_period=timedelta(hours=24), deletes_per_second=0, **options)
+
+
+def test_deletes_only_old_orphans():
+    ids = scan_ids(7)
+    recorded, orphaned, recent = ids[:3], ids[3:6], ids[6:]
+    objects = [item for scan_id in recorded + orphaned for item in upload(scan_id)] + upload(recent[0], NEW)
+    objects.append({"name": ".emptyFolderPlaceholder", "created_at": OLD})
+    client = FakeSupabase(objects, recorded)
+
+    stats = collector(client).run()
+
+    assert stats["objects"] == 14
+    assert stats["recorded"] == 6
+    assert stats["recent"] == 2
+    assert stats["orphans"] == stats["deleted"] == 6
+    assert stats["orphan_bytes"] == 3 * 1100
+    assert sorted(client.removed) == sorted(f"{SCAN_FOLDER}/{scan_id}{suffix}.jpg" for scan_id in orphaned for suffix in ("", "_224"))
+    assert sorted(row["scan_id"] for row in client.tables["scan_hashes"]) == sorted(recorded + recent)
+
+
+def test_deleting_earlier_pages_does_not_skip_objects():
+    ids = scan_ids(10)
+    client = FakeSupabase([item for scan_id in ids for item in upload(scan_id)], ids[::5])
+    stats = collector(client, page_size=2, batch_size=2).run()
+    assert stats["objects"] == 20
+    assert stats["deleted"] == 16
+    assert sorted(client.objects) == sorted(f"{scan_id}{suffix}.jpg" for scan_id in ids[::5] for suffix in ("", "_224"))
+
+
+def test_record_landing_during_the_run_keeps_the_upload():
+    ids = scan_ids(2)
+    client = FakeSupabase([item for scan_id in ids for item in upload(scan_id)], [ids[0]])
+    gc = collector(client, batch_size=10)
+    records = gc._record_ids
+
+    def records_then_predict():
+        yield from records()
+        client.tables["scan_record"].append({"scan_id": ids[1]})  # /predict lands before the delete
+
+    gc._record_ids = records_then_predict
+    stats = gc.run()
+    assert stats["orphans"] == 0
+    assert client.removed == []
+
+
+def test_no_visible_records_refuses_to_delete():
+    ids = scan_ids(2)
+    client = FakeSupabase([item for scan_id in ids for item in upload(scan_id)], [])
+    with pytest.raises(ScanGCError):
+        collector(client).run()
+    assert client.removed == []
+
+    stats = collector(client, dry_run=True).run()
+    assert stats["orphans"] == 4
+    assert stats["deleted"] == 0
+    assert client.removed == []
+
+
+def test_empty_bucket():
+    client = FakeSupabase([], [])
+    assert collector(client).run()["objects"] == 0
+    assert client.reads["scan_record"] == 0
+
+
+def jwt(payload):
+    encoded = base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+    return f"header.{encoded}.signature"
+
+
+def test_key_role():
+    assert key_role("sb_secret_abc") == "service_role"
+    assert key_role("sb_publishable_abc") == "anon"
+    assert key_role(jwt({"role": "service_role"})) == "service_role"
+    assert key_role(jwt({"role": "anon"})) == "anon"
+    assert key_role("not-a-key") is None
+    assert key_role(None) is None
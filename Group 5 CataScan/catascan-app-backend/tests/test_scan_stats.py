@@ -0,0 +1,62 @@
+from datetime import datetime
+from scan_stats import ROLLING_WINDOW, apply_scan, build_summary, empty_summary, parse_time, summary_view
+
+
+def scan(scan_id, severity, confidence, created_at):
+    return {"scan_id": scan_id, "severity_level": severity, "confidence": confidence, "created_at": created_at}
+
+
+SCANS = [
+    scan("a", "Normal", 0.9, "2025-01-06 10:00:00"),
+    scan("b", "Mild", 0.7, "2025-01-20T09:00:00Z"),
+    scan("c", "Normal", 0.8, "2025-02-03 08:30:00"),
+]
+
+
+def test_parse_time_formats():
+    assert parse_time("2025-01-06 10:00:00") == datetime(2025, 1, 6, 10)
+    assert parse_time("2025-01-06T10:00:00+00:00") == datetime(2025, 1, 6, 10)
+    assert parse_time("2025-01-06T10:00:00.123Z") == datetime(2025, 1, 6, 10, 0, 0, 123000)
+
+
+def test_incremental_updates_match_a_rebuild():
+    summary = empty_summary()
+    for row in SCANS:
+        apply_scan(summary, row)
+    assert summary == build_summary(reversed(SCANS))
+
+
+def test_applying_a_scan_twice_counts_it_once():
+    summary = build_summary(SCANS)
+    apply_scan(summary, SCANS[-1])
+    assert summary["total_scans"] == 3
+    assert summary["counts"] == {"Normal": 2, "Mild": 1}
+
+
+def test_summary_view():
+    view = summary_view(build_summary(SCANS))
+    assert view["total_scans"] == 3
+    assert view["average_confidence"] == 0.8
+    assert view["latest_scan"]["scan_id"] == "c"
+    assert [entry["period"] for entry in view["trend"]] == ["2025-01", "2025-02"]
+    assert view["trend"][0]["scans"] == 2
+    assert view["trend"][0]["average_confidence"] == 0.8
+
+    weeks = summary_view(build_summary(SCANS), bucket="week")
+    assert [entry["period"] for entry in weeks["trend"]] == ["2025-W02", "2025-W04", "2025-W06"]
+
+
+def test_rolling_window_keeps_the_newest_scans():
+    rows = [scan(str(i), "Normal", i / 100, f"2025-03-{i + 1:02d} 12:00:00") for i in range(ROLLING_WINDOW + 5)]
+    view = summary_view(build_summary(rows))
+    assert view["rolling_average_confidence"]["window"] == ROLLING_WINDOW
+    expected = sum(i / 100 for i in range(5, ROLLING_WINDOW + 5)) / ROLLING_WINDOW
+    assert view["rolling_average_confidence"]["value"] == round(expected, 2)
+
+
+def test_empty_summary_view():
+    view = summary_view(empty_summary())
+    assert view["total_scans"] == 0
+    assert view["average_confidence"] is None
+    assert view["rolling_average_confidence"] == {"window": 0, "value": None}
+    assert view["trend"] == []
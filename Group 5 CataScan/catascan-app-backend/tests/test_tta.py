@@ -0,0 +1,65 @@
+import time
+import numpy as np
+from PIL import Image as PilImage
+from tta import build_tta_views, predict_with_tta
+
+
+# Backend that returns fixed probabilities and reports a fixed per-image latency
+class FakeBackend:
+    def __init__(self, first, rest, seconds_per_image):
+        self.first = np.array([first], dtype=np.float32)
+        self.rest = np.array(rest, dtype=np.float32)
+        self.per_image = seconds_per_image
+        self.calls = []
+
+    def predict(self, batch):
+        self.calls.append(len(batch))
+        if len(self.calls) == 1:
+            return self.first
+        return np.repeat(self.rest[None, :], len(batch), axis=0)
+
+    def seconds_per_image(self):
+        return self.per_image
+
+
+def views(count):
+    return np.zeros((count, 224, 224, 3), dtype=np.float32)
+
+
+def test_build_tta_views_shape():
+    image = PilImage.new("RGB", (320, 240), (120, 60, 30))
+    batch = build_tta_views(image, 5)
+    assert batch.shape == (5, 224, 224, 3)
+    # The second view is the horizontal flip of the first
+    assert np.allclose(batch[1], batch[0][:, ::-1, :])
+
+
+def test_confident_first_pass_skips_extra_views():
+    backend = FakeBackend([0.95, 0.05], [0.1, 0.9], 0.01)
+    prediction, used = predict_with_tta(backend, views(8), deadline=1e12, confidence_threshold=0.9)
+    assert used == 1
+    assert backend.calls == [1]
+    assert np.allclose(prediction, [[0.95, 0.05]])
+
+
+def test_extra_views_are_scored_in_one_batch_and_averaged():
+    backend = FakeBackend([0.6, 0.4], [0.2, 0.8], 0.001)
+    prediction, used = predict_with_tta(backend, views(8), deadline=1e12, confidence_threshold=0.9)
+    assert used == 8
+    assert backend.calls == [1, 7]
+    assert np.allclose(prediction, [[(0.6 + 7 * 0.2) / 8, (0.4 + 7 * 0.8) / 8]])
+
+
+def test_latency_budget_caps_extra_views():
+    backend = FakeBackend([0.6, 0.4], [0.2, 0.8], 1.0)
+    prediction, used = predict_with_tta(backend, views(8), deadline=time.time() + 3.5, confidence_threshold=0.9)
+    assert used == 4
+    assert backend.calls == [1, 3]
+
+
+def test_exhausted_budget_returns_first_pass():
+    backend = FakeBackend([0.6, 0.4], [0.2, 0.8], 1.0)
+    prediction, used = predict_with_tta(backend, views(8), deadline=time.time() - 1, confidence_threshold=0.9)
+    assert used == 1
+    assert backend.calls == [1]
+    assert np.allclose(prediction, [[0.6, 0.4]])
@@ -0,0 +1,55 @@
+import logging
+import time
+import numpy as np
+from inference import preprocess_image, IMG_SIZE
+
+# Test-time augmentation for /predict.
+# The full image is scored first on its own, which is cheap; if that prediction is already confident the
+# other views are skipped. Otherwise as many further views (flips and crops) as the latency budget allows
+# are scored in a single batched call, and all predictions are averaged once.
+
+TTA_RESIZE = 256  # Views are cropped from one resize slightly larger than the model input
+
+
+# Function to build up to num_views augmented views of the image as one (N, 224, 224, 3) batch.
+# Order: full image, its flip, center crop, its flip, then the four corner crops and their flips,
+# so taking the first N views always keeps the most informative ones.
+def build_tta_views(image, num_views):
+    image = image.convert("RGB")
+    full = preprocess_image(image)
+    large = np.asarray(image.resize((TTA_RESIZE, TTA_RESIZE)), dtype=np.float32) / 255.0
+
+    c = (TTA_RESIZE - IMG_SIZE) // 2
+    e = TTA_RESIZE - IMG_SIZE
+    views = np.stack([
+        full,
+        large[c:c + IMG_SIZE, c:c + IMG_SIZE],
+        large[:IMG_SIZE, :IMG_SIZE],
+        large[:IMG_SIZE, e:],
+        large[e:, :IMG_SIZE],
+        large[e:, e:],
+    ])
+    # Interleave every view with its horizontal flip
+    views = np.stack([views, views[:, :, ::-1, :]], axis=1).reshape(-1, IMG_SIZE, IMG_SIZE, 3)
+    return np.ascontiguousarray(views[:max(1, num_views)])
+
+
+# Function to score the views with test-time augmentation before a deadline (time.time() based).
+# The number of extra views is capped by the backend's measured per-image latency against the time left.
+# Returns the averaged (1, num_classes) prediction and the number of views used.
+def predict_with_tta(backend, views, deadline, confidence_threshold):
+    first_start = time.time()
+    first = backend.predict(views[:1])
+    if len(views) == 1 or first[0].max() >= confidence_threshold:
+        return first, 1
+
+    # Averaged over every call so far, batched or not; before any, the first pass is the only measurement
+    per_image = backend.seconds_per_image() or (time.time() - first_start)
+    remaining = deadline - time.time()
+    extra = min(len(views) - 1, int(remaining / per_image) if per_image > 0 else len(views) - 1)
+    if extra <= 0:
+        logging.info("TTA latency budget exhausted after the first view")
+        return first, 1
+
+    predictions = np.concatenate([first, backend.predict(views[1:1 + extra])])
+    return predictions.mean(axis=0, keepdims=True), 1 + extra